@@ -0,0 +1,31 @@
+// Generated by raspi/snr/comms/serial/commands.py, do not edit.
+// Regenerate with make commands_header in raspi/
+#ifndef COMMANDS_H
+#define COMMANDS_H
+
+#define PACKET_LENGTH 4
+
+#define EST_CON_CMD      0x10 // establish connection (call)
+#define SET_MOT_CMD      0x20 // set motor, value1 motor, value2 speed
+#define SET_ALL_MOT_CMD  0x24 // set every motor, value1 int16 values follow
+#define SET_CAM_CMD      0x33 // set camera mux to camera value1
+#define RD_SENS_CMD      0x40 // stream sensor frames at value1 Hz, 0 stops them
+#define SENSOR_FRAME_CMD 0x41 // sensor readings sent unasked, see sensors.h
+#define BLINK_CMD        0x62 // blink
+#define INV_CMD_ACK      0xFF // invalid command, value2 of response contains cmd
+
+#define FRAME_SYNC_1      0xA5 // frame start
+#define FRAME_SYNC_2      0x5A
+#define FRAME_MAX_PAYLOAD 64
+#define CRC_INIT          0xFFFF // CRC-16/CCITT-FALSE
+#define THRUST_FRAME_MAX  1000 // thruster frame value for full thrust
+
+// Sensor ids, values are little endian
+#define SENSOR_IMU_EULER       0x01 // <hhh heading, roll, pitch x0.0625
+#define SENSOR_IMU_ACCEL       0x02 // <hhh x, y, z x0.01
+#define SENSOR_IMU_GYRO        0x03 // <hhh x, y, z x0.0625
+#define SENSOR_IMU_TEMP        0x04 // <b celsius
+#define SENSOR_IMU_CALIBRATION 0x05 // <BBBB system, gyro, accel, mag
+#define SENSOR_MCU_STATUS      0x06 // <II uptime_ms, crc_errors
+
+#endif
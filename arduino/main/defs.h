@@ -9,6 +9,7 @@
 */
 
 typedef unsigned char u8;
+typedef unsigned short u16;
 
 #define BIT0 0x01
 #define BIT1 0x02
@@ -6,6 +6,7 @@
 //#include "blink.h"
 #include "motors.h"
 #include "cameras.h"
+#include "sensors.h"
 
 packet p;
 
@@ -14,11 +15,14 @@ void setup() {
  
   motor_setup();
   camera_setup();
+  sensor_setup();
 }
 
 void loop() {
+  stream_sensors();
   if (get_packet(&p)) {
-    //error
+    // Nothing yet, or a frame too short to hold a packet
+    return;
   }
   if (handle_packet(p)) {
     // error
@@ -33,7 +37,22 @@ int handle_packet(packet p) {
     case SET_MOT_CMD:
       write_thruster(p.value1, translate_motor_val(p.value2));
       break;
+    case SET_ALL_MOT_CMD: {
+      // One ack for the whole frame instead of an echo per motor
+      int values[NUM_MOTORS];
+      u8 checksum;
+      if (read_thruster_values(values, p.value1, &checksum)) {
+        create_packet(&response, INV_CMD_ACK, p.seq, 0, p.cmd);
+        return send_packet(response);
+      }
+      for (int i = 0; i < p.value1; i++) {
+        write_thruster(i, translate_thrust_frame_val(values[i]));
+      }
+      create_packet(&response, SET_ALL_MOT_CMD, p.seq, p.value1, checksum);
+      return send_packet(response);
+    }
     case RD_SENS_CMD:
+      set_stream_rate(p.value1);
       break;
     case BLINK_CMD:
 //      blink_std();
@@ -46,6 +46,13 @@ int translate_motor_val(int val2) {
   return (val2 * 3 + 1245);
 }
 
+// Thruster frame value, +/-THRUST_FRAME_MAX, to ESC pulse width
+int translate_thrust_frame_val(int val) {
+  val = constrain(val, -THRUST_FRAME_MAX, THRUST_FRAME_MAX);
+  return ESC_CENTER_US
+         + (long)val * (ESC_MAX_US - ESC_CENTER_US) / THRUST_FRAME_MAX;
+}
+
 void motor_setup() {
   // attach motors to pins
   motors[0].attach(MOTOR_1_PIN);//, ESC_MIN_US, ESC_MAX_US);
@@ -0,0 +1,116 @@
+#ifndef SENSORS_H
+#define SENSORS_H
+
+#include "defs.h"
+#include "settings.h"
+#include "commands.h"
+#include "packet.h"
+#include "serial.h"
+
+#ifdef USE_BNO055
+#include <Wire.h>
+#include <Adafruit_Sensor.h>
+#include <Adafruit_BNO055.h>
+
+Adafruit_BNO055 bno = Adafruit_BNO055(-1, BNO055_ADDRESS);
+bool bno_found = false;
+#endif
+
+// Sensor ids are in commands.h, generated from SENSOR_TYPES in
+// raspi/snr/comms/serial/sensors.py
+
+unsigned long stream_period_ms = 0; // 0 when not streaming
+unsigned long last_stream_ms = 0;
+u8 stream_seq = 0; // Lets the Pi count frames it missed
+
+u8 sensor_frame[FRAME_MAX_PAYLOAD];
+u8 sensor_frame_length = 0;
+
+void sensor_setup() {
+#ifdef USE_BNO055
+  bno_found = bno.begin();
+  if (bno_found) {
+    bno.setExtCrystalUse(true);
+  }
+#endif
+}
+
+// Set how many sensor frames are sent per second, 0 stops them
+void set_stream_rate(u8 rate_hz) {
+  stream_period_ms = rate_hz > 0 ? 1000 / rate_hz : 0;
+  last_stream_ms = millis();
+}
+
+void put_u8(u8 v) {
+  sensor_frame[sensor_frame_length++] = v;
+}
+
+void put_i16(int16_t v) {
+  put_u8(v & 0xFF);
+  put_u8((v >> 8) & 0xFF);
+}
+
+void put_u32(unsigned long v) {
+  for (int i = 0; i < 4; i++) {
+    put_u8((v >> (8 * i)) & 0xFF);
+  }
+}
+
+#ifdef USE_BNO055
+// The library divides the raw values by scale, undo that to send them
+void put_vector(u8 id, imu::Vector<3> v, float scale) {
+  put_u8(id);
+  put_i16((int16_t)(v.x() * scale));
+  put_i16((int16_t)(v.y() * scale));
+  put_i16((int16_t)(v.z() * scale));
+}
+#endif
+
+// Send a frame of sensor readings if one is due. Called every loop(), the
+// Pi does not ask for them.
+void stream_sensors() {
+  unsigned long now = millis();
+  if (stream_period_ms == 0 || now - last_stream_ms < stream_period_ms) {
+    return;
+  }
+  // Stay on the fixed rate, but do not send a burst after falling behind
+  last_stream_ms += stream_period_ms;
+  if (now - last_stream_ms >= stream_period_ms) {
+    last_stream_ms = now;
+  }
+
+  sensor_frame_length = PACKET_LENGTH;
+  u8 count = 0;
+#ifdef USE_BNO055
+  if (bno_found) {
+    put_vector(SENSOR_IMU_EULER,
+               bno.getVector(Adafruit_BNO055::VECTOR_EULER), 16);
+    put_vector(SENSOR_IMU_ACCEL,
+               bno.getVector(Adafruit_BNO055::VECTOR_ACCELEROMETER), 100);
+    put_vector(SENSOR_IMU_GYRO,
+               bno.getVector(Adafruit_BNO055::VECTOR_GYROSCOPE), 16);
+    put_u8(SENSOR_IMU_TEMP);
+    put_u8((u8)bno.getTemp());
+    u8 system, gyro, accel, mag;
+    bno.getCalibration(&system, &gyro, &accel, &mag);
+    put_u8(SENSOR_IMU_CALIBRATION);
+    put_u8(system);
+    put_u8(gyro);
+    put_u8(accel);
+    put_u8(mag);
+    count += 5;
+  }
+#endif
+  put_u8(SENSOR_MCU_STATUS);
+  put_u32(now);
+  put_u32(crc_errors);
+  count++;
+
+  sensor_frame[0] = SENSOR_FRAME_CMD;
+  sensor_frame[1] = stream_seq++;
+  sensor_frame[2] = count;
+  sensor_frame[3] = 0;
+  write_frame(sensor_frame, sensor_frame_length);
+}
+
+#endif
@@ -3,6 +3,7 @@
 
 #include "defs.h"
 #include "settings.h"
+#include "commands.h"
 #include "packet.h"
 #include "blink.h"
 
@@ -13,29 +14,203 @@ void initialize_serial() {
   }
 }
 
-// Wait for the UART buffer to be filled with a whole packet.
-// This is a blocking operation (i think)
-void wait_for_packet() {
-  while (Serial.available() < PACKET_LENGTH) {}
+// Frames wrap each packet as: FRAME_SYNC_1, FRAME_SYNC_2, payload length,
+// payload, then the CRC-16/CCITT-FALSE of the length and payload, low byte
+// first. See arduino/serial_protocol.txt.
+#define FRAME_BUFFER (FRAME_MAX_PAYLOAD + 5) // Sync, length, payload, CRC
+
+u8 frame_payload[FRAME_MAX_PAYLOAD];
+u8 frame_length = 0;
+unsigned long crc_errors = 0; // Frames dropped for a bad CRC
+unsigned long frame_timeouts = 0; // Frames dropped half received
+
+u16 crc16_update(u16 crc, u8 b) {
+  crc ^= (u16)b << 8;
+  for (int i = 0; i < 8; i++) {
+    crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+  }
+  return crc;
+}
+
+// Where poll_frame is in the frame being received, kept between calls so
+// loop() never waits on the Pi
+enum frame_state {
+  WAIT_SYNC_1,
+  WAIT_SYNC_2,
+  WAIT_LENGTH,
+  READ_PAYLOAD,
+  READ_CRC_LOW,
+  READ_CRC_HIGH
+};
+frame_state rx_state = WAIT_SYNC_1;
+u8 rx_pos = 0;
+u16 rx_crc = 0;
+u16 rx_received_crc = 0;
+unsigned long rx_last_ms = 0; // millis() the last byte arrived
+
+// Every byte of the frame being received, from its sync marker
+u8 rx_buf[FRAME_BUFFER];
+u8 rx_len = 0;
+// Bytes given back by resync(), read again before any new ones. Only the
+// bytes of one frame are ever pending, so one frame's worth is enough.
+u8 replay[FRAME_BUFFER];
+u8 replay_len = 0;
+u8 replay_pos = 0;
+
+int next_byte(u8 *b) {
+  if (replay_pos < replay_len) {
+    *b = replay[replay_pos++];
+    return 1;
+  }
+  if (Serial.available() > 0) {
+    *b = Serial.read();
+    rx_last_ms = millis();
+    return 1;
+  }
+  return 0;
+}
+
+// Drop a bad frame's first sync byte and read the rest again, as FrameParser
+// does on the Pi, so a real frame among them is not lost with it
+void resync() {
+  u8 rest[FRAME_BUFFER];
+  u8 n = 0;
+  for (u8 i = 1; i < rx_len; i++) {
+    rest[n++] = rx_buf[i];
+  }
+  while (replay_pos < replay_len) {
+    rest[n++] = replay[replay_pos++];
+  }
+  memcpy(replay, rest, n);
+  replay_len = n;
+  replay_pos = 0;
+  rx_len = 0;
+  rx_state = WAIT_SYNC_1;
 }
 
-// Deserialize a packet object to the given pointer. Returns 0 on sucess and >0 on failure.
-// Blocks until serial buffer contains an entire packet worth of bytes.
+// Consume the bytes that have arrived, returns 1 once a frame with a good
+// CRC is in frame_payload. Bytes outside a frame are dropped. After a bad
+// length or CRC the search starts over at the byte after the sync marker.
+int poll_frame() {
+  if (rx_state != WAIT_SYNC_1 && replay_pos == replay_len &&
+      Serial.available() == 0 && millis() - rx_last_ms > FRAME_TIMEOUT_MS) {
+    // The rest of this frame is not coming
+    rx_len = 0;
+    rx_state = WAIT_SYNC_1;
+    frame_timeouts++;
+  }
+  u8 b;
+  while (next_byte(&b)) {
+    if (rx_state != WAIT_SYNC_1) {
+      rx_buf[rx_len++] = b;
+    }
+    switch (rx_state) {
+      case WAIT_SYNC_1:
+        if (b == FRAME_SYNC_1) {
+          rx_buf[0] = b;
+          rx_len = 1;
+          rx_state = WAIT_SYNC_2;
+        }
+        break;
+      case WAIT_SYNC_2:
+        // The last of a run of FRAME_SYNC_1 may still start a frame
+        if (b == FRAME_SYNC_2) {
+          rx_state = WAIT_LENGTH;
+        } else if (b == FRAME_SYNC_1) {
+          rx_len = 1;
+        } else {
+          rx_len = 0;
+          rx_state = WAIT_SYNC_1;
+        }
+        break;
+      case WAIT_LENGTH:
+        if (b > FRAME_MAX_PAYLOAD) {
+          resync();
+          break;
+        }
+        frame_length = b;
+        rx_pos = 0;
+        rx_crc = crc16_update(CRC_INIT, b);
+        rx_state = b > 0 ? READ_PAYLOAD : READ_CRC_LOW;
+        break;
+      case READ_PAYLOAD:
+        frame_payload[rx_pos++] = b;
+        rx_crc = crc16_update(rx_crc, b);
+        if (rx_pos == frame_length) {
+          rx_state = READ_CRC_LOW;
+        }
+        break;
+      case READ_CRC_LOW:
+        rx_received_crc = b;
+        rx_state = READ_CRC_HIGH;
+        break;
+      case READ_CRC_HIGH:
+        rx_received_crc |= (u16)b << 8;
+        if (rx_received_crc == rx_crc) {
+          rx_len = 0;
+          rx_state = WAIT_SYNC_1;
+          return 1;
+        }
+        crc_errors++;
+        resync();
+        break;
+    }
+  }
+  return 0;
+}
+
+void write_frame(u8 *payload, u8 length) {
+  u16 crc = crc16_update(CRC_INIT, length);
+  for (int i = 0; i < length; i++) {
+    crc = crc16_update(crc, payload[i]);
+  }
+  Serial.write(FRAME_SYNC_1);
+  Serial.write(FRAME_SYNC_2);
+  Serial.write(length);
+  Serial.write(payload, length);
+  Serial.write(crc & 0xFF);
+  Serial.write(crc >> 8);
+  Serial.flush();
+}
+
+// Deserialize a packet object to the given pointer. Returns 0 on sucess and
+// >0 when no whole packet has arrived yet, without waiting. The frame's
+// payload stays in frame_payload.
 int get_packet(packet *p) {
-  wait_for_packet();
-  byte cmd_byte = Serial.read();
-  byte value1_byte = Serial.read();
-  byte value2_byte = Serial.read();
-  create_packet(p, cmd_byte, value1_byte, value2_byte); //, seqnum_chksum_byte);
+  if (!poll_frame()) {
+    return 1;
+  }
+  if (frame_length < PACKET_LENGTH) {
+    return 1;
+  }
+  create_packet(p, frame_payload[0], frame_payload[1],
+                frame_payload[2], frame_payload[3]);
+  return 0;
+}
+
+// Read the count little endian int16 thruster values that follow a
+// SET_ALL_MOT_CMD packet in its frame. Returns >0 if there were more than
+// NUM_MOTORS or the frame does not hold count values. checksum is set to the
+// low byte of the sum of the value bytes, which is sent back as the ack.
+int read_thruster_values(int *values, int count, u8 *checksum) {
+  if (count > NUM_MOTORS || frame_length != PACKET_LENGTH + 2 * count) {
+    return 1;
+  }
+  u8 sum = 0;
+  for (int i = 0; i < count; i++) {
+    byte lo = frame_payload[PACKET_LENGTH + 2 * i];
+    byte hi = frame_payload[PACKET_LENGTH + 2 * i + 1];
+    sum += lo + hi;
+    values[i] = (int16_t)(lo | (hi << 8));
+  }
+  *checksum = sum;
   return 0;
 }
 
 // Send the packet over a serial interface
 int send_packet(packet p) {
-  Serial.write(p.cmd);
-  Serial.write(p.value1);
-  Serial.write(p.value2);
-  Serial.flush();
+  u8 payload[PACKET_LENGTH] = {p.cmd, p.seq, p.value1, p.value2};
+  write_frame(payload, PACKET_LENGTH);
   return 0;
 }
 
@@ -2,6 +2,14 @@
 #define SETTINGS_H
 
 #define COMS_BAUD 115200
+// A frame that stops arriving for this long is dropped, so the rest of a
+// truncated frame is not taken from the frames after it
+#define FRAME_TIMEOUT_MS (20)
+
+//--Sensors:---------------------------------
+// Stream BNO055 readings, needs the Adafruit BNO055 library
+//#define USE_BNO055
+#define BNO055_ADDRESS (0x28)
 
 //--Motor Codes:-----------------------------
 // Must be kept from 0-5 for iterative loops loops
@@ -0,0 +1,5 @@
+"""Standalone performance benchmarks for the snr framework
+
+Run from the raspi directory, for example:
+python3 -m benchmarks.control_jitter
+"""
@@ -0,0 +1,100 @@
+"""Control loop jitter under synthetic video load
+
+Runs a periodic loop standing in for the Node/motor control loop while
+processes emulate the camera ProcEndpoints (compressing 720p frames), once
+with default scheduling and once with the control loop isolated through
+SchedConfig. Reports how late each loop iteration woke up.
+
+usage: python3 -m benchmarks.control_jitter [seconds per run]
+"""
+
+import os
+import zlib
+from multiprocessing import Event, Process
+from sys import argv
+from threading import Thread
+from time import perf_counter, sleep
+
+from snr.utils.realtime import SchedConfig
+
+CONTROL_RATE_HZ = 100
+FRAME_BYTES = 1280 * 720 * 3
+DEFAULT_RUN_S = 10
+
+CONTROL_ISOLATION = SchedConfig(cpus=[0], nice=-10,
+                                fifo_priority=50, lock_memory=True)
+
+
+def dbg(channel: str, message: str, args: list = []):
+    print("[{}]\t{}".format(channel, message.format(*args)))
+
+
+def video_load(stop: Event, isolate: bool):
+    """Emulate a video source: grab a frame and encode it, forever
+    """
+    if isolate:
+        cpus = list(range(1, os.cpu_count() or 1)) or None
+        SchedConfig(cpus=cpus, nice=10).apply(dbg, "video_load")
+    frame = os.urandom(FRAME_BYTES // 64) * 64
+    while not stop.is_set():
+        zlib.compress(frame, 6)
+
+
+def control_loop(duration_s: float, isolate: bool, lateness: list):
+    if isolate:
+        CONTROL_ISOLATION.apply(dbg, "control_loop")
+    period = 1.0 / CONTROL_RATE_HZ
+    deadline = perf_counter() + period
+    end = deadline + duration_s
+    while deadline < end:
+        remaining = deadline - perf_counter()
+        if remaining > 0:
+            sleep(remaining)
+        lateness.append(perf_counter() - deadline)
+        deadline += period
+
+
+def run(duration_s: float, isolate: bool) -> list:
+    stop = Event()
+    loads = [Process(target=video_load, args=(stop, isolate), daemon=True)
+             for _ in range(os.cpu_count() or 1)]
+    for p in loads:
+        p.start()
+    sleep(0.5)  # Let the load ramp up
+
+    lateness = []
+    t = Thread(target=control_loop, args=(duration_s, isolate, lateness))
+    t.start()
+    t.join()
+
+    stop.set()
+    for p in loads:
+        p.join()
+    return lateness
+
+
+def report(label: str, lateness: list):
+    s = sorted(lateness)
+    n = len(s)
+
+    def pct(p: float) -> float:
+        return s[min(n - 1, int(p * n))] * 1e6
+
+    print("{:<12} n={:<6} p50={:9.1f} us  p90={:9.1f} us  "
+          "p99={:9.1f} us  max={:9.1f} us".format(
+              label, n, pct(0.5), pct(0.9), pct(0.99), s[-1] * 1e6))
+
+
+def main():
+    duration_s = float(argv[1]) if len(argv) > 1 else DEFAULT_RUN_S
+    print("Control loop at {} Hz, {} video load processes, {} s per run"
+          .format(CONTROL_RATE_HZ, os.cpu_count(), duration_s))
+    baseline = run(duration_s, False)
+    isolated = run(duration_s, True)
+    print("Wake-up lateness:")
+    report("default", baseline)
+    report("isolated", isolated)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Packets encoded and decoded per second
+
+Encodes batches of BATCH packets, as the serial writer takes them from
+OutboundSlots, three ways: struct.pack with the format string and calcsize
+per packet as Packet.pack used to, the precompiled codecs framed one packet
+at a time, and FrameEncoder framing the whole batch into its preallocated
+buffer, which also takes one write() per batch instead of one per packet.
+Then decodes the framed stream with FrameParser and unpack(), as
+PacketReader does. Reports the best of REPEATS runs, timed in process CPU
+time so a descheduled run does not count.
+
+usage: python3 -m benchmarks.packet_codecs [packets per run]
+"""
+
+import struct
+from sys import argv
+from time import process_time
+
+from snr.comms.serial import framing
+from snr.comms.serial.packet import (PACKED_FORMAT, SET_MOT_CMD, Packet,
+                                     ThrusterFrame, unpack)
+from snr.profiler import Profiler
+
+BATCH = 4  # SERIAL_WINDOW
+REPEATS = 5
+DEFAULT_PACKETS = 100000
+
+
+def dbg(channel: str, message: str = "", args: list = []):
+    pass
+
+
+def format_string(batch: list) -> bytes:
+    data = b""
+    for p in batch:
+        payload = struct.pack(PACKED_FORMAT, p.cmd, p.seq, p.val1, p.val2)
+        struct.calcsize(PACKED_FORMAT)
+        data += framing.encode(payload)
+    return data
+
+
+def per_packet(batch: list) -> bytes:
+    data = b""
+    for p in batch:
+        data += framing.encode(p.pack()[0])
+    return data
+
+
+def make_batched():
+    encoder = framing.FrameEncoder()
+
+    def batched(batch: list) -> memoryview:
+        return encoder.encode(batch)
+    return batched
+
+
+def best_rate(encode, batches: list) -> float:
+    best = 0.0
+    for _ in range(REPEATS):
+        start = process_time()
+        for batch in batches:
+            encode(batch)
+        elapsed = process_time() - start
+        best = max(best, len(batches) * BATCH / elapsed)
+    return best
+
+
+def decode_rate(data: bytes, n: int) -> float:
+    best = 0.0
+    for _ in range(REPEATS):
+        parser = framing.FrameParser(dbg, Profiler(dbg, False))
+        start = process_time()
+        # In reads of about what arrives between reader wakeups
+        for i in range(0, len(data), 256):
+            for payload in parser.feed(data[i:i + 256]):
+                unpack(payload)
+        best = max(best, n / (process_time() - start))
+    return best
+
+
+def main():
+    n = int(argv[1]) if len(argv) > 1 else DEFAULT_PACKETS
+    packets = [Packet(SET_MOT_CMD, i % 6, i % 256, i % 256)
+               for i in range(n - n % BATCH)]
+    batches = [packets[i:i + BATCH] for i in range(0, len(packets), BATCH)]
+    print("{} packets in batches of {}, best of {}".format(
+        len(packets), BATCH, REPEATS))
+    print("{:<34} {:>12}".format("", "packets/s"))
+    rates = []
+    for name, encode in [("encode, format string per packet", format_string),
+                         ("encode, Struct, framed per packet", per_packet),
+                         ("encode, FrameEncoder per batch", make_batched())]:
+        rates.append(best_rate(encode, batches))
+        print("{:<34} {:12.0f}".format(name, rates[-1]))
+    print("FrameEncoder is x{:.1f} the format string rate".format(
+        rates[2] / rates[0]))
+
+    data = b"".join(bytes(make_batched()(b)) for b in batches)
+    print("{:<34} {:12.0f}".format("decode, FrameParser and unpack",
+                                   decode_rate(data, len(packets))))
+    frame = ThrusterFrame([100, -100, 1000, -1000, 0, 500])
+    encoder = framing.FrameEncoder()
+    start = process_time()
+    for _ in range(n // 10):
+        encoder.encode([frame])
+    print("{:<34} {:12.0f}".format("encode, 6 value thruster frames",
+                                   n // 10 / (process_time() - start)))
+
+
+if __name__ == "__main__":
+    main()
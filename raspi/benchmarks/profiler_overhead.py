@@ -0,0 +1,114 @@
+"""Cost of profiler instrumentation per timed task
+
+Times an empty task handler through each way of instrumenting it, with the
+profiler enabled and disabled, and reports the overhead added per call over
+calling the handler directly.
+
+usage: python3 -m benchmarks.profiler_overhead [calls per case]
+"""
+
+from sys import argv
+from time import perf_counter_ns
+
+from snr.profiler import Profiler, profiled
+from snr.task import Task, TaskPriority
+
+DEFAULT_CALLS = 200000
+
+
+def dbg(channel: str, message: str, args: list = []):
+    pass
+
+
+class Endpoint:
+    """Stand in with the attributes the profiled decorator needs
+    """
+
+    def __init__(self, profiler: Profiler):
+        self.profiler = profiler
+        self.name = "bench"
+
+    def handler(self, t: Task):
+        return None
+
+    @profiled("bench_decorated")
+    def decorated(self, t: Task):
+        return None
+
+
+def case_direct(e: Endpoint, t: Task, n: int):
+    handler = e.handler
+    for _ in range(n):
+        handler(t)
+
+
+def case_branch(e: Endpoint, t: Task, n: int):
+    """Instrumentation as done in Node.execute_task and AsyncEndpoint
+    """
+    handler = e.handler
+    profiler = e.profiler
+    label = "bench:branch"
+    for _ in range(n):
+        if profiler.enabled:
+            start_ns = perf_counter_ns()
+            handler(t)
+            profiler.record(label, start_ns)
+        else:
+            handler(t)
+
+
+def case_span(e: Endpoint, t: Task, n: int):
+    handler = e.handler
+    profiler = e.profiler
+    for _ in range(n):
+        with profiler.span("bench:span"):
+            handler(t)
+
+
+def case_decorator(e: Endpoint, t: Task, n: int):
+    decorated = e.decorated
+    for _ in range(n):
+        decorated(t)
+
+
+def case_closure(e: Endpoint, t: Task, n: int):
+    """The previous Node.execute_task: f-string label and lambda per call
+    """
+    handler = e.handler
+    profiler = e.profiler
+    for _ in range(n):
+        profiler.time(f"{t.task_type}:{e.name}", lambda: handler(t))
+
+
+CASES = [
+    ("direct call", case_direct),
+    ("branch + record", case_branch),
+    ("span()", case_span),
+    ("@profiled", case_decorator),
+    ("lambda + f-string", case_closure),
+]
+
+
+def measure(case, e: Endpoint, t: Task, n: int) -> float:
+    start = perf_counter_ns()
+    case(e, t, n)
+    return (perf_counter_ns() - start) / n
+
+
+def main():
+    n = int(argv[1]) if len(argv) > 1 else DEFAULT_CALLS
+    t = Task("bench", TaskPriority.normal, [])
+    print("{} calls per case, ns per call (overhead over direct call)"
+          .format(n))
+    for enabled in (True, False):
+        e = Endpoint(Profiler(dbg, enabled))
+        print("Profiler {}:".format("enabled" if enabled else "disabled"))
+        baseline = measure(case_direct, e, t, n)
+        for name, case in CASES:
+            ns = measure(case, e, t, n)
+            print("  {:<20}{:8.1f} ns  (+{:.1f} ns)".format(
+                name, ns, ns - baseline))
+
+
+if __name__ == "__main__":
+    main()
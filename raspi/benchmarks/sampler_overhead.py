@@ -0,0 +1,92 @@
+"""Cost of the sampling profiler
+
+Runs threads standing in for a Node (a busy task loop with a deep stack and
+endpoint threads that mostly sleep) with sampling off and at several rates.
+Reports the CPU the sampler thread used as a share of one core, which should
+stay under BUDGET, and the change in task loop throughput.
+
+usage: python3 -m benchmarks.sampler_overhead [seconds per run]
+"""
+
+from sys import argv
+from threading import Event, Thread
+from time import perf_counter, sleep
+
+from snr.sampler import Sampler
+
+RATES_HZ = [25, 50, 100, 200]
+SLEEPING_THREADS = 8  # AsyncEndpoints between ticks
+STACK_DEPTH = 30
+BUDGET = 0.02  # Share of one core
+DEFAULT_RUN_S = 5
+
+
+def dbg(channel: str, message: str, args: list = []):
+    pass
+
+
+def nested(depth: int) -> int:
+    if depth == 0:
+        return sum(range(200))
+    return nested(depth - 1)
+
+
+def busy(stop: Event, done: list):
+    n = 0
+    while not stop.is_set():
+        nested(STACK_DEPTH)
+        n += 1
+    done.append(n)
+
+
+def idle(stop: Event):
+    while not stop.is_set():
+        sleep(0.01)
+
+
+def run(duration_s: float, rate_hz: float):
+    """Task loop iterations per second, samples actually taken per second
+    and the sampler's share of a core
+    """
+    stop = Event()
+    done = []
+    threads = [Thread(target=busy, args=(stop, done))]
+    threads += [Thread(target=idle, args=(stop,))
+                for _ in range(SLEEPING_THREADS)]
+    sampler = None
+    if rate_hz:
+        sampler = Sampler(dbg, rate_hz, 2000, "/dev/null")
+        sampler.start()
+    for t in threads:
+        t.start()
+    start = perf_counter()
+    sleep(duration_s)
+    stop.set()
+    for t in threads:
+        t.join()
+    elapsed = perf_counter() - start
+    if sampler is None:
+        return done[0] / elapsed, 0.0, 0.0
+    sampler.stop()
+    return done[0] / elapsed, sampler.samples / elapsed, sampler.overhead()
+
+
+def main():
+    duration_s = float(argv[1]) if len(argv) > 1 else DEFAULT_RUN_S
+    print("{} s per run, 1 busy and {} sleeping threads, stack depth {}"
+          .format(duration_s, SLEEPING_THREADS, STACK_DEPTH))
+    baseline, _, _ = run(duration_s, 0)
+    # Samples taken can fall short of the rate if the sampler is starved
+    print("{:>8}  {:>10}  {:>12}  {:>10}  {:>10}".format(
+        "rate", "samples/s", "loops/s", "change", "sampler"))
+    print("{:>8}  {:>10}  {:12.0f}  {:>10}  {:>10}".format(
+        "off", "", baseline, "", ""))
+    for rate_hz in RATES_HZ:
+        loops, taken, overhead = run(duration_s, rate_hz)
+        print("{:>5} Hz  {:10.1f}  {:12.0f}  {:+9.2f}%  {:9.2f}%{}".format(
+            rate_hz, taken, loops, (loops / baseline - 1) * 100,
+            overhead * 100, "" if overhead < BUDGET else "  over budget"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""SerialConnection against a simulated MCU
+
+Runs the whole serial path, task handler to OutboundSlots, writer thread,
+pyserial, a pty, McuSimulator and back through the reader thread, with
+SIMULATE_SERIAL. A new motor update is offered whenever the writer has
+taken the last one, so the link is never idle, as packets per motor and as
+thruster frames, over a clean link and with corrupted and dropped bytes.
+Reports answers per second, the time from sending a packet to its answer,
+what was lost and the most bytes waiting to be read, from
+SerialConnection.stats().
+
+usage: python3 -m benchmarks.serial_end_to_end [seconds per run]
+"""
+
+from sys import argv
+from time import perf_counter, sleep, time
+from types import SimpleNamespace
+
+import settings
+from snr.comms.serial.serial_connection import SerialConnection
+from snr.datastore import Datastore
+from snr.profiler import Profiler
+
+DEFAULT_RUN_S = 5
+LINKS = [("clean", 0.0, 0.0),
+         ("0.1% corrupt", 0.001, 0.0),
+         ("1% corrupt+drop", 0.005, 0.005)]
+
+
+def dbg(channel: str, message: str = "", args: list = []):
+    pass
+
+
+def run(duration_s: float, bulk: bool,
+        corrupt_rate: float, drop_rate: float) -> dict:
+    settings.SIMULATE_SERIAL = True
+    settings.SIMULATED_MCU_CORRUPT_RATE = corrupt_rate
+    settings.SIMULATED_MCU_DROP_RATE = drop_rate
+    profiler = Profiler(dbg)
+    parent = SimpleNamespace(dbg=dbg, profiler=profiler,
+                             datastore=Datastore(dbg))
+    conn = SerialConnection(parent, "Serial Connection",
+                            "motor_data", "sensor_data")
+    start = perf_counter()
+    n = 0
+    while perf_counter() - start < duration_s:
+        if len(conn.outbound):
+            sleep(0)  # Let the writer take it
+            continue
+        values = [(n + i) % 100 for i in range(settings.NUM_MOTORS)]
+        if bulk:
+            conn.send_receive("set_motors", values, time())
+        else:
+            for motor, value in enumerate(values):
+                conn.send_receive("set_motor", [motor, value], time())
+        n += 1
+    elapsed = perf_counter() - start
+    conn.terminate()
+    stats = conn.stats()
+    return {
+        "answers/s": stats["acks"] / elapsed,
+        "lost": stats["timeouts"]["lost_acks"],
+        "crc": stats["errors"]["crc"],
+        "resync": stats["errors"]["resync_bytes"],
+        "in_waiting": stats["high_water"].get("in_waiting", 0),
+        "p50": stats["rtt_s"]["p50"],
+        "p99": stats["rtt_s"]["p99"],
+    }
+
+
+def main():
+    duration_s = float(argv[1]) if len(argv) > 1 else DEFAULT_RUN_S
+    print("{} s per run, {} baud, {:.1f} ms MCU turnaround".format(
+        duration_s, settings.SERIAL_BAUD,
+        settings.SIMULATED_MCU_TURNAROUND * 1e3))
+    print("{:<18} {:<16} {:>10} {:>8} {:>8} {:>6} {:>5} {:>7} {:>8}".format(
+        "link", "updates", "answers/s", "p50 ms", "p99 ms",
+        "lost", "crc", "resync", "in_wait"))
+    for link, corrupt_rate, drop_rate in LINKS:
+        for name, bulk in [("packet per motor", False),
+                           ("thruster frame", True)]:
+            r = run(duration_s, bulk, corrupt_rate, drop_rate)
+            print("{:<18} {:<16} {:10.1f} {:8.2f} {:8.2f} {:6d} {:5d} {:7d}"
+                  " {:8d}".format(link, name, r["answers/s"], r["p50"] * 1e3,
+                                  r["p99"] * 1e3, r["lost"], r["crc"],
+                                  r["resync"], r["in_waiting"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""CPU used while waiting for the MCU to answer
+
+A pty stands in for the MCU and answers each packet after DELAY_S, or never.
+Waiting for the answer is timed once by polling in_waiting, as
+SerialConnection.read_packet used to, and once with PacketReader's blocking
+reads. Reports the CPU used by the waiting thread as a share of the time
+spent waiting, which should be near zero for blocking reads, and how often
+the thread woke up to check. Some sandboxes under-report the CPU time spent
+in syscalls, the wakeups still show the polling.
+
+usage: python3 -m benchmarks.serial_read_cpu [answers per run]
+"""
+
+import os
+import tty
+from sys import argv
+from threading import Thread
+from time import perf_counter, sleep, thread_time
+
+import serial
+
+from snr.comms.serial import framing
+from snr.comms.serial.packet import PACKET_SIZE, SET_CAM_CMD, Packet
+from snr.comms.serial.packet_reader import PacketReader
+from snr.comms.serial.serial_stats import SerialStats
+from snr.profiler import Profiler
+
+DELAY_S = 0.05  # MCU answer time
+TIMEOUT_S = 0.5  # Port timeout, for the device that never answers
+DEFAULT_ANSWERS = 20
+FRAME_SIZE = PACKET_SIZE + framing.OVERHEAD
+
+
+def dbg(channel: str, message: str, args: list = []):
+    pass
+
+
+def device(fd: int, answer: bool):
+    """Answer each packet after DELAY_S, or swallow it
+    """
+    while True:
+        try:
+            data = os.read(fd, FRAME_SIZE)
+        except OSError:
+            return
+        if answer:
+            sleep(DELAY_S)
+            os.write(fd, data)
+
+
+def busy_wait(port: serial.Serial, reader: PacketReader) -> tuple:
+    # The loop read_packet had, plus a timeout
+    deadline = perf_counter() + TIMEOUT_S
+    polls = 1
+    while port.in_waiting < FRAME_SIZE:
+        polls += 1
+        if perf_counter() > deadline:
+            return "timeout", polls
+    port.read(FRAME_SIZE)
+    return "packet", polls
+
+
+def blocking(port: serial.Serial, reader: PacketReader) -> tuple:
+    return reader.read().status.name, 1
+
+
+def run(wait, answer: bool, n: int) -> tuple:
+    """Share of a core used while waiting, and the results seen
+    """
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    Thread(target=device, args=(master, answer), daemon=True).start()
+    port = serial.Serial(os.ttyname(slave), 115200, timeout=TIMEOUT_S)
+    reader = PacketReader(dbg, SerialStats(Profiler(dbg, False), 1), port)
+    packet = framing.encode(Packet(SET_CAM_CMD, 1, 0).pack()[0])
+    results = {}
+    cpu_s = 0.0
+    wall_s = 0.0
+    wakeups = 0
+    for _ in range(n):
+        port.write(packet)
+        start_cpu = thread_time()
+        start = perf_counter()
+        status, polls = wait(port, reader)
+        wall_s += perf_counter() - start
+        cpu_s += thread_time() - start_cpu
+        wakeups += polls
+        results[status] = results.get(status, 0) + 1
+    port.close()
+    os.close(slave)
+    os.close(master)
+    return cpu_s / wall_s, wakeups / wall_s, results
+
+
+def main():
+    n = int(argv[1]) if len(argv) > 1 else DEFAULT_ANSWERS
+    print("{} reads per run, answers after {:.0f} ms, {:.1f} s timeout"
+          .format(n, DELAY_S * 1e3, TIMEOUT_S))
+    print("{:<16} {:<14} {:>8} {:>10}  {}".format(
+        "device", "wait", "CPU", "wakeups/s", "results"))
+    for device_name, answer, runs in [("answers", True, n),
+                                      ("never answers", False, 2)]:
+        for wait_name, wait in [("busy wait", busy_wait),
+                                ("blocking read", blocking)]:
+            cpu, wakeups, results = run(wait, answer, runs)
+            print("{:<16} {:<14} {:7.1f}% {:10.0f}  {}".format(
+                device_name, wait_name, cpu * 100, wakeups, results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Motor update rate with a packet per motor and with one thruster frame
+
+A thread on the master side of a pty stands in for the MCU, answering as
+arduino/main does: an echo for each SET_MOT_CMD packet and one ack for a
+SET_ALL_MOT_CMD frame. It holds each reply for the time the bytes would
+take on the wire at SERIAL_BAUD, plus a fixed turnaround for the MCU and
+USB. The robot side writes and reads through pyserial like
+SerialConnection, in frames as in framing.py. Rates are from the median
+update time, so the occasional scheduling stall does not swamp the
+comparison.
+
+usage: python3 -m benchmarks.serial_thrusters [seconds per run]
+"""
+
+import os
+import tty
+from sys import argv
+from threading import Event, Thread
+from time import perf_counter
+
+import serial
+
+import settings
+from snr.comms.serial import framing
+from snr.comms.serial.packet import (PACKET_SIZE, SET_ALL_MOT_CMD,
+                                     SET_MOT_CMD, Packet, ThrusterFrame)
+from snr.profiler import Profiler
+
+BYTE_S = 10 / settings.SERIAL_BAUD  # Start, 8 data and stop bits
+TURNAROUND_S = 0.001  # MCU handling and USB polling per reply
+DEFAULT_RUN_S = 5
+
+
+def wait_until(t: float):
+    # sleep() is far too coarse for byte times
+    while perf_counter() < t:
+        pass
+
+
+def dbg(channel: str, message: str, args: list = []):
+    pass
+
+
+def mcu(fd: int, stop: Event):
+    parser = framing.FrameParser(dbg, Profiler(dbg, False))
+    while not stop.is_set():
+        try:
+            data = os.read(fd, 1024)
+        except OSError:
+            return
+        for payload in parser.feed(data):
+            if payload[0] == SET_ALL_MOT_CMD:
+                cmd, seq, count, _ = payload[:PACKET_SIZE]
+                values = payload[PACKET_SIZE:]
+                reply = Packet(SET_ALL_MOT_CMD, count, sum(values) & 0xFF,
+                               seq).pack()[0]
+            else:
+                reply = payload
+            reply = framing.encode(reply)
+            # Bytes in, handling, bytes out
+            received = len(payload) + framing.OVERHEAD
+            wait_until(perf_counter() + (received + len(reply)) * BYTE_S
+                       + TURNAROUND_S)
+            os.write(fd, reply)
+
+
+def per_motor(port: serial.Serial, values: list):
+    for motor, value in enumerate(values):
+        p = Packet(SET_MOT_CMD, motor, value + 127)
+        port.write(framing.encode(p.pack()[0]))
+        port.read(PACKET_SIZE + framing.OVERHEAD)
+
+
+def bulk(port: serial.Serial, values: list):
+    frame = ThrusterFrame([v * 10 for v in values])
+    port.write(framing.encode(frame.pack()[0]))
+    port.read(PACKET_SIZE + framing.OVERHEAD)
+
+
+def run(duration_s: float, update) -> list:
+    """Time taken by each motor update, sorted
+    """
+    master, slave = os.openpty()
+    tty.setraw(master)
+    tty.setraw(slave)
+    stop = Event()
+    mcu_thread = Thread(target=mcu, args=(master, stop), daemon=True)
+    mcu_thread.start()
+    port = serial.Serial(os.ttyname(slave), settings.SERIAL_BAUD,
+                         timeout=1)
+    times = []
+    start = perf_counter()
+    while perf_counter() - start < duration_s:
+        n = len(times)
+        t = perf_counter()
+        update(port, [(n + i) % 100 for i in range(settings.NUM_MOTORS)])
+        times.append(perf_counter() - t)
+    stop.set()
+    port.close()
+    os.close(slave)
+    os.close(master)
+    return sorted(times)
+
+
+def main():
+    duration_s = float(argv[1]) if len(argv) > 1 else DEFAULT_RUN_S
+    print("{} s per run, {} motors at {} baud, {:.1f} ms turnaround".format(
+        duration_s, settings.NUM_MOTORS, settings.SERIAL_BAUD,
+        TURNAROUND_S * 1e3))
+    print("{:<18} {:>8} {:>10} {:>10} {:>10}".format(
+        "", "updates", "p50 ms", "p99 ms", "updates/s"))
+    rates = []
+    for name, update in [("packet per motor", per_motor),
+                         ("thruster frame", bulk)]:
+        times = run(duration_s, update)
+        p50 = times[len(times) // 2]
+        p99 = times[min(len(times) - 1, int(len(times) * 0.99))]
+        rates.append(1 / p50)
+        print("{:<18} {:8d} {:10.2f} {:10.2f} {:10.1f}".format(
+            name, len(times), p50 * 1e3, p99 * 1e3, 1 / p50))
+    print("Thruster frames update the motors x{:.1f} as often".format(
+        rates[1] / rates[0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,26 @@
 import os
 from collections import deque
-from typing import Callable
 
 import settings
 from snr.async_endpoint import AsyncEndpoint
-from snr.utils import Profiler, debug
+from snr.endpoint import Endpoint
+from snr.factory import Factory
+from snr.node import Node
 
 CMD = "vcgencmd measure_temp"
 INVALID_VALUE = -2
 
 
-def measure_temp() -> int:
-    """Only usable on Raspi
-    """
-    try:
-        temp = os.popen(CMD).readline()[5: 8]
-        return int(temp)
-    except Exception as error:
-        self.dbg("int_temp_mon", "Error reading temperature: {}",
-              [error.__repr__()])
-        return INVALID_VALUE
+class IntTempMonFactory(Factory):
+    def __init__(self, output_data_name: str):
+        super().__init__()
+        self.output_data_name = output_data_name
+
+    def get(self, parent: Node) -> Endpoint:
+        return IntTempMon(parent, self.output_data_name)
+
+    def __repr__(self):
+        return "Internal Temperature Monitor Factory"
 
 
 class IntTempMon(AsyncEndpoint):
@@ -27,31 +28,47 @@ class IntTempMon(AsyncEndpoint):
 
     Settings toggle of this class' use must be done in the calling
     class because topside and robot toggles for this device are separate
+
+    Runs on the Node's shared executor since it only ticks every few seconds
     """
 
-    def __init__(self, name: str, store_data: Callable, profiler: Profiler):
-        super().__init__(name,
-                         self.monitor_temp,
+    def __init__(self, parent: Node, name: str):
+        self.task_producers = []
+        self.task_handlers = {}
+        super().__init__(parent, name,
+                         self.init_temp, self.monitor_temp,
                          settings.INT_TEMP_MON_TICK_RATE,
-                         profiler)
-        self.store_data = store_data
+                         shared=True)
+        self.datastore = self.parent.datastore
         self.deque = deque()
         self.sum = 0.0
 
-        self.init_temp()
-        self.loop()
+        self.start_loop()
+
+    def measure_temp(self) -> int:
+        """Only usable on Raspi
+        """
+        try:
+            temp = os.popen(CMD).readline()[5: 8]
+            return int(temp)
+        except Exception as error:
+            self.dbg("int_temp_mon", "Error reading temperature: {}",
+                     [error.__repr__()])
+            return INVALID_VALUE
 
     def init_temp(self):
         """Prepare the monitor for use"""
+        self.deque.clear()
+        self.sum = 0.0
         for i in range(0, settings.INT_TEMP_MON_AVG_PERIOD):
             self.deque.appendleft(i)
             self.sum += i
 
     def monitor_temp(self):
         """Main entry point called during loop"""
-        self.queue_reading(measure_temp())
+        self.queue_reading(self.measure_temp())
         avg = self.compute_avg()
-        self.store_data(avg)  # Send data to Node's datastore
+        self.datastore.store(self.name, avg)  # Send data to Node's datastore
         self.dbg("int_temp_mon", "Temperature: {}'C", [avg])
 
     def queue_reading(self, new_val: int):
@@ -64,4 +81,4 @@ class IntTempMon(AsyncEndpoint):
         return self.sum / settings.INT_TEMP_MON_AVG_PERIOD
 
     def terminate(self):
-        super().set_terminate_flag()
+        pass
@@ -10,6 +10,7 @@ respectively.
 from sys import argv
 
 import settings
+from internal_temp import IntTempMonFactory
 from robot_controls import RobotControlsFactory
 from snr.camera.factory import CameraManagerPair
 from snr.comms.serial.factory import SerialFactory
@@ -17,6 +18,8 @@ from snr.comms.sockets.factory import EthernetLink
 from snr.io.controller.factory import ControllerFactory
 from snr.zynq.factory import ZyboFactory
 from snr.node import Node
+from snr.perf_monitor import PerfMonitorFactory
+from snr.telemetry import TelemetryFactory
 from snr.utils.utils import print_exit, print_mode, print_usage
 from snr.utils.debug import Debugger
 from ui.gui.factory import GUIFactory
@@ -65,6 +68,18 @@ def main():
     # UART/USB link to Arduino for motor control and sensor reading
     serial_link = SerialFactory("motor_data", "sensor_data",
                                 "path_to_arduino_program(unimplemented)")
+    # Raspberry Pi internal temperature
+    temp_mon = IntTempMonFactory(settings.ROBOT_INT_TEMP_NAME)
+    # Performance snapshots, sent to topside with the telemetry data
+    perf_mon = PerfMonitorFactory(settings.PERF_DATA_NAME)
+    # Telemetry data served to topside, keyed by datastore entry
+    telemetry = TelemetryFactory(settings.TELEMETRY_DATA_NAME, {
+        settings.PERF_DATA_NAME: settings.PERF_DATA_NAME,
+        # Streamed by the MCU, see SerialConnection.handle_sensor_frame
+        "sensors": "sensor_data",
+        # Stored by SerialConnection every SERIAL_STATS_WINDOW_S
+        "serial": settings.SERIAL_STATS_NAME,
+    })
     # Cameras
     cameras = CameraManagerPair({
         # "main_camera0": 0,
@@ -93,10 +108,15 @@ def main():
     elif role.__eq__("robot"):
         components = [controls_link.client,
                       telemetry_link.server,
+                      telemetry,
                       robot_controls,
                       serial_link,
                     #   cameras.source
                       ]
+        if settings.USE_ROBOT_PI_TEMP_MON:
+            components.append(temp_mon)
+        if settings.USE_ROBOT_PERF_MON:
+            components.append(perf_mon)
     elif role.__eq__("zybo"):
         components = [controls_link.client,
                       telemetry_link.server,
@@ -2,6 +2,7 @@
 determines axis of thrust and stores state information
 """
 
+from time import time
 from typing import List
 
 import settings
@@ -59,6 +60,7 @@ class ControlsProcessor(Endpoint):
         # Input data
         self.control_input = {}
         self.previous_cntl_input = {}
+        self.capture_time = None  # Of the controls sample, in our clock
 
         # Internal data
         self.axis_list = ['x', 'y', 'z', "yaw", "roll"]
@@ -89,8 +91,29 @@ class ControlsProcessor(Endpoint):
         self.dbg("robot_control_event", "Processing control input")
         controls_data = self.datastore.use(settings.CONTROLS_DATA_NAME)
         self.dbg("robot_control_verbose", "Control input {}", [controls_data])
+        if (isinstance(controls_data, dict) and
+                settings.TIMESTAMPS_KEY in controls_data):
+            controls_data = dict(controls_data)
+            self.log_latency(controls_data.pop(settings.TIMESTAMPS_KEY))
         return self.receive_controls(controls_data)
 
+    def log_latency(self, stamps: dict):
+        """Record how long a new controls sample took to get processed
+        """
+        capture = stamps.get("capture")
+        if capture is None or capture == self.capture_time:
+            # Already processed this sample
+            return
+        self.capture_time = capture
+        now = time()
+        received = stamps.get("received")
+        if received is not None:
+            # Missing when the clock could not be synced, see sync_clock()
+            self.profiler.log_latency("latency:controls:receive_to_process",
+                                      now - received)
+        self.profiler.log_latency("latency:controls:capture_to_process",
+                                  now - capture)
+
     def get_throttle_data(self):
         print(self.throttle)
         return self.throttle
@@ -223,7 +246,8 @@ class ControlsProcessor(Endpoint):
         #         self.previous_throttle[axis] = self.throttle[axis]
         #         task_list.append(t)
         self.motor_control.update_motor_targets(self.get_throttle_data())
-        task_list = self.motor_control.generate_serial_tasks()
+        task_list = self.motor_control.generate_serial_tasks(
+            self.capture_time)
         return task_list
 
     def throttle_value_list(self) -> List[int]:
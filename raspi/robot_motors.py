@@ -30,7 +30,7 @@ The thruster configuration does not enable Pitch control, which must
 be achieved by bouyancy
 """
 
-from typing import Callable, List
+from typing import Callable, List, Union
 
 import settings
 from snr.async_endpoint import AsyncEndpoint
@@ -112,12 +112,27 @@ class RobotMotors(AsyncEndpoint):
             else:
                 self.motor_values[index] -= settings.MOTOR_MAX_DELTA
 
-    def generate_serial_tasks(self) -> SomeTasks:
+    def generate_serial_tasks(self, timestamp: Union[float, None] = None
+                              ) -> SomeTasks:
+        """Serial tasks for changed motor values
+
+        timestamp is the capture time of the controls that led to them.
+        """
         task_list = []
+        if settings.SERIAL_BULK_THRUSTERS:
+            # Every value in one frame when any changed
+            if self.motor_values != self.motor_previous:
+                task_list.append(Task("serial_com", TaskPriority.high,
+                                      ["set_motors"] + self.motor_values,
+                                      timestamp=timestamp))
+            self.dbg("motor_control", "Generated {} serial task(s)",
+                     [len(task_list)])
+            return task_list
         for index in range(settings.NUM_MOTORS):
             if not self.motor_values[index] == self.motor_previous[index]:
                 t = Task("serial_com", TaskPriority.high,
-                         ["set_motor", index, self.motor_values[index]])
+                         ["set_motor", index, self.motor_values[index]],
+                         timestamp=timestamp)
                 task_list.append(t)
 
         self.dbg("motor_control", "Generated {} serial task(s)", [len(task_list)])
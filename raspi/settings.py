@@ -7,6 +7,7 @@ a specific file, it will not be updated for other files.
 """
 
 from snr.comms.sockets.config import SocketsConfig
+from snr.utils.realtime import SchedConfig
 
 # TODO: Investigate converting settings values to an object
 # (Maybe keeping a per Node settings object)
@@ -15,8 +16,18 @@ from snr.comms.sockets.config import SocketsConfig
 # TODO: Track debugging for server and client separately
 DEBUGGING_DELAY_S = 0
 DEBUG_PRINTING = True
-DEBUG_LOGGING = False  # Not yet implemented
+DEBUG_LOGGING = False  # JSON records of active channels, see LogWriter
+DEBUG_LOG_FORMAT = "json"  # Or "binary", read with snr.utils.log_query
+DEBUG_LOG_PATH = "logs/debug"  # Extension added for the format
+DEBUG_LOG_MAX_BYTES = 5 * 2**20  # Rotate to a new file past this size
+DEBUG_LOG_BACKUPS = 5  # Rotated files kept
+DEBUG_LOG_FSYNC_S = 5.0  # Sync at most this often, None to leave it to the OS
+DEBUG_LOG_JOIN_TIMEOUT_S = 2.0  # Wait for the log writer at shutdown
+DEBUG_QUEUE_LEN = 10000  # Lines waiting to print before new ones are dropped
+DEBUG_BATCH_LEN = 256  # Most lines written at once
 DEBUG_CHANNELS = {
+    "async_endpoint_error": True,
+
     "camera_verbose": False,
 
     "controller": True,
@@ -57,10 +68,15 @@ DEBUG_CHANNELS = {
     "motor_control": True,
     "motor_control_verbose": False,
 
-    "profiling_avg": False,
-    "profiling_task": False,
+    "perf_monitor": True,
+    "perf_monitor_verbose": False,
+
+    "proc_endpoint_error": True,
+
     "profiling_endpoint": False,
     "profiling_dump": True,
+    "profiling_summary": True,
+    "profiling_warning": True,
 
     "robot": True,
     "robot_verbose": False,
@@ -70,12 +86,17 @@ DEBUG_CHANNELS = {
     "robot_control_event": False,
     "robot_control_verbose": False,
 
+    "sampler": True,
+
     "schedule": True,
     "schedule_warn": True,
     "schedule_event": False,
     "schedule_verbose": False,
     "schedule_new_tasks": False,
 
+    "sched": True,
+    "sched_warning": True,
+
     "serial": True,
     "serial_finder": True,
     "serial_error": True,
@@ -106,6 +127,12 @@ DEBUG_CHANNELS = {
     "sockets_receive": True,
     "sockets_receive_verbose": False,
 
+    "supervisor": True,
+    "supervisor_error": True,
+    "supervisor_warning": True,
+    "supervisor_verbose": False,
+    "supervisor_dump": True,
+
     "telemetry_verbose": True,
 
     "test": True,
@@ -118,11 +145,52 @@ DEBUG_CHANNELS = {
     "throttle_verbose": False,
     "axis_update_verbose": False,
 }
+# Limits for noisy channels, see ChannelPolicy: rate_hz, sample_n, on_change
+DEBUG_CHANNEL_POLICIES = {
+    "framework_warning": {"rate_hz": 1},
+    "schedule_verbose": {"sample_n": 100},
+    "serial_verbose": {"on_change": True},
+}
 
 THREAD_END_WAIT_S = 2
 DISABLE_SLEEP = False
 ENABLE_PROFILING = True
-PROFILING_AVG_WINDOW_LEN = 64
+PROFILING_WINDOWS_S = [10, 60]  # Windows to report rates and percentiles
+PROFILING_DUMP_PERIOD_S = 60  # Time between periodic profiler summaries
+PROFILING_BATCH_LEN = 64  # Samples a ProcEndpoint child sends at once
+PROFILING_BATCH_PERIOD_S = 1.0  # Longest a child holds on to samples
+PROFILING_COLLECTOR_JOIN_S = 1.0  # Wait for child samples on terminate
+# Keep every profiled span for a timeline, written on exit (needs profiling)
+ENABLE_TRACING = False
+TRACE_BUFFER_LEN = 100000  # Most recent spans kept, about 15 MB when full
+TRACE_OUTPUT_PATH = "trace"  # Writes trace.json and trace.folded
+
+# Thread scheduling per node role, keyed by endpoint name
+# "node" is the task loop, "shared_executor" the SharedExecutor thread, and
+# "async_endpoint"/"proc_endpoint" apply to endpoints without their own entry
+# SCHED_FIFO and mlockall need root or CAP_SYS_NICE/CAP_IPC_LOCK, without
+# them the endpoint runs with whatever else could be applied
+ENDPOINT_SCHEDULING = {
+    "robot": {
+        # Keep thruster control on core 0, away from video encoding
+        # No SCHED_FIFO for the node loop while it spins waiting for tasks,
+        # it would starve the motor thread sharing its core
+        "node": SchedConfig(cpus=[0], nice=-10, lock_memory=True),
+        "Robot Motor Controller": SchedConfig(cpus=[0], nice=-10,
+                                              fifo_priority=49),
+        "shared_executor": SchedConfig(cpus=[1], nice=5),
+        "async_endpoint": SchedConfig(cpus=[1]),
+        "proc_endpoint": SchedConfig(cpus=[2, 3], nice=10),
+    },
+    "topside": {},
+}
+
+# Endpoint supervisor: restarts crashed endpoints
+SUPERVISOR_CHECK_PERIOD_S = 0.5  # Time between endpoint health checks
+SUPERVISOR_BACKOFF_INITIAL_S = 0.5  # Wait before the first restart
+SUPERVISOR_BACKOFF_FACTOR = 2  # Wait multiplier for each repeated failure
+SUPERVISOR_BACKOFF_MAX_S = 8  # Longest wait between restarts
+SUPERVISOR_STABLE_S = 30  # Uptime after which the backoff is reset
 
 
 # Command Line User Interface
@@ -133,7 +201,8 @@ TOPSIDE_UI_TICK_RATE = 24  # Hz (Times per second)
 USE_GUI = True
 GUI_channels = {
     "controller": True,
-    "telem": True
+    "telem": True,
+    "perf": True
 }
 
 # XBox Controller
@@ -144,6 +213,9 @@ CONTROLLER_NAME = "topside_xbox_controller"
 CONTROLLER_INIT_TICK_RATE = 1
 CONTROLLER_TICK_RATE = 30  # Hz (Times per second)
 CONTROLLER_ZERO_TRIGGERS = True
+# Run controller polling on the Node's shared executor thread, off by default
+# as its latency then depends on every other endpoint on the executor
+CONTROLLER_SHARED_EXECUTOR = False
 '''Mapping of pygame joystick output to values we can make sense of
 Examples:
 "pygame_name": ["name_we_use"],
@@ -202,6 +274,9 @@ SOCKETS_MAX_CONNECTIONS = 2  # Maximun concurrent connections
 SOCKETS_CONNECT_ATTEMPTS = 120
 SOCKETS_RETRY_WAIT = 1  # seconds to wait before retrying sockets connection
 MAX_SOCKET_SIZE = 8192  # Maximum size for single receiving call
+# Key of the time stamps added to dict data sent over sockets
+TIMESTAMPS_KEY = "timestamps"
+CLOCK_SYNC_WINDOW = 32  # Recent requests to pick the clock offset from
 '''Note: SOCKETS_CONNECT_ATTEMPTS * SOCKETS_RETRY_WAIT = timeout for sockets
     connection
     This timeout should be very long to allow the server to open its socket
@@ -228,16 +303,36 @@ TELEMETRY_SOCKETS_CONFIG = SocketsConfig(telemetry_server_ip,
                                          telemetry_server_port,
                                          REQUIRE_TELEMETRY_SOCKETS)
 TELEMETRY_DATA_NAME = "telemetry_data"
+TELEMETRY_TICK_RATE = 10  # Hz, how often the robot rebuilds its telemetry
 
 
 # Serial Connection
-SIMULATE_SERIAL = False
+SIMULATE_SERIAL = False  # Talk to an McuSimulator on a pty instead
 SERIAL_BAUD = 115200  # Serial Baudrate
 SERIAL_MAX_ATTEMPTS = 4  # Maximum number of times to try openeing serial port
 SERIAL_RETRY_WAIT = 0.5  # Time to wait before retrying serial connection
 SERIAL_TIMEOUT = 4
 SERIAL_SETUP_WAIT_PRE = 1
 SERIAL_SETUP_WAIT_POST = 1
+# All thruster values in one frame with one ack, needs matching MCU firmware
+SERIAL_BULK_THRUSTERS = True
+# Packets sent before waiting for answers, the MCU must buffer them all
+SERIAL_WINDOW = 4
+SERIAL_ACK_TIMEOUT = 0.5  # Seconds before an answer is counted as lost
+# USB (vendor, product) ids of MCU boards, None for any product
+SERIAL_USB_IDS = [(0x16C0, 0x0483),  # Teensy
+                  (0x2341, None),  # Arduino
+                  (0x1A86, 0x7523),  # CH340 clones
+                  (0x0403, 0x6001)]  # FTDI
+SERIAL_PORT_CACHE = "logs/serial_port"  # Last port that opened, tried first
+SERIAL_SENSOR_RATE_HZ = 20  # Sensor frames the MCU streams per second, 0: off
+SERIAL_STATS_NAME = "serial_stats"  # Datastore key of SerialConnection.stats()
+SERIAL_STATS_WINDOW_S = 5.0  # Rates in serial stats are over this long
+# McuSimulator, used when SIMULATE_SERIAL
+SIMULATED_MCU_BYTE_DELAY = 10 / SERIAL_BAUD  # Seconds per byte on the wire
+SIMULATED_MCU_TURNAROUND = 0.001  # MCU handling and USB polling per answer
+SIMULATED_MCU_CORRUPT_RATE = 0.0  # Chance each byte sent back is corrupted
+SIMULATED_MCU_DROP_RATE = 0.0  # Chance each byte sent back is lost
 
 # Zynq Zybo FPGA DMA
 SIMULATE_DMA = False
@@ -250,5 +345,18 @@ ROBOT_INT_TEMP_NAME = "robot_int_temp_mon"
 INT_TEMP_MON_TICK_RATE = 0.25  # Hz (Readings per second)
 INT_TEMP_MON_AVG_PERIOD = 4  # Number of readings to average over
 
+# Sampling profiler, toggle with SIGUSR1 and dump with SIGUSR2
+ENABLE_SAMPLER = True  # Start sampling with the Node
+SAMPLER_RATE_HZ = 25  # Stack samples per second of every thread
+SAMPLER_MAX_STACKS = 2000  # Distinct stacks kept, the rest count as other
+SAMPLER_OUTPUT_PATH = "samples"  # Writes samples_<pid>.folded
+
+# Performance Monitor
+USE_ROBOT_PERF_MON = True
+PERF_DATA_NAME = "perf_data"  # Also the key in the telemetry data
+PERF_MON_TICK_RATE = 1  # Hz (Snapshots per second)
+PERF_MIN_LOOP_HZ = 20  # Node loop rate below which the robot is behind
+PERF_MAX_TASK_QUEUE = 20  # Queued tasks above which the robot is behind
+
 # Robot selection
 ROBOT_NAME = "Seaymour"
@@ -5,7 +5,7 @@ AsyncEndpoint: Generate and process data for Nodes
 Relay: Server data to other nodes
 """
 
-from time import time
+from time import perf_counter_ns
 from typing import Callable
 
 import _thread
@@ -14,7 +14,6 @@ import _thread
 from snr.endpoint import Endpoint
 from snr.node import Node
 from snr.utils.utils import sleep
-from snr.profiler import Timer
 
 
 class AsyncEndpoint(Endpoint):
@@ -24,29 +23,42 @@ class AsyncEndpoint(Endpoint):
     endpoint may produce data to be stored in the Node or retreive data from
     the Node. The endpoint has its loop handler function run according to its
     tick_rate (Hz).
+
+    Low rate endpoints that never block can set shared to have their loop run
+    on the Node's SharedExecutor thread instead of a thread of their own.
     """
 
     def __init__(self, parent: Node, name: str,
                  setup_handler: Callable, loop_handler: Callable,
-                 tick_rate_hz: float):
+                 tick_rate_hz: float, shared: bool = False):
         super().__init__(parent, name)
         self.setup = setup_handler
         self.loop_handler = loop_handler
+        self.shared = shared
         self.terminate_flag = False
+        self.alive = False  # Whether the loop thread is running
         self.set_delay(tick_rate_hz)
 
-        if parent:
-            self.profiler = parent.profiler
-        else:
-            self.profiler = None
-
     def set_delay(self, tick_rate_hz: float):
         if tick_rate_hz == 0:
+            # Warn once here rather than on every loop iteration
+            self.dbg("framework_warning",
+                     "async_endpoint {} does not sleep (max tick rate)",
+                     [self.name])
             self.delay = 0.0
         else:
             self.delay = 1.0 / tick_rate_hz
 
     def start_loop(self):
+        self.alive = True
+        if self.parent:
+            self.parent.supervisor.watch(self)
+        if self.shared and self.parent:
+            self.dbg("framework",
+                     "Scheduling async endpoint {} on shared executor",
+                     [self.name])
+            self.parent.executor.add(self)
+            return
         self.dbg("framework",
                  "Starting async endpoint {} thread",
                  [self.name])
@@ -60,36 +72,49 @@ class AsyncEndpoint(Endpoint):
         return
 
     def threaded_method(self):
-        self.setup()
-
-        while not self.terminate_flag:
-            if self.profiler is None:
-                self.loop_handler()
-            else:
-                self.profiler.time(self.name, self.loop_handler)
-
-                # self.dbg("profiling_endpoint",
-                #       "Ran {} task in {:6.3f} us",
-                #       [self.name, runtime * 1000000])
+        try:
+            self.apply_scheduling("async_endpoint")
+            self.setup()
 
-            self.tick()
+            while not self.terminate_flag:
+                self.step()
+                self.tick()
+        except (Exception, SystemExit) as e:
+            # Leave terminate_flag unset so the supervisor restarts us
+            self.dbg("async_endpoint_error", "{}, e: {}", [self.name, e])
 
         self.dbg("framework", "Async endpoint {} exited loop", [self.name])
-        self.terminate()
+        try:
+            self.terminate()
+        finally:
+            self.alive = False
         # print_exit("Endpoint thread exited by termination")
 
+    def step(self):
+        """Run the loop handler once
+        """
+        if self.profiler.enabled:
+            start_ns = perf_counter_ns()
+            self.loop_handler()
+            self.profiler.record(self.name, start_ns)
+        else:
+            self.loop_handler()
+
     def get_name(self):
         return self.name
 
     def tick(self):
         # TODO: Ensure that this does not block other threads: thread.sleep()?
-        if (self.delay == 0.0):
-            self.dbg("framework_warning",
-                     "async_endpoint {} does not sleep (max tick rate)",
-                     [self.name])
-        else:
+        if self.delay > 0.0:
             sleep(self.delay)
 
     def set_terminate_flag(self):
         self.terminate_flag = True
         self.dbg("framework", "Terminating endpoint {}", [self.name])
+
+    def has_failed(self) -> bool:
+        return not self.alive and not self.terminate_flag
+
+    def restart(self):
+        self.terminate_flag = False
+        self.start_loop()
@@ -8,7 +8,7 @@ import struct
 import numpy as np
 import cv2
 
-from snr.proc_endpoint import ProcEndpoint
+from snr.event_endpoint import EventProcEndpoint
 from snr.node import Node
 from snr.utils import debug
 from snr.cv import find_plants
@@ -22,19 +22,20 @@ FRAME_SKIP_COUNT = 5
 # Title of the window
 WINDOW_TITLE = 'Video'
 
-TICK_RATE_HZ = 0.0  # never sleep the server
+# Longest wait for a frame before checking in again
+WAIT_TIMEOUT_S = 1.0
 
 
-class VideoReceiver(ProcEndpoint):
+class VideoReceiver(EventProcEndpoint):
     """Video stream receiving endpoint.
     Shows video received over IP in window.
+    Blocks on the video socket instead of ticking.
     """
 
     def __init__(self, parent: Node, name: str,
                  receiver_port: int):
         super().__init__(parent, name,
-                         self.init_receiver, self.monitor_stream,
-                         TICK_RATE_HZ)
+                         self.init_receiver, self.monitor_stream)
 
         self.receiver_port = receiver_port
         self.window_name = f"Raspberry Pi Stream: {self.name}"
@@ -54,7 +55,13 @@ class VideoReceiver(ProcEndpoint):
             self.dbg("camera_event",
                      "{}: Socket now listening on {}",
                      [self.name, self.receiver_port])
+            self.waiter.register(self.s)
+            while not self.wait(WAIT_TIMEOUT_S):
+                if self.terminate_flag:
+                    return
             self.conn, self.addr = self.s.accept()
+            self.waiter.unregister(self.s)
+            self.waiter.register(self.conn)
         except Exception as e:
             if isinstance(e, KeyboardInterrupt):
                 raise(e)
@@ -68,16 +75,16 @@ class VideoReceiver(ProcEndpoint):
     def monitor_stream(self):
         try:
             # Retrieve message size
-            while len(self.data) < self.payload_size:
-                self.data += self.conn.recv(4096)
+            if not self.receive(self.payload_size):
+                return
 
             packed_msg_size = self.data[:self.payload_size]
             self.data = self.data[self.payload_size:]
             msg_size = struct.unpack("=L", packed_msg_size)[0]
 
             # Retrieve all data based on message size
-            while len(self.data) < msg_size:
-                self.data += self.conn.recv(4096)
+            if not self.receive(msg_size):
+                return
 
             frame_data = self.data[:msg_size]
             self.data = self.data[msg_size:]
@@ -107,6 +114,22 @@ class VideoReceiver(ProcEndpoint):
                      [e])
             self.set_terminate_flag()
 
+    def receive(self, size: int) -> bool:
+        """Fill the buffer to size bytes, False if terminated first
+        """
+        while len(self.data) < size:
+            if not self.wait(WAIT_TIMEOUT_S):
+                if self.terminate_flag:
+                    return False
+                continue
+            chunk = self.conn.recv(4096)
+            if not chunk:
+                raise ConnectionError("Video source closed the connection")
+            self.profiler.count("video_rx_bytes", len(chunk))
+            self.data += chunk
+        return True
+
     def terminate(self):
+        self.waiter.close()
         cv2.destroyAllWindows()
         self.parent.datastore.store(f"{self.name}_recvd_frames", self.count)
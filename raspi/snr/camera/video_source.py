@@ -88,6 +88,7 @@ class VideoSource(ProcEndpoint):
                          "{}: Sending frame data of size: {}",
                          [self.name, size])
                 self.client_socket.sendall(message_size + data)
+                self.profiler.count("video_tx_bytes", size + len(message_size))
 
         except KeyboardInterrupt:
             self.set_terminate_flag()
@@ -0,0 +1,100 @@
+"""Serial commands understood by the MCU, the one list for both sides
+
+packet.py takes its command codes from COMMANDS, and arduino/main/commands.h
+is generated from it, along with the framing constants and sensor ids:
+    python3 -m snr.comms.serial.commands ../arduino/main/commands.h
+or make commands_header. Change the codes here, never in the header.
+"""
+
+from sys import argv
+from typing import List
+
+
+class Command:
+    def __init__(self, name: str, define: str, code: int, comment: str):
+        self.name = name  # As in CMD_NAMES and the Datastore
+        self.define = define  # Name of the constant on both sides
+        self.code = code
+        self.comment = comment
+
+
+COMMANDS = [
+    Command("establish_connection", "EST_CON_CMD", 0x10,
+            "establish connection (call)"),
+    Command("set_motor", "SET_MOT_CMD", 0x20,
+            "set motor, value1 motor, value2 speed"),
+    Command("set_motors", "SET_ALL_MOT_CMD", 0x24,
+            "set every motor, value1 int16 values follow"),
+    Command("set_cam", "SET_CAM_CMD", 0x33,
+            "set camera mux to camera value1"),
+    Command("read_sensor", "RD_SENS_CMD", 0x40,
+            "stream sensor frames at value1 Hz, 0 stops them"),
+    Command("sensor_frame", "SENSOR_FRAME_CMD", 0x41,
+            "sensor readings sent unasked, see sensors.h"),
+    Command("blink", "BLINK_CMD", 0x62, "blink"),
+    Command("invalid", "INV_CMD_ACK", 0xFF,
+            "invalid command, value2 of response contains cmd"),
+]
+COMMAND_CODES = {c.define: c.code for c in COMMANDS}
+
+HEADER_PATH = "../arduino/main/commands.h"
+
+
+def generate_header() -> str:
+    # Imported here as packet.py imports this module
+    from snr.comms.serial import framing
+    from snr.comms.serial.packet import PACKET_SIZE, THRUST_FRAME_MAX
+    from snr.comms.serial.sensors import SENSOR_TYPES
+
+    lines = ["// Generated by raspi/snr/comms/serial/commands.py, "
+             "do not edit.",
+             "// Regenerate with make commands_header in raspi/",
+             "#ifndef COMMANDS_H",
+             "#define COMMANDS_H",
+             "",
+             "#define PACKET_LENGTH {}".format(PACKET_SIZE),
+             ""]
+    lines += define_lines([(c.define, "0x{:02X}".format(c.code), c.comment)
+                           for c in COMMANDS])
+    lines += [""]
+    lines += define_lines([
+        ("FRAME_SYNC_1", "0x{:02X}".format(framing.SYNC[0]), "frame start"),
+        ("FRAME_SYNC_2", "0x{:02X}".format(framing.SYNC[1]), ""),
+        ("FRAME_MAX_PAYLOAD", str(framing.MAX_PAYLOAD), ""),
+        ("CRC_INIT", "0x{:04X}".format(framing.CRC_INIT),
+         "CRC-16/CCITT-FALSE"),
+        ("THRUST_FRAME_MAX", str(THRUST_FRAME_MAX),
+         "thruster frame value for full thrust"),
+    ])
+    lines += ["", "// Sensor ids, values are little endian"]
+    lines += define_lines([
+        ("SENSOR_" + s.name.upper(), "0x{:02X}".format(sensor_id),
+         "{} {}{}".format(s.codec.format, ", ".join(s.fields),
+                          "" if s.scale == 1 else " x{:g}".format(s.scale)))
+        for sensor_id, s in sorted(SENSOR_TYPES.items())])
+    lines += ["", "#endif", ""]
+    return "\n".join(lines)
+
+
+def define_lines(defines: List[tuple]) -> List[str]:
+    """Aligned #defines from (name, value, comment)
+    """
+    width = max(len(name) for name, _, _ in defines)
+    lines = []
+    for name, value, comment in defines:
+        line = "#define {} {}".format(name.ljust(width), value)
+        if comment:
+            line += " // " + comment
+        lines.append(line)
+    return lines
+
+
+def main():
+    path = argv[1] if len(argv) > 1 else HEADER_PATH
+    with open(path, "w") as f:
+        f.write(generate_header())
+    print("Wrote {}".format(path))
+
+
+if __name__ == "__main__":
+    main()
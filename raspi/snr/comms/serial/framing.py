@@ -0,0 +1,142 @@
+"""Framing for packets on the serial link
+
+Each packet or thruster frame travels as:
+    SYNC (0xA5 0x5A), payload length (1 byte), payload, CRC (2 bytes)
+The CRC is CRC-16/CCITT-FALSE of the length and payload, little endian, as
+computed by binascii.crc_hqx and crc16_update in arduino/main/serial.h.
+
+A dropped or corrupted byte costs only the frame it was in. The parser
+discards frames that fail the CRC and looks for the next sync marker from
+the byte after the bad frame's marker, so the stream is never left out of
+step.
+"""
+
+import struct
+from binascii import crc_hqx
+from typing import Callable, List
+
+from snr.profiler import Profiler
+
+SYNC = b"\xa5\x5a"
+HEADER_SIZE = len(SYNC) + 1
+CRC_SIZE = 2
+OVERHEAD = HEADER_SIZE + CRC_SIZE
+MAX_PAYLOAD = 64  # Matches FRAME_MAX_PAYLOAD on the MCU
+CRC_INIT = 0xFFFF
+
+# SYNC, length and payload, CRC, by length and payload size
+frame_codecs = {}
+
+
+def frame_codec_for(body_size: int) -> struct.Struct:
+    codec = frame_codecs.get(body_size)
+    if codec is None:
+        codec = struct.Struct("<{}s{}sH".format(len(SYNC), body_size))
+        frame_codecs[body_size] = codec
+    return codec
+
+
+def crc16(data: bytes) -> int:
+    return crc_hqx(data, CRC_INIT)
+
+
+def encode(payload: bytes) -> bytes:
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError("Payload of {} bytes, at most {} fit in a frame"
+                         .format(len(payload), MAX_PAYLOAD))
+    body = bytes((len(payload),)) + payload
+    return SYNC + body + crc16(body).to_bytes(CRC_SIZE, "little")
+
+
+class FrameEncoder:
+    """Frames many packets into one preallocated buffer, for a single write
+
+    Packets need frame_body() and the frame_codec from frame_codec_for()
+    for its size, as Packet and ThrusterFrame have, so each frame is packed
+    by one precompiled Struct.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.buf = bytearray(capacity)
+
+    def encode(self, packets: List) -> memoryview:
+        """The frames, valid until the next call
+        """
+        total = sum(p.frame_codec.size for p in packets)
+        if total > len(self.buf):
+            self.buf = bytearray(max(total, 2 * len(self.buf)))
+        buf = self.buf
+        offset = 0
+        for p in packets:
+            body = p.frame_body()
+            codec = p.frame_codec
+            codec.pack_into(buf, offset, SYNC, body, crc_hqx(body, CRC_INIT))
+            offset += codec.size
+        return memoryview(buf)[:offset]
+
+
+class FrameParser:
+    """Finds frames in a byte stream fed in pieces of any size
+
+    Counts frames with a bad CRC as serial_crc_errors and bytes skipped while
+    looking for a frame as serial_resync_bytes.
+    """
+
+    def __init__(self, dbg: Callable, profiler: Profiler):
+        self.dbg = dbg
+        self.profiler = profiler
+        self.buf = bytearray()
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Payloads of the frames completed by data
+        """
+        buf = self.buf
+        buf += data
+        payloads = []
+        pos = 0  # Everything before pos has been dealt with
+        skipped = 0
+        while True:
+            start = buf.find(SYNC, pos)
+            if start < 0:
+                # Keep a last byte that could be the first half of SYNC
+                keep = len(buf) - 1 if buf.endswith(SYNC[:1]) else len(buf)
+                skipped += max(0, keep - pos)
+                pos = max(pos, keep)
+                break
+            skipped += start - pos
+            pos = start
+            if start + HEADER_SIZE > len(buf):
+                break
+            length = buf[start + len(SYNC)]
+            if length > MAX_PAYLOAD:
+                # Not a real header, look again after this marker
+                self.profiler.count("serial_bad_lengths")
+                pos = start + 1
+                skipped += 1
+                continue
+            end = start + HEADER_SIZE + length + CRC_SIZE
+            if end > len(buf):
+                break
+            body = bytes(buf[start + len(SYNC):end - CRC_SIZE])
+            if crc16(body) != int.from_bytes(buf[end - CRC_SIZE:end],
+                                             "little"):
+                self.profiler.count("serial_crc_errors")
+                self.dbg("serial_warning", "Dropped frame with bad CRC")
+                pos = start + 1
+                skipped += 1
+                continue
+            payloads.append(body[1:])
+            pos = end
+        del buf[:pos]
+        if skipped:
+            self.profiler.count("serial_resync_bytes", skipped)
+            self.dbg("serial_warning", "Skipped {} bytes to find a frame",
+                     [skipped])
+        if payloads:
+            self.profiler.count("serial_frames_rx", len(payloads))
+        return payloads
+
+    def partial(self) -> int:
+        """Bytes held of a frame that has not all arrived
+        """
+        return len(self.buf)
@@ -0,0 +1,164 @@
+"""Simulated MCU on a pseudo-terminal
+
+Handles packets as arduino/main/main.ino does, so SerialConnection can run
+its whole I/O path, pyserial, framing, the window and the reader thread,
+without the robot. Each answer is held for the time its bytes and the
+packet's would take on the wire plus a turnaround for the MCU and USB, and
+bytes sent back can be corrupted or dropped to exercise resynchronizing.
+Linux and macOS only, as it needs os.openpty.
+"""
+
+import os
+import random
+import struct
+import tty
+from select import select
+from threading import Event, Thread
+from time import perf_counter, sleep
+from typing import Callable, Union
+
+from snr.comms.serial import framing
+from snr.comms.serial.packet import (BLINK_CMD, INV_CMD_ACK, PACKET_SIZE,
+                                     RD_SENS_CMD, SENSOR_FRAME_CMD,
+                                     SET_ALL_MOT_CMD, SET_CAM_CMD,
+                                     SET_MOT_CMD, THRUST_VALUE_FORMAT)
+from snr.profiler import Profiler
+
+NUM_MOTORS = 6  # As in arduino/main/settings.h
+MCU_STATUS_SENSOR = 0x06  # See sensors.SENSOR_TYPES
+# The last of each wait spins, as sleep() can overshoot. Kept short, the
+# spinning takes a core from the process being measured.
+SPIN_S = 0.001
+
+
+class McuSimulator:
+    def __init__(self, dbg: Callable, byte_delay_s: float,
+                 turnaround_s: float,
+                 corrupt_rate: float = 0.0, drop_rate: float = 0.0,
+                 seed: Union[int, None] = None):
+        """corrupt_rate and drop_rate are chances for each byte sent back
+        """
+        self.dbg = dbg
+        self.byte_delay_s = byte_delay_s
+        self.turnaround_s = turnaround_s
+        self.corrupt_rate = corrupt_rate
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        # Counters of the simulated MCU, kept out of the robot's
+        self.profiler = Profiler(dbg, False)
+        self.parser = framing.FrameParser(dbg, self.profiler)
+
+        self.motors = [0] * NUM_MOTORS
+        self.camera = 0
+        self.stream_period_s = 0.0
+        self.next_stream_time = 0.0
+        self.stream_seq = 0
+        self.started = perf_counter()
+
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.master)
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.stop_event = Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = Thread(target=self.loop, name="mcu_simulator",
+                             daemon=True)
+        self.thread.start()
+        self.dbg("serial_sim", "Simulated MCU on {}", [self.port])
+
+    def loop(self):
+        """loop() of main.ino: stream sensors, handle any packets
+        """
+        while not self.stop_event.is_set():
+            try:
+                readable, _, _ = select([self.master], [], [],
+                                        self.stream_wait())
+                data = os.read(self.master, 1024) if readable else b""
+            except (OSError, ValueError):
+                return  # Closed by stop()
+            self.stream_sensors()
+            for payload in self.parser.feed(data):
+                self.handle_payload(payload)
+
+    def stream_wait(self) -> float:
+        if self.stream_period_s <= 0:
+            return 0.1  # Check stop_event
+        return max(0.0, self.next_stream_time - perf_counter())
+
+    def handle_payload(self, payload: bytes):
+        if len(payload) < PACKET_SIZE:
+            return
+        cmd, seq, val1, val2 = payload[:PACKET_SIZE]
+        answer = bytes(payload[:PACKET_SIZE])
+        if cmd == SET_MOT_CMD:
+            if val1 < NUM_MOTORS:
+                self.motors[val1] = val2
+        elif cmd == SET_ALL_MOT_CMD:
+            values = payload[PACKET_SIZE:]
+            if val1 > NUM_MOTORS or len(values) != 2 * val1:
+                answer = bytes((INV_CMD_ACK, seq, 0, cmd))
+            else:
+                self.motors[:val1] = [
+                    v for v, in struct.iter_unpack(THRUST_VALUE_FORMAT,
+                                                   values)]
+                answer = bytes((cmd, seq, val1, sum(values) & 0xFF))
+        elif cmd == SET_CAM_CMD:
+            self.camera = val1
+        elif cmd == RD_SENS_CMD:
+            self.stream_period_s = 1 / val1 if val1 else 0.0
+            self.next_stream_time = perf_counter() + self.stream_period_s
+        elif cmd == BLINK_CMD:
+            pass
+        # Bytes in, handling, bytes out
+        self.hold((len(payload) + len(answer) + 2 * framing.OVERHEAD)
+                  * self.byte_delay_s + self.turnaround_s)
+        self.send(answer)
+
+    def stream_sensors(self):
+        """The frame sensors.h sends, without an IMU
+        """
+        if (self.stream_period_s <= 0
+                or perf_counter() < self.next_stream_time):
+            return
+        self.next_stream_time += self.stream_period_s
+        if self.next_stream_time < perf_counter():
+            self.next_stream_time = perf_counter() + self.stream_period_s
+        uptime_ms = int((perf_counter() - self.started) * 1e3)
+        crc_errors = self.profiler.counters.get("serial_crc_errors", 0)
+        frame = (bytes((SENSOR_FRAME_CMD, self.stream_seq, 1, 0,
+                        MCU_STATUS_SENSOR))
+                 + struct.pack("<II", uptime_ms & 0xFFFFFFFF, crc_errors))
+        self.stream_seq = (self.stream_seq + 1) % 256
+        self.send(frame)
+
+    def send(self, payload: bytes):
+        data = bytearray()
+        for b in framing.encode(payload):
+            if self.drop_rate and self.random.random() < self.drop_rate:
+                continue
+            if self.corrupt_rate and self.random.random() < self.corrupt_rate:
+                b ^= 1 << self.random.randrange(8)
+            data.append(b)
+        try:
+            os.write(self.master, bytes(data))
+        except OSError:
+            pass
+
+    def hold(self, duration_s: float):
+        end = perf_counter() + duration_s
+        if duration_s > SPIN_S:
+            sleep(duration_s - SPIN_S)
+        while perf_counter() < end:
+            pass
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(1)
+        for fd in (self.master, self.slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
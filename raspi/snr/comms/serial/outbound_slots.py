@@ -0,0 +1,65 @@
+"""Latest-value-wins queue of packets waiting to be written to the MCU
+
+Each packet goes in a slot named for what it sets, such as one thruster or
+the camera select. A newer packet for a slot replaces one that has not been
+written yet, keeping its place in line. The MCU only ever gets the latest
+value, and a slow link cannot build up a backlog of stale commands.
+"""
+
+from collections import OrderedDict
+from threading import Condition
+from typing import Any, Hashable, List, Union
+
+
+class OutboundSlots:
+    def __init__(self):
+        self.slots = OrderedDict()
+        self.cond = Condition()
+        self.closed = False
+
+    def put(self, key: Hashable, item: Any) -> bool:
+        """Whether an unsent item was replaced
+        """
+        with self.cond:
+            replaced = key in self.slots
+            self.slots[key] = item
+            self.cond.notify()
+        return replaced
+
+    def get(self, timeout_s: float) -> Union[Any, None]:
+        """Oldest waiting item, None on timeout or once closed and empty
+        """
+        with self.cond:
+            if not self.slots and not self.closed:
+                self.cond.wait(timeout_s)
+            if not self.slots:
+                return None
+            _, item = self.slots.popitem(last=False)
+            return item
+
+    def get_many(self, timeout_s: float, max_items: int) -> List[Any]:
+        """Up to max_items of the oldest waiting items, waiting for the
+        first as get() does
+        """
+        with self.cond:
+            if not self.slots and not self.closed:
+                self.cond.wait(timeout_s)
+            items = []
+            while self.slots and len(items) < max_items:
+                items.append(self.slots.popitem(last=False)[1])
+            return items
+
+    def close(self):
+        """Wake the writer, items already waiting are still returned
+        """
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+    def is_closed(self) -> bool:
+        with self.cond:
+            return self.closed and not self.slots
+
+    def __len__(self) -> int:
+        with self.cond:
+            return len(self.slots)
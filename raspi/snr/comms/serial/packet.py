@@ -1,58 +1,162 @@
-"""Define sequences of packets to be sent over the serial connection
-"""
-
-import struct
-
-
-# encoding scheme
-ENCODING = 'ascii'
-PACKET_SIZE = 3
-
-PACKED_FORMAT = "".join(["B" for x in range(PACKET_SIZE)])
-
-
-""" List of codes for each command """
-# TODO: Move command list to external file (maybe .txt or .csv),
-#       write script to generate in Arduino source and python
-#       source will not be needed on topside Pi, only on robot
-SET_MOT_CMD = 0x20      # set motor speed
-SET_CAM_CMD = 0x33      # set camera feed
-RD_SENS_CMD = 0x40      # request read sensor value
-BLINK_CMD = 0x62 #0x80
-INV_CMD_ACK = 0xFF      # Invalid command, value2 of response contains cmd
-
-
-class Packet:
-    """ Packet class representing information that is sent and received over
-    the serial connection
-    """
-
-    def __init__(self, cmd: int, val1: int, val2: int):
-        """Internal constructor
-        """
-        self.cmd = cmd
-        self.val1 = val1
-        self.val2 = val2
-
-    def pack(self) -> (bytes, int):
-        data_bytes = struct.pack(PACKED_FORMAT, self.cmd, self.val1, self.val2)
-        expected_size = struct.calcsize(PACKED_FORMAT)
-        return data_bytes, expected_size
-
-    def weak_eq(self, other) -> bool:
-        return ((self.__class__ == other.__class__) and
-                (self.cmd == other.cmd) and
-                (self.val1 == other.val1) and
-                (self.val2 == other.val2))
-
-    def __eq__(self, other) -> bool:
-        return ((self.__class__ == other.__class__) and
-                (self.cmd == other.cmd) and
-                (self.val1 == other.val1) and
-                (self.val2 == other.val2))
-
-    def __repr__(self):
-        s = "Packet: cmd: {} val1: {} val2: {}"
-        return s.format(self.cmd,
-                        self.val1,
-                        self.val2)
+"""Define sequences of packets to be sent over the serial connection
+
+Every packet carries a sequence number that the MCU copies into its answer,
+so several packets can be in flight and answers matched to them, see
+SerialWindow.
+
+Codecs are struct.Structs compiled once. frame_body() packs the payload
+length and the packet together, ready for framing.FrameEncoder.
+"""
+
+import struct
+from typing import List
+
+from snr.comms.serial.commands import COMMAND_CODES, COMMANDS
+from snr.comms.serial.framing import MAX_PAYLOAD, frame_codec_for
+
+
+# encoding scheme
+ENCODING = 'ascii'
+PACKET_SIZE = 4
+
+# cmd, seq, val1, val2
+PACKED_FORMAT = "".join(["B" for x in range(PACKET_SIZE)])
+PACKET_CODEC = struct.Struct(PACKED_FORMAT)
+LENGTH_FORMAT = "B"  # Payload length at the start of a frame body
+PACKET_BODY_CODEC = struct.Struct("<" + LENGTH_FORMAT + PACKED_FORMAT)
+SEQ_MODULO = 256  # Sequence numbers wrap at a byte
+
+
+""" Codes for each command, from the table in commands.py """
+SET_MOT_CMD = COMMAND_CODES["SET_MOT_CMD"]  # set motor speed
+# set every motor speed, see ThrusterFrame
+SET_ALL_MOT_CMD = COMMAND_CODES["SET_ALL_MOT_CMD"]
+SET_CAM_CMD = COMMAND_CODES["SET_CAM_CMD"]  # set camera feed
+# set sensor stream rate, val1 in Hz, 0 stops it
+RD_SENS_CMD = COMMAND_CODES["RD_SENS_CMD"]
+# sensor readings streamed by the MCU, see sensors.py
+SENSOR_FRAME_CMD = COMMAND_CODES["SENSOR_FRAME_CMD"]
+BLINK_CMD = COMMAND_CODES["BLINK_CMD"]
+# Invalid command, value2 of response contains cmd
+INV_CMD_ACK = COMMAND_CODES["INV_CMD_ACK"]
+
+CMD_NAMES = {c.code: c.name for c in COMMANDS}
+KNOWN_CMDS = set(CMD_NAMES)
+
+THRUST_FRAME_MAX = 1000  # Thruster frame value for full thrust
+THRUST_VALUE_FORMAT = "<h"  # Each thruster frame value
+
+# Payload and frame body (length and payload) codecs, by number of values
+thruster_codecs = {}
+
+
+def thruster_codecs_for(count: int) -> tuple:
+    codecs = thruster_codecs.get(count)
+    if codecs is None:
+        payload = PACKED_FORMAT + THRUST_VALUE_FORMAT[1:] * count
+        codecs = (struct.Struct("<" + payload),
+                  struct.Struct("<" + LENGTH_FORMAT + payload))
+        thruster_codecs[count] = codecs
+    return codecs
+
+
+def thrust_checksum(values: List[int]) -> int:
+    """Low byte of the sum of the packed value bytes, without packing them
+    """
+    return sum((v & 0xFF) + ((v >> 8) & 0xFF) for v in values) & 0xFF
+
+
+class Packet:
+    """ Packet class representing information that is sent and received over
+    the serial connection
+    """
+
+    size = PACKET_SIZE
+    frame_codec = frame_codec_for(PACKET_BODY_CODEC.size)
+
+    def __init__(self, cmd: int, val1: int, val2: int, seq: int = 0):
+        """Internal constructor
+        """
+        self.cmd = cmd
+        self.val1 = val1
+        self.val2 = val2
+        self.seq = seq
+
+    def pack(self) -> (bytes, int):
+        data_bytes = PACKET_CODEC.pack(self.cmd, self.seq,
+                                       self.val1, self.val2)
+        return data_bytes, PACKET_SIZE
+
+    def frame_body(self) -> bytes:
+        return PACKET_BODY_CODEC.pack(PACKET_SIZE, self.cmd, self.seq,
+                                      self.val1, self.val2)
+
+    def ack(self) -> "Packet":
+        """The answer expected from the MCU, an echo
+        """
+        return self
+
+    def weak_eq(self, other) -> bool:
+        """Equal apart from the sequence number
+        """
+        return ((self.__class__ == other.__class__) and
+                (self.cmd == other.cmd) and
+                (self.val1 == other.val1) and
+                (self.val2 == other.val2))
+
+    def __eq__(self, other) -> bool:
+        return ((self.__class__ == other.__class__) and
+                (self.cmd == other.cmd) and
+                (self.seq == other.seq) and
+                (self.val1 == other.val1) and
+                (self.val2 == other.val2))
+
+    def __repr__(self):
+        s = "Packet: cmd: {} seq: {} val1: {} val2: {}"
+        return s.format(self.cmd,
+                        self.seq,
+                        self.val1,
+                        self.val2)
+
+
+def unpack(data_bytes: bytes, offset: int = 0) -> Packet:
+    cmd, seq, val1, val2 = PACKET_CODEC.unpack_from(data_bytes, offset)
+    return Packet(cmd, val1, val2, seq)
+
+
+class ThrusterFrame:
+    """Every thruster value in one frame, replacing a SET_MOT_CMD round trip
+    per motor
+
+    A Packet of SET_ALL_MOT_CMD, the number of values and a reserved 0,
+    followed by each value from -THRUST_FRAME_MAX to THRUST_FRAME_MAX as a
+    little endian int16. The MCU answers with a single Packet of
+    SET_ALL_MOT_CMD, the number of values and the low byte of the sum of the
+    value bytes.
+    """
+
+    def __init__(self, values: List[int], seq: int = 0):
+        self.values = values
+        self.seq = seq
+        self.codec, self.body_codec = thruster_codecs_for(len(values))
+        self.size = self.codec.size
+        if self.size > MAX_PAYLOAD:
+            raise ValueError("{} values do not fit in a frame"
+                             .format(len(values)))
+        self.frame_codec = frame_codec_for(self.body_codec.size)
+
+    def pack(self) -> (bytes, int):
+        data_bytes = self.codec.pack(SET_ALL_MOT_CMD, self.seq,
+                                     len(self.values), 0, *self.values)
+        return data_bytes, self.size
+
+    def frame_body(self) -> bytes:
+        return self.body_codec.pack(self.size, SET_ALL_MOT_CMD, self.seq,
+                                    len(self.values), 0, *self.values)
+
+    def ack(self) -> Packet:
+        return Packet(SET_ALL_MOT_CMD, len(self.values),
+                      thrust_checksum(self.values), self.seq)
+
+    def __repr__(self):
+        return "ThrusterFrame: {}".format(self.values)
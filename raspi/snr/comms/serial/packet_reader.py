@@ -0,0 +1,106 @@
+"""Blocking, resumable reads of packets from the MCU
+
+Reads wait in the kernel for up to the port's timeout rather than polling
+in_waiting. Bytes of a frame that had not fully arrived when the read timed
+out are kept and the next read resumes from them. Packets arrive in frames,
+see framing.py, so corruption costs a packet rather than the alignment of
+the stream. Sensor frames the MCU streams on its own are decoded here too.
+"""
+
+from collections import deque
+from enum import Enum
+from time import time
+from typing import Callable, List, Union
+
+import serial
+
+from snr.comms.serial.framing import FrameParser
+from snr.comms.serial.packet import (PACKET_SIZE, SENSOR_FRAME_CMD, Packet,
+                                     unpack)
+from snr.comms.serial.sensors import (SensorFrameError, SensorReading,
+                                      decode_sensor_frame)
+from snr.comms.serial.serial_stats import SerialStats
+
+
+class ReadStatus(Enum):
+    packet = 1
+    timeout = 2  # Nothing, or only part of a packet, before the timeout
+    closed = 3  # The port was closed or failed
+    sensors = 4  # A frame of streamed sensor readings
+
+
+class ReadResult:
+    def __init__(self, status: ReadStatus,
+                 packet: Union[Packet, None] = None,
+                 partial: int = 0,
+                 error: Union[Exception, None] = None,
+                 readings: List[SensorReading] = [],
+                 seq: int = 0):
+        self.status = status
+        self.packet = packet
+        self.readings = readings
+        self.seq = seq  # Of the sensor frame
+        self.partial = partial  # Bytes of the next frame already read
+        self.error = error
+
+    def __repr__(self):
+        if self.status is ReadStatus.packet:
+            return "ReadResult: {}".format(self.packet)
+        if self.status is ReadStatus.sensors:
+            return "ReadResult: sensor frame {}: {}".format(self.seq,
+                                                            self.readings)
+        if self.status is ReadStatus.timeout:
+            return "ReadResult: timeout with {} bytes of a frame".format(
+                self.partial)
+        return "ReadResult: closed: {}".format(self.error.__repr__())
+
+
+class PacketReader:
+    def __init__(self, dbg: Callable, stats: SerialStats, port):
+        """port is a pyserial Serial, its timeout bounds each read
+        """
+        self.dbg = dbg
+        self.stats = stats
+        self.port = port
+        self.parser = FrameParser(dbg, stats)
+        self.results = deque()  # Read along with an earlier result
+
+    def read(self) -> ReadResult:
+        while not self.results:
+            try:
+                # Block for the first byte, then take whatever has arrived
+                waiting = self.port.in_waiting
+                self.stats.peak("in_waiting", waiting)
+                data = self.port.read(max(1, waiting))
+            except (serial.serialutil.SerialException, OSError,
+                    TypeError, AttributeError) as error:
+                # Attribute and type errors when closed from another thread
+                return ReadResult(ReadStatus.closed, error=error)
+            if not data:
+                # pyserial only returns nothing when the timeout expired
+                return ReadResult(ReadStatus.timeout,
+                                  partial=self.parser.partial())
+            self.stats.count("serial_rx_bytes", len(data))
+            for payload in self.parser.feed(data):
+                self.add_payload(payload)
+        return self.results.popleft()
+
+    def add_payload(self, payload: bytes):
+        if len(payload) >= PACKET_SIZE and payload[0] == SENSOR_FRAME_CMD:
+            try:
+                readings = decode_sensor_frame(payload, time())
+            except SensorFrameError as error:
+                self.stats.count("serial_bad_sensor_frames")
+                self.dbg("serial_warning", "Bad sensor frame: {}", [error])
+                return
+            self.results.append(ReadResult(ReadStatus.sensors,
+                                           readings=readings,
+                                           seq=payload[1]))
+            return
+        if len(payload) != PACKET_SIZE:
+            self.stats.count("serial_bad_payloads")
+            self.dbg("serial_warning", "Frame of {} bytes is not a packet",
+                     [len(payload)])
+            return
+        self.results.append(ReadResult(ReadStatus.packet,
+                                       packet=unpack(payload)))
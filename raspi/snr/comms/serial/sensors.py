@@ -0,0 +1,91 @@
+"""Sensor frames streamed by the MCU
+
+Once sent RD_SENS_CMD with a rate, the MCU pushes a SENSOR_FRAME_CMD frame
+at that rate without being asked:
+    SENSOR_FRAME_CMD, stream seq, count, 0, then count readings
+Each reading is a sensor id byte followed by that sensor's values, laid out
+as in SENSOR_TYPES and arduino/main/sensors.h. The stream seq counts frames
+and wraps at 256, so the Pi can tell how many it missed.
+"""
+
+import struct
+from typing import Dict, List
+
+from snr.comms.serial.packet import PACKET_SIZE, SENSOR_FRAME_CMD
+
+
+class SensorType:
+    def __init__(self, name: str, fields: List[str], fmt: str,
+                 scale: float = 1):
+        """fmt is the struct format of the values, each multiplied by scale
+        """
+        self.name = name
+        self.fields = fields
+        self.codec = struct.Struct(fmt)
+        self.scale = scale
+
+    def decode(self, data: bytes, offset: int) -> Dict[str, float]:
+        raw = self.codec.unpack_from(data, offset)
+        if self.scale == 1:
+            return dict(zip(self.fields, raw))
+        return {f: v * self.scale for f, v in zip(self.fields, raw)}
+
+
+# By sensor id, scales are the BNO055 defaults
+SENSOR_TYPES = {
+    0x01: SensorType("imu_euler", ["heading", "roll", "pitch"],
+                     "<hhh", 1 / 16),  # Degrees
+    0x02: SensorType("imu_accel", ["x", "y", "z"], "<hhh", 1 / 100),  # m/s^2
+    0x03: SensorType("imu_gyro", ["x", "y", "z"], "<hhh", 1 / 16),  # Deg/s
+    0x04: SensorType("imu_temp", ["celsius"], "<b"),
+    0x05: SensorType("imu_calibration", ["system", "gyro", "accel", "mag"],
+                     "<BBBB"),  # 0 to 3, 3 is fully calibrated
+    0x06: SensorType("mcu_status", ["uptime_ms", "crc_errors"], "<II"),
+}
+
+
+class SensorReading:
+    def __init__(self, name: str, values: Dict[str, float],
+                 seq: int, time: float):
+        self.name = name
+        self.values = values
+        self.seq = seq  # Of the frame it arrived in
+        self.time = time  # time() it was decoded
+
+    def to_dict(self) -> dict:
+        return dict(self.values, time=self.time)
+
+    def __repr__(self):
+        return "SensorReading {}: {}".format(self.name, self.values)
+
+
+class SensorFrameError(Exception):
+    pass
+
+
+def decode_sensor_frame(payload: bytes, time: float) -> List[SensorReading]:
+    """Readings in a SENSOR_FRAME_CMD payload
+    """
+    cmd, seq, count, _ = payload[:PACKET_SIZE]
+    if cmd != SENSOR_FRAME_CMD:
+        raise SensorFrameError("Not a sensor frame: {:#x}".format(cmd))
+    readings = []
+    offset = PACKET_SIZE
+    for _ in range(count):
+        if offset >= len(payload):
+            raise SensorFrameError("Frame ends after {} of {} readings"
+                                   .format(len(readings), count))
+        sensor = SENSOR_TYPES.get(payload[offset])
+        if sensor is None:
+            # The size of an unknown reading is unknown, so is the rest
+            raise SensorFrameError("Unknown sensor id {:#x}"
+                                   .format(payload[offset]))
+        offset += 1
+        if offset + sensor.codec.size > len(payload):
+            raise SensorFrameError("Frame ends inside {}"
+                                   .format(sensor.name))
+        readings.append(SensorReading(sensor.name,
+                                      sensor.decode(payload, offset),
+                                      seq, time))
+        offset += sensor.codec.size
+    return readings
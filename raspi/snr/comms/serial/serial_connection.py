@@ -1,19 +1,48 @@
 """ This module manages the serial connection
 between the Pi and microcontroller
+
+Serial I/O happens on the connection's own threads, so the Node loop never
+waits on the MCU. Task handlers only put packets in OutboundSlots, where a
+newer value for the same thruster or setting replaces an unsent one. A
+writer thread sends them without waiting for the previous answer, up to
+SERIAL_WINDOW at a time. A reader thread matches the MCU's answers to them
+by sequence number, see SerialWindow, and stores what the MCU sent in the
+Datastore. Both directions are wrapped in frames with a CRC, see framing.py.
+The MCU also streams sensor frames at SERIAL_SENSOR_RATE_HZ, which the reader
+stores as SensorReadings under their own names, see sensors.py.
+With SIMULATE_SERIAL, the port is a pty with an McuSimulator on the far end,
+so the same path runs without the robot.
+If the port fails, the reader reopens it, finding it again in case it
+moved, and carries on.
+Counters, round trip times and high water marks of the link are kept in a
+SerialStats, see stats(), and stored as SERIAL_STATS_NAME every
+SERIAL_STATS_WINDOW_S for the Telemetry endpoint to send topside.
 TODO: Add more documentation here
 """
 
+from threading import Event, Thread
+from time import time
 from typing import Union
 
 import serial
 
 import settings
+from snr.comms.serial import framing
+from snr.comms.serial.mcu_simulator import McuSimulator
 from snr.comms.serial.serial_finder import *
-from snr.comms.serial.packet import (BLINK_CMD, PACKET_SIZE, SET_CAM_CMD,
-                                     SET_MOT_CMD, Packet)
+from snr.comms.serial.outbound_slots import OutboundSlots
+from snr.comms.serial.packet import (BLINK_CMD, CMD_NAMES, PACKET_SIZE,
+                                     RD_SENS_CMD, SEQ_MODULO, SET_CAM_CMD,
+                                     SET_MOT_CMD,
+                                     THRUST_FRAME_MAX, Packet, ThrusterFrame)
+from snr.comms.serial.packet_reader import (PacketReader, ReadResult,
+                                            ReadStatus)
+from snr.comms.serial.serial_stats import SerialStats
+from snr.comms.serial.serial_window import SerialWindow
 from snr.endpoint import Endpoint
 from snr.node import Node
-from snr.task import SomeTasks, Task
+from snr.profiler import profiled
+from snr.task import Task
 from snr.utils.utils import attempt, print_exit, sleep
 from snr.utils import debug
 
@@ -28,19 +57,55 @@ class SerialConnection(Endpoint):
             "blink_test": self.handle_blink_test
         }
         super().__init__(parent, name)
-        
+        self.datastore = self.parent.datastore
+        self.output = output
+        self.last_write_time = None  # time() the last packet was written
+        self.link_stats = SerialStats(self.profiler,
+                                      settings.SERIAL_STATS_WINDOW_S)
+        self.window = SerialWindow(self.dbg, self.link_stats,
+                                   settings.SERIAL_WINDOW,
+                                   settings.SERIAL_ACK_TIMEOUT)
+        self.outbound = OutboundSlots()
+        self.encoder = framing.FrameEncoder()
+        self.inbound = {}  # Latest values from the MCU by command name
+        self.sensors = {}  # Latest sensor readings by name, as dicts
+        self.last_sensor_seq = None
+        self.writer = None
+        self.reader = None
+        self.stop_reading = Event()
+        self.serial_connection = None
+        self.simulator = None
+
         if settings.SIMULATE_SERIAL:
-            self.serial_connection = None
-            self.simulated_bytes = None
             self.dbg("serial_verbose", "Simulating serial")
-            return
-
-        self.dbg("serial_verbose", "Finding serial port")
-        get_port_to_use(self.dbg,self.set_port)
-        print("helllllllo")
+            self.simulator = McuSimulator(
+                self.dbg,
+                settings.SIMULATED_MCU_BYTE_DELAY,
+                settings.SIMULATED_MCU_TURNAROUND,
+                settings.SIMULATED_MCU_CORRUPT_RATE,
+                settings.SIMULATED_MCU_DROP_RATE)
+            self.simulator.start()
+            self.set_port(self.simulator.port)
+        else:
+            self.dbg("serial_verbose", "Finding serial port")
+            get_port_to_use(self.dbg,self.set_port)
+            print("helllllllo")
         self.dbg("serial", "Selected port {}", [self.serial_port])
 
         self.attempt_connect()
+        self.packet_reader = PacketReader(self.dbg, self.link_stats,
+                                          self.serial_connection)
+        self.reader = Thread(target=self.read_answers,
+                             name="serial_reader", daemon=True)
+        self.reader.start()
+        self.start_writer()
+        if settings.SERIAL_SENSOR_RATE_HZ:
+            self.send_receive("read_sensor", [settings.SERIAL_SENSOR_RATE_HZ])
+
+    def start_writer(self):
+        self.writer = Thread(target=self.write_outbound,
+                             name="serial_writer", daemon=True)
+        self.writer.start()
 
     def attempt_connect(self):
         print("helllllllo2")
@@ -60,22 +125,13 @@ class SerialConnection(Endpoint):
 
     def handle_serial_com(self, t: Task):
         self.dbg("serial_verbose",
-                 "Executing serial com task: {}", [t.val_list])
-        result = self.send_receive(t.val_list[0],
-                                   t.val_list[1::])
-        if result is None:
-            self.dbg("robot",
-                     "Received no data in response from serial message")
-        elif isinstance(result, Task):
-            sched_list.append(result)
-        elif isinstance(result, list):
-            for new_task in list(result):
-                sched_list.append(new_task)
+                 "Queueing serial com task: {}", [t.val_list])
+        self.send_receive(t.val_list[0], t.val_list[1::], t.timestamp)
 
     def handle_blink_test(self, t: Task):
         print("blink test over here")
         print(t)
-        print(self.send_receive("blink",t.val_list))
+        self.send_receive("blink", t.val_list)
                                             
 
     def set_port(self, port: str):
@@ -83,11 +139,9 @@ class SerialConnection(Endpoint):
         self.serial_port = port
 
     def try_open_serial(self):
-        if settings.SIMULATE_SERIAL:
-            self.dbg("serial_sim",
-                     "Not opening port", [])
-            return None
-        sleep(settings.SERIAL_SETUP_WAIT_PRE)
+        if self.simulator is None:
+            # The MCU resets when the port opens
+            sleep(settings.SERIAL_SETUP_WAIT_PRE)
         try:
             self.serial_connection = serial.Serial(
                 port=self.serial_port,
@@ -97,128 +151,248 @@ class SerialConnection(Endpoint):
                 bytesize=serial.EIGHTBITS,
                 timeout=settings.SERIAL_TIMEOUT)
             if self.serial_connection.is_open:
+                self.link_stats.count("serial_connects")
                 print("serial conn opened")
                 self.dbg('serial',
                          "Opened serial connection on {} at baud {}",
                          [self.serial_port, settings.SERIAL_BAUD])
-                sleep(settings.SERIAL_SETUP_WAIT_POST)
+                if self.simulator is None:
+                    remember_port(self.serial_port)
+                    sleep(settings.SERIAL_SETUP_WAIT_POST)
                 while self.serial_connection.in_waiting > 0:
-                    if self.serial_connection.in_waiting > PACKET_SIZE:
+                    if (self.serial_connection.in_waiting >
+                            PACKET_SIZE + framing.OVERHEAD):
                         self.dbg("serial_warning",
                                  "Extra inbound bytes on serial: {}",
                                  [self.serial_connection.in_waiting])
                     self.serial_connection.read()
                 return True
+            self.link_stats.count("serial_open_failures")
             return False
         except Exception as error:
+            self.link_stats.count("serial_open_failures")
             self.dbg("serial_con", "Error opening port: {}",
                      [error.__repr__()])
             return False
 
-    # Send and receive data over serial
-    def send_receive(self, cmd_type: str, data: list) -> SomeTasks:
-        t = []
-
+    # Queue data to be sent over serial, the answer is stored by the reader
+    # timestamp is when the data behind it originated, for latency
+    def send_receive(self, cmd_type: str, data: list,
+                     timestamp: Union[float, None] = None):
         if cmd_type.__eq__("blink"):
+            slot = "blink"
             p = self.new_packet(BLINK_CMD, data[0], data[1])
-
-            self.send_receive_packet(p)
         elif cmd_type.__eq__("set_motor"):
+            slot = ("set_motor", data[0])
             p = self.generate_motor_packet(data[0], data[1])
-
-            self.send_receive_packet(p)
+        elif cmd_type.__eq__("set_motors"):
+            slot = "set_motors"
+            p = self.generate_thruster_frame(data)
         elif cmd_type.__eq__("set_cam"):
+            slot = "set_cam"
             p = self.new_packet(SET_CAM_CMD, data[0], 0)
-            self.send_receive_packet(p)
         elif cmd_type.__eq__("read_sensor"):
-            pass
+            # Sets the rate the MCU streams sensor frames at
+            slot = "read_sensor"
+            p = self.new_packet(RD_SENS_CMD, data[0], 0)
         else:
             self.dbg("serial_error", "Type of serial command {} not recognized",
                      [cmd_type])
-            return None
-        return t
-
-    # Send and receive a serial packet
-    def send_receive_packet(self, p: Packet) -> Packet:
-        # send packet
-        self.write_packet(p)
-        # Recieve a packet from the Arduino/Teensy
-        p_recv = self.read_packet()
-        if p_recv is None:
-            self.dbg("serial_verbose", "Received an empty packet")
-        elif p.weak_eq(p_recv):
-            self.dbg("serial_verbose", "Received echo packet")
-        else:
-            self.dbg("serial_verbose", "Received {}", [p_recv])  # Debugging
-        return p
+            return
+        if self.outbound.put(slot, (p, timestamp)):
+            # The MCU never needed the old value
+            self.link_stats.count("serial_overwritten")
+        self.link_stats.peak("outbound", len(self.outbound))
+
+    def write_outbound(self):
+        """Writer thread, sends the latest value of each slot in turn
+        """
+        while True:
+            # As many as there is room for in the window, in one write
+            items = self.outbound.get_many(settings.SERIAL_TIMEOUT,
+                                           max(1, self.window.free()))
+            if not items:
+                if self.outbound.is_closed():
+                    return
+                continue
+            self.last_write_time = None
+            self.send_packets([p for p, _ in items])
+            if self.last_write_time is None:
+                continue
+            for _, timestamp in items:
+                if timestamp is not None:
+                    # Stick movement on topside to the packet leaving for
+                    # the MCU
+                    self.profiler.log_latency(
+                        "latency:controls:capture_to_serial",
+                        self.last_write_time - timestamp)
+
+    # Send Packets and ThrusterFrames once there is room in the window,
+    # their answers are handled by the reader
+    def send_packets(self, packets: list) -> bool:
+        sent = []
+        for p in packets:
+            if self.stop_reading.is_set():
+                # terminate() gave up waiting for the writer
+                break
+            seq = self.window.acquire(settings.SERIAL_TIMEOUT)
+            if seq is None:
+                self.link_stats.count("serial_window_timeouts")
+                self.dbg("serial_error", "No answers from MCU, dropping {}",
+                         [p])
+                continue
+            p.seq = seq
+            # Before writing, the answer can arrive before write() returns
+            self.window.sent(seq, p.ack())
+            sent.append(p)
+        if not sent:
+            return False
+        if not self.write_packets(sent):
+            for p in sent:
+                self.window.release(p.seq)
+            return False
+        return True
+
+    def handle_answer(self, p: Packet):
+        self.window.ack(p)
+        self.inbound[CMD_NAMES.get(p.cmd, hex(p.cmd))] = {
+            "val1": p.val1,
+            "val2": p.val2,
+            "time": time(),
+        }
+        self.datastore.store(self.output, dict(self.inbound))
+
+    def handle_sensor_frame(self, result: ReadResult):
+        if self.last_sensor_seq is not None:
+            missed = (result.seq - self.last_sensor_seq - 1) % SEQ_MODULO
+            if missed:
+                self.link_stats.count("serial_sensor_frames_missed", missed)
+        self.last_sensor_seq = result.seq
+        self.link_stats.count("serial_sensor_frames")
+        for reading in result.readings:
+            self.datastore.store(reading.name, reading)
+            self.sensors[reading.name] = reading.to_dict()
+        # The Telemetry endpoint sends the output to topside
+        self.inbound.update(self.sensors)
+        self.datastore.store(self.output, dict(self.inbound))
+        self.dbg("serial_verbose", "Sensor frame {}: {}",
+                 [result.seq, result.readings])
+
+    def read_answers(self):
+        """Reader thread, matches answers from the MCU to packets in flight
+        """
+        while not self.stop_reading.is_set():
+            result = self.read_packet()
+            if self.link_stats.roll():
+                self.publish_stats()
+            if result.status is ReadStatus.packet:
+                self.handle_answer(result.packet)
+            elif result.status is ReadStatus.sensors:
+                self.handle_sensor_frame(result)
+            elif result.status is ReadStatus.timeout:
+                # Only a problem if answers are due, the window expires them
+                if self.window.pending():
+                    self.link_stats.count("serial_read_timeouts")
+                    self.dbg("serial_warning",
+                             "Timed out waiting for answers, {}", [result])
+            else:
+                # Also when terminate() closes the port
+                if self.stop_reading.is_set():
+                    return
+                self.link_stats.count("serial_disconnects")
+                self.dbg("serial_error", "Error reading serial: {}",
+                         [result.error.__repr__()])
+                self.publish_stats()
+                if not self.reconnect():
+                    return
+
+    def reconnect(self) -> bool:
+        """Reopen the port after it failed, trying until it opens or
+        terminate() is called, whether it opened
+        """
+        try:
+            self.serial_connection.close()
+        except (serial.serialutil.SerialException, OSError):
+            pass
+        while not self.stop_reading.is_set():
+            sleep(settings.SERIAL_RETRY_WAIT)
+            if self.simulator is None:
+                # It may come back as another device after a USB reset
+                port = find_port(self.dbg)
+                if port is None:
+                    self.link_stats.count("serial_open_failures")
+                    continue
+                self.set_port(port)
+            if not self.try_open_serial():
+                continue
+            if self.stop_reading.is_set():
+                # terminate() closed the old port while this one opened
+                self.serial_connection.close()
+                return False
+            self.link_stats.count("serial_reconnects")
+            self.dbg("serial", "Reopened serial connection on {}",
+                     [self.serial_port])
+            self.packet_reader = PacketReader(self.dbg, self.link_stats,
+                                              self.serial_connection)
+            self.last_sensor_seq = None
+            if settings.SERIAL_SENSOR_RATE_HZ:
+                # The MCU resets when the port opens
+                self.send_receive("read_sensor",
+                                  [settings.SERIAL_SENSOR_RATE_HZ])
+            return True
+        return False
+
+    def stats(self) -> dict:
+        """Health of the link, see SerialStats
+        """
+        return self.link_stats.stats()
+
+    def publish_stats(self):
+        stats = self.link_stats.stats()
+        self.datastore.store(settings.SERIAL_STATS_NAME, stats)
+        self.dbg("serial_verbose", "Serial stats: {}", [stats])
 
     # Send a Packet over serial
 
-    def write_packet(self, p):
-        data_bytes, expected_size = p.pack()
-        self.dbg("serial_verbose", "Trying to send packet of expected size {}",
+    @profiled("serial_write")
+    def write_packets(self, packets: list) -> bool:
+        data_bytes = self.encoder.encode(packets)
+        expected_size = len(data_bytes)
+        self.dbg("serial_verbose",
+                 "Trying to send packets of expected size {}",
                  [expected_size])
         sent_bytes = 0
-
-        if settings.SIMULATE_SERIAL:
-            self.dbg("serial_sim", "Sending bytes {}", [
-                data_bytes])
-            self.simulated_bytes = data_bytes
-            return
+        # terminate() can drop the connection while the writer is running
+        port = self.serial_connection
 
         try:
-            if not self.serial_connection.is_open:
+            if port is None or not port.is_open:
                 self.dbg("serial_error", "Aborting send, Serial is not open: {}",
-                         [self.serial_connection])
-                return
-            sent_bytes += self.serial_connection.write(data_bytes)
-            self.dbg("serial_verbose", "Sent {} bytes: {}",
-                     [sent_bytes, data_bytes])
-            self.dbg("serial_verbose", "Out-waiting: {}",
-                     [self.serial_connection.out_waiting])
+                         [port])
+                return False
+            sent_bytes += port.write(data_bytes)
+            self.last_write_time = time()
+            self.link_stats.count("serial_tx_bytes", sent_bytes)
+            self.link_stats.count("serial_frames_tx", len(packets))
+            out_waiting = port.out_waiting
+            self.link_stats.peak("out_waiting", out_waiting)
+            self.dbg("serial_verbose", "Sent {} bytes in {} frames",
+                     [sent_bytes, len(packets)])
+            self.dbg("serial_verbose", "Out-waiting: {}", [out_waiting])
         except serial.serialutil.SerialException as error:
+            self.link_stats.count("serial_write_errors")
             self.dbg("serial_error", "Error sending packet: {}",
                      [error.__repr__()])
-            return
-        self.dbg("serial_verbose", "Sent {}", [p])
-        return
+            return False
+        self.dbg("serial_verbose", "Sent {}", [packets])
+        return True
 
-    # Read in a packet from serial
-    # TODO: ensure that this effectively recieves data over serial
-    def read_packet(self) -> Union[Packet, None]:
-        if settings.SIMULATE_SERIAL:
-            self.dbg("serial_sim", "Receiving packet of simulated bytes")
-            recv_bytes = self.simulated_bytes
-        else:
-            if not self.serial_connection.is_open:
-                self.dbg("serial_error", "Aborting read, Serial is not open: {}",
-                         [self.serial_connection])
-                return None
-
-            self.dbg("serial_verbose", "Waiting for bytes, {} ready", [
-                self.serial_connection.in_waiting])
-            tries = 0
-            while self.serial_connection.in_waiting < PACKET_SIZE:
-                tries = tries + 1
-            self.dbg("serial_verbose",
-                     "Received enough bytes after {} tries", [tries])
-            self.dbg("serial_verbose", "Reading, {} bytes ready",
-                     [self.serial_connection.in_waiting])
-            try:
-                recv_bytes = self.serial_connection.read(size=PACKET_SIZE)
-            except Exception as error:
-                self.dbg("serial_receive", "Error reading serial: {}",
-                         [error.__repr__()])
-        self.dbg("serial_verbose", "Read bytes from serial")
-        self.dbg("serial_verbose", "type(recv_bytes) = {}", [type(recv_bytes)])
-        cmd = recv_bytes[0]
-        val1 = recv_bytes[1]
-        val2 = recv_bytes[2]
-        s = "Unpacked: cmd: {}.{}, val1: {}.{}, val2: {}.{}"
-        self.dbg('serial_verbose', s,
-                 [cmd, cmd.__class__, val1, val1.__class__, val2, val2.__class__])
-        p = Packet(cmd, val1, val2)
-        return p
+    # Read the next answer from the MCU, blocking up to SERIAL_TIMEOUT
+    @profiled("serial_read")
+    def read_packet(self) -> ReadResult:
+        result = self.packet_reader.read()
+        self.dbg("serial_verbose", "Read {}", [result])
+        return result
 
     def map_thrust_value(self, speed: int) -> int:
         if speed > 100:
@@ -234,8 +408,21 @@ class SerialConnection(Endpoint):
         mapped_speed = self.map_thrust_value(speed)
         return self.new_packet(SET_MOT_CMD, motor, mapped_speed)
 
+    def map_thrust_frame_value(self, speed: int) -> int:
+        """Motor speed from -100 to 100 as a thruster frame value
+        """
+        speed = max(-100, min(100, speed))
+        return int(round(speed * THRUST_FRAME_MAX / 100))
+
+    def generate_thruster_frame(self, speeds: list) -> ThrusterFrame:
+        values = [self.map_thrust_frame_value(s) for s in speeds]
+        self.dbg("serial_packet",
+                 "Converted motor speeds from {} to {}", [speeds, values])
+        return ThrusterFrame(values)
+
     def new_packet(self, cmd: int, val1: int, val2: int):
-        """ Constructor for building packets to send (chksum is created)
+        """ Constructor for building packets to send, the CRC is added by
+        write_packets
         """
         self.dbg("serial_verbose",
                  "Preparing packet: cmd: {}, val1: {}, val2: {}",
@@ -244,13 +431,28 @@ class SerialConnection(Endpoint):
         return Packet(cmd, val1, val2)
 
     def make_packet(self, cmd: int, val1: int, val2: int):
-        """ Constructor for building packets (chksum is given)
+        """ Constructor for building packets
         """
         return Packet(cmd, val1, val2)
 
     def terminate(self):
+        if (self.serial_connection is not None
+                and settings.SERIAL_SENSOR_RATE_HZ):
+            # Stop the stream so it is not waiting when the port next opens
+            self.send_receive("read_sensor", [0])
+        # Send what is queued, then let the last answers arrive
+        self.outbound.close()
+        if self.writer is not None:
+            self.writer.join(settings.SERIAL_TIMEOUT)
+        if self.serial_connection is not None:
+            self.window.drain(settings.SERIAL_ACK_TIMEOUT)
+        self.stop_reading.set()
         if self.serial_connection is not None:
             self.dbg("serial", "Closing serial connection")
             self.serial_connection.close()
+            if self.reader is not None:
+                self.reader.join(settings.SERIAL_TIMEOUT)
             self.serial_connection = None
+        if self.simulator is not None:
+            self.simulator.stop()
         self.dbg("serial", "Closed serial connection")
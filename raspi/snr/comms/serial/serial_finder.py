@@ -1,13 +1,23 @@
 """ This module seaches the operating system for devices on serial ports
+
+The port that last opened is tried first. Otherwise USB serial devices are
+matched by vendor and product id, read from sysfs by pyserial without opening
+anything, and named by their stable /dev/serial/by-id link. Ports are only
+opened to test them when that leaves more than one candidate, and then all
+at once.
 """
 # TODO: Find the origin of this code and give credit
 
 import glob
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from sys import platform
-from typing import Callable, List
+from time import perf_counter
+from typing import Callable, List, Union
 
 import serial
+from serial.tools.list_ports import comports
 
 import settings
 from snr.utils.utils import attempt, sleep
@@ -22,19 +32,15 @@ def get_port_to_use(dbg: Callable, set_port: Callable) -> str:
     port = None
 
     def try_find_port() -> bool:
+        nonlocal port
         try:
-            # Get a list of all serial ports
-            dbg('serial_finder', "Searching for serial ports")
-            ports = list_ports()
-            dbg('serial_finder', "Found ports:")
-            for p in ports:
-                dbg('serial_finder', p)
-            # Select the port
-            port = select_port(dbg,ports)
+            start = perf_counter()
+            port = find_port(dbg)
             set_port(port)
             if(port is None):
                 raise Exception("Serial Exception")
-            dbg("serial_finder", "Using port: {}", [port])
+            dbg("serial_finder", "Using port: {}, found in {:.3f} s",
+                [port, perf_counter() - start])
             return True
 
         except Exception as error:
@@ -59,6 +65,103 @@ def get_port_to_use(dbg: Callable, set_port: Callable) -> str:
     return port
 
 
+def find_port(dbg: Callable) -> Union[str, None]:
+    """ The cached port if it still opens, else the best USB candidate
+    """
+    cached = cached_port()
+    if cached is not None and probe(cached):
+        dbg("serial_finder", "Using cached port {}", [cached])
+        return cached
+
+    candidates = usb_candidates(dbg)
+    if len(candidates) == 1:
+        return candidates[0]
+    if candidates:
+        return first_open(candidates)
+
+    # No USB serial devices known to pyserial, open everything
+    dbg('serial_finder', "Searching for serial ports")
+    ports = list_ports()
+    dbg('serial_finder', "Found ports:")
+    for p in ports:
+        dbg('serial_finder', p)
+    return select_port(dbg, ports)
+
+
+def usb_candidates(dbg: Callable) -> List[str]:
+    """ USB serial ports, those matching SERIAL_USB_IDS first, each as its
+    /dev/serial/by-id link when it has one
+    """
+    by_id = {os.path.realpath(link): link
+             for link in glob.glob("/dev/serial/by-id/*")}
+    known = []
+    other = []
+    for info in comports():
+        if info.vid is None:
+            continue
+        name = by_id.get(os.path.realpath(info.device), info.device)
+        dbg("serial_finder", "USB serial {:04x}:{:04x} at {}",
+            [info.vid, info.pid or 0, name])
+        if known_usb_id(info.vid, info.pid):
+            known.append(name)
+        else:
+            other.append(name)
+    return known or other
+
+
+def known_usb_id(vid: int, pid: int) -> bool:
+    return any(vid == known_vid and known_pid in (None, pid)
+               for known_vid, known_pid in settings.SERIAL_USB_IDS)
+
+
+def probe(port: str) -> bool:
+    """ Whether the port exists and can be opened
+    """
+    try:
+        s = serial.Serial(port)
+        s.close()
+        return True
+    except (OSError, Exception):
+        return False
+
+
+def probe_all(ports: List[str]) -> List[str]:
+    """ The ports that open, in the order given, testing all at once
+    """
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(ports), 32)) as pool:
+        opened = list(pool.map(probe, ports))
+    return [port for port, ok in zip(ports, opened) if ok]
+
+
+def first_open(ports: List[str]) -> Union[str, None]:
+    good = probe_all(ports)
+    return good[0] if good else None
+
+
+def cached_port() -> Union[str, None]:
+    try:
+        with open(settings.SERIAL_PORT_CACHE) as f:
+            port = f.read().strip()
+    except OSError:
+        return None
+    return port or None
+
+
+def remember_port(port: str):
+    """ Cache a port that opened, to try it first next time
+    """
+    try:
+        directory = os.path.dirname(settings.SERIAL_PORT_CACHE)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(settings.SERIAL_PORT_CACHE, "w") as f:
+            f.write(port + "\n")
+    except OSError:
+        pass
+
+
 def list_ports() -> list:
     """ Finds all serial ports and returns a list containing them
 
@@ -77,15 +180,7 @@ def list_ports() -> list:
     else:
         raise EnvironmentError('Unsupported platform')
 
-    result = []
-    for port in ports:
-        try:
-            s = serial.Serial(port)    # Try to open a port
-            s.close()                  # Close the port if sucessful
-            result.append(port)        # Add to list of good ports
-        except (OSError, Exception):   # If un sucessful
-            pass
-    return result
+    return probe_all(ports)
 
 
 def select_port(dbg: Callable, ports: List[str]) -> str or None:
@@ -0,0 +1,130 @@
+"""Counters and histograms of the serial link's health
+
+SerialWindow, PacketReader and FrameParser count into a SerialStats instead
+of the Profiler directly, it keeps its own totals and passes every count and
+latency on to the Profiler, so they still show in profiling output and
+PerfMonitor's io_bytes_per_s. On top it keeps the round trip time of each
+answer and high water marks, such as bytes waiting in the port's buffers,
+and every window_s turns the totals into rates, so thruster lag can be set
+against how busy the link was at the time.
+"""
+
+from threading import Lock
+from time import perf_counter
+from typing import Dict
+
+from snr.profiler import Histogram, Profiler, describe
+
+# Counters reported per second, by the name in stats()
+RATES = {
+    "tx_bytes": "serial_tx_bytes",
+    "rx_bytes": "serial_rx_bytes",
+    "tx_packets": "serial_frames_tx",
+    "rx_packets": "serial_frames_rx",
+    "acks": "serial_acks",
+}
+
+
+class SerialStats:
+    def __init__(self, profiler: Profiler, window_s: float):
+        self.profiler = profiler
+        self.window_s = window_s
+        self.lock = Lock()  # Counted from the writer, reader and Node
+        self.totals: Dict[str, int] = {}
+        self.high_water: Dict[str, int] = {}  # Since the link opened
+        self.window_high_water: Dict[str, int] = {}
+        self.rtt = Histogram()
+        self.window_rtt = Histogram()
+        self.window_start = perf_counter()
+        self.window_totals: Dict[str, int] = {}  # totals at window_start
+        # Of the last full window
+        self.rates: Dict[str, float] = {}
+        self.last_window = {"rtt_s": describe(Histogram()), "high_water": {}}
+
+    def count(self, name: str, n: int = 1):
+        with self.lock:
+            self.totals[name] = self.totals.get(name, 0) + n
+        self.profiler.count(name, n)
+
+    def log_latency(self, label: str, latency_s: float):
+        """Round trip of an answer, the window only logs
+        latency:serial:ack
+        """
+        runtime_ns = max(int(latency_s * 1e9), 0)
+        with self.lock:
+            self.rtt.record(runtime_ns)
+            self.window_rtt.record(runtime_ns)
+        self.profiler.log_latency(label, latency_s)
+
+    def peak(self, name: str, value: int):
+        """Keep the highest value seen, such as bytes in_waiting
+        """
+        with self.lock:
+            if value > self.window_high_water.get(name, 0):
+                self.window_high_water[name] = value
+                if value > self.high_water.get(name, 0):
+                    self.high_water[name] = value
+
+    def roll(self) -> bool:
+        """Start a new window if this one is over, whether it was
+        """
+        now = perf_counter()
+        with self.lock:
+            elapsed = now - self.window_start
+            if elapsed < self.window_s:
+                return False
+            self.rates = {
+                name: (self.totals.get(counter, 0)
+                       - self.window_totals.get(counter, 0)) / elapsed
+                for name, counter in RATES.items()}
+            self.last_window = {
+                "rtt_s": describe(self.window_rtt),
+                "high_water": self.window_high_water,
+            }
+            self.window_totals = dict(self.totals)
+            self.window_start = now
+            self.window_rtt = Histogram()
+            self.window_high_water = {}
+        return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            t = dict(self.totals)
+            rates = dict(self.rates)
+            last_window = dict(self.last_window)
+            rtt = describe(self.rtt)
+            high_water = dict(self.high_water)
+        return {
+            "window_s": self.window_s,
+            "per_s": rates,
+            "last_window": last_window,
+            "tx_bytes": t.get("serial_tx_bytes", 0),
+            "rx_bytes": t.get("serial_rx_bytes", 0),
+            "tx_packets": t.get("serial_frames_tx", 0),
+            "rx_packets": t.get("serial_frames_rx", 0),
+            "rtt_s": rtt,
+            "acks": t.get("serial_acks", 0),
+            "timeouts": {
+                "read": t.get("serial_read_timeouts", 0),
+                "window": t.get("serial_window_timeouts", 0),
+                "lost_acks": t.get("serial_lost_acks", 0),
+            },
+            "errors": {
+                "echo_mismatches": t.get("serial_bad_acks", 0),
+                "unknown_acks": t.get("serial_unknown_acks", 0),
+                "crc": t.get("serial_crc_errors", 0),
+                "bad_lengths": t.get("serial_bad_lengths", 0),
+                "resync_bytes": t.get("serial_resync_bytes", 0),
+                "bad_payloads": t.get("serial_bad_payloads", 0),
+                "bad_sensor_frames": t.get("serial_bad_sensor_frames", 0),
+                "write": t.get("serial_write_errors", 0),
+            },
+            "overwritten": t.get("serial_overwritten", 0),
+            "sensor_frames": t.get("serial_sensor_frames", 0),
+            "sensor_frames_missed": t.get("serial_sensor_frames_missed", 0),
+            "connects": t.get("serial_connects", 0),
+            "reconnects": t.get("serial_reconnects", 0),
+            "open_failures": t.get("serial_open_failures", 0),
+            "disconnects": t.get("serial_disconnects", 0),
+            "high_water": high_water,
+        }
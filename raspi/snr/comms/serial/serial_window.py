@@ -0,0 +1,125 @@
+"""Sliding window of serial packets waiting for their answers
+
+Instead of waiting for each answer before sending the next packet, up to
+size packets may be in flight. A reader thread hands answers to ack(),
+which matches them by sequence number. Answers that never come are expired
+after ack_timeout_s so they do not hold the window shut.
+
+The time from sending to the answer is logged as latency:serial:ack.
+Counters, see SerialStats:
+serial_acks: answered as expected
+serial_bad_acks: answered with different contents, garbled
+serial_unknown_acks: answer to a sequence number not in flight
+serial_lost_acks: never answered
+"""
+
+from threading import Condition
+from time import perf_counter
+from typing import Callable, Dict, Union
+
+from snr.comms.serial.packet import SEQ_MODULO, Packet
+from snr.comms.serial.serial_stats import SerialStats
+
+
+class SerialWindow:
+    def __init__(self, dbg: Callable, stats: SerialStats,
+                 size: int, ack_timeout_s: float):
+        self.dbg = dbg
+        self.stats = stats
+        self.count = stats.count
+        self.size = size
+        self.ack_timeout_s = ack_timeout_s
+        self.next_seq = 0
+        self.in_flight: Dict[int, tuple] = {}  # Expected ack and sent time
+        self.cond = Condition()
+
+    def acquire(self, timeout_s: float) -> Union[int, None]:
+        """Wait for room in the window and reserve the next sequence number,
+        None if there was no room in time
+        """
+        deadline = perf_counter() + timeout_s
+        with self.cond:
+            while True:
+                self.expire()
+                if len(self.in_flight) < self.size:
+                    seq = self.next_seq
+                    self.next_seq = (seq + 1) % SEQ_MODULO
+                    # Placeholder until sent() so the slot stays taken
+                    self.in_flight[seq] = (None, perf_counter())
+                    self.stats.peak("window_in_flight", len(self.in_flight))
+                    return seq
+                remaining = deadline - perf_counter()
+                if remaining <= 0:
+                    return None
+                # Wake in time to expire the oldest
+                self.cond.wait(min(remaining, self.ack_timeout_s))
+
+    def sent(self, seq: int, expected: Packet):
+        with self.cond:
+            self.in_flight[seq] = (expected, perf_counter())
+
+    def release(self, seq: int):
+        """Give back a sequence number that was not sent
+        """
+        with self.cond:
+            self.in_flight.pop(seq, None)
+            self.cond.notify()
+
+    def ack(self, p: Packet) -> bool:
+        """Match an answer from the MCU to its packet, whether it was the
+        answer expected
+        """
+        now = perf_counter()
+        with self.cond:
+            entry = self.in_flight.pop(p.seq, None)
+            self.cond.notify()
+        if entry is None or entry[0] is None:
+            self.count("serial_unknown_acks", 1)
+            self.dbg("serial_warning", "Answer to no packet in flight: {}",
+                     [p])
+            return False
+        expected, sent_time = entry
+        self.stats.log_latency("latency:serial:ack", now - sent_time)
+        if p != expected:
+            self.count("serial_bad_acks", 1)
+            self.dbg("serial_warning", "Expected {}, received {}",
+                     [expected, p])
+            return False
+        self.count("serial_acks", 1)
+        return True
+
+    def expire(self):
+        """Drop packets waiting longer than the ack timeout, with cond held
+        """
+        now = perf_counter()
+        lost = [seq for seq, (_, sent_time) in self.in_flight.items()
+                if now - sent_time > self.ack_timeout_s]
+        for seq in lost:
+            del self.in_flight[seq]
+        if lost:
+            self.count("serial_lost_acks", len(lost))
+            self.dbg("serial_warning", "No answer to {} packet(s)",
+                     [len(lost)])
+
+    def free(self) -> int:
+        """Room in the window now
+        """
+        with self.cond:
+            return self.size - len(self.in_flight)
+
+    def pending(self) -> int:
+        with self.cond:
+            return len(self.in_flight)
+
+    def drain(self, timeout_s: float) -> bool:
+        """Wait for every packet in flight to be answered or expire
+        """
+        deadline = perf_counter() + timeout_s
+        with self.cond:
+            while self.in_flight:
+                self.expire()
+                remaining = deadline - perf_counter()
+                if not self.in_flight or remaining <= 0:
+                    break
+                self.cond.wait(min(remaining, self.ack_timeout_s))
+            return not self.in_flight
@@ -4,12 +4,15 @@
 import json
 import socket
 from json import JSONDecodeError
+from time import time
 from typing import Union
 
 import settings
+from snr.comms.sockets.clock_sync import ClockSync
 from snr.comms.sockets.config import SocketsConfig
 from snr.endpoint import Endpoint
 from snr.node import Node
+from snr.profiler import profiled
 from snr.task import SomeTasks, Task, TaskPriority
 from snr.utils.utils import attempt, print_exit, sleep
 
@@ -30,6 +33,7 @@ class SocketsClient(Endpoint):
 
         self.config = config
         self.data_name = data_name
+        self.clock = ClockSync(settings.CLOCK_SYNC_WINDOW)
 
         self.dbg("sockets_status", "Sockets {} client created", [self.data_name])
 
@@ -51,8 +55,10 @@ class SocketsClient(Endpoint):
     def request_data(self):
         """Main continual entry point for sending data over sockets
         """
+        requested_at = time()
         self.create_connection()
         data_bytes = self.receive_data()
+        received_at = time()
         self.close_socket()
 
         if data_bytes is None:
@@ -66,6 +72,8 @@ class SocketsClient(Endpoint):
                   [data_str.__class__, data_str])
             data_dict = json.loads(data_str)
             self.dbg("decode_verbose", "Decoded control input: {}", [data_dict])
+            if isinstance(data_dict, dict):
+                self.sync_clock(data_dict, requested_at, received_at)
             self.parent.datastore.store(self.data_name, data_dict)
 
         except JSONDecodeError as error:
@@ -73,11 +81,38 @@ class SocketsClient(Endpoint):
             # TODO: Throw an exception
             return
 
+    def sync_clock(self, data: dict, requested_at: float,
+                   received_at: float):
+        """Update the server clock offset and convert the data's time stamps
+        to our clock
+        """
+        stamps = data.get(settings.TIMESTAMPS_KEY)
+        if not isinstance(stamps, dict) or "sent" not in stamps:
+            return
+        self.clock.add(requested_at, stamps["accepted"], stamps["sent"],
+                       received_at)
+        self.parent.datastore.store(f"{self.data_name}_clock",
+                                    self.clock.stats())
+
+        sent = stamps["sent"]
+        local = {name: self.clock.to_local(t) for name, t in stamps.items()}
+        local["received"] = received_at
+        data[settings.TIMESTAMPS_KEY] = local
+        self.profiler.log_latency(f"latency:{self.data_name}:send_to_receive",
+                                  received_at - local["sent"])
+        if "capture" in stamps:
+            # Both stamps are from the server's clock
+            self.profiler.log_latency(
+                f"latency:{self.data_name}:capture_to_send",
+                sent - stamps["capture"])
+
+    @profiled("sockets_recv")
     def receive_data(self) -> Union[bytes, None]:
         self.dbg("sockets_verbose",
               "Waiting to receive data immediately upon connection")
         try:
             data = self.s.recv(settings.MAX_SOCKET_SIZE)
+            self.profiler.count("sockets_rx_bytes", len(data))
             self.dbg("sockets_receive", "{} received data", [self.data_name])
             self.dbg("sockets_receive_verbose", "Received data: {}", [data])
             return data
@@ -88,6 +123,7 @@ class SocketsClient(Endpoint):
             # TODO: Correctly terminate this function here
             return None
 
+    @profiled("sockets_connect")
     def create_connection(self) -> None:
         """Create socket and connect to server in one function
         """
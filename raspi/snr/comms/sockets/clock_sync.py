@@ -0,0 +1,48 @@
+"""Estimate of the clock offset between a sockets client and server
+
+Each request gives four timestamps, as in NTP: the client starts connecting
+(t0), the server accepts (t1) and sends (t2), the client receives (t3). The
+server clock is ahead of the client's by about ((t1 - t0) + (t2 - t3)) / 2,
+with an error of at most half the round trip (t3 - t0) - (t2 - t1). The
+estimate is taken from the recent request with the shortest round trip, the
+one least inflated by queuing delays.
+"""
+
+from collections import deque
+from typing import Union
+
+
+class ClockSample:
+    def __init__(self, t0: float, t1: float, t2: float, t3: float):
+        self.offset = ((t1 - t0) + (t2 - t3)) / 2
+        self.rtt = (t3 - t0) - (t2 - t1)
+
+
+class ClockSync:
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.best = None
+
+    def add(self, t0: float, t1: float, t2: float, t3: float):
+        self.samples.append(ClockSample(t0, t1, t2, t3))
+        self.best = min(self.samples, key=lambda s: s.rtt)
+
+    @property
+    def offset(self) -> Union[float, None]:
+        """Seconds to subtract from a server time to get client time
+        """
+        return None if self.best is None else self.best.offset
+
+    def to_local(self, remote_time: float) -> Union[float, None]:
+        if self.best is None:
+            return None
+        return remote_time - self.best.offset
+
+    def stats(self) -> dict:
+        if self.best is None:
+            return {"offset_s": None, "rtt_s": None, "samples": 0}
+        return {
+            "offset_s": self.best.offset,
+            "rtt_s": self.best.rtt,
+            "samples": len(self.samples),
+        }
@@ -3,16 +3,19 @@
 
 import json
 import socket
+from time import time
 
 import settings
-from snr.async_endpoint import AsyncEndpoint
 from snr.comms.sockets.config import SocketsConfig
-from snr.utils.utils import sleep
+from snr.event_endpoint import EventEndpoint
 from snr.node import Node
+from snr.profiler import profiled
 
 
-class SocketsServer(AsyncEndpoint):
+class SocketsServer(EventEndpoint):
     """Asynchronous sockets server which sends commands to robot
+
+    Blocks on the listening socket between clients instead of ticking.
     """
 
     def __init__(self, parent: Node,
@@ -21,8 +24,7 @@ class SocketsServer(AsyncEndpoint):
         self.task_handlers = {}
 
         super().__init__(parent, f"sockets_server_{data_name}",
-                         self.initialize_server, self.serve_data,
-                         0)
+                         self.initialize_server, self.serve_data)
         self.config = config
         self.datastore = self.parent.datastore
         self.data_name = data_name
@@ -36,21 +38,28 @@ class SocketsServer(AsyncEndpoint):
         #     self.dbg("sockets_server",
         #           "Exiting loop handler, sokcets not enabled in settings")
         #     return
+        # Block until a client connects or the endpoint is terminated
+        if not self.wait(settings.SOCKETS_SERVER_TIMEOUT):
+            if not self.terminate_flag:
+                self.dbg("sockets_server", "Idle timeout, still listening")
+            return
         try:
-            # Blocking call waiting for the client to connet
             self.accept_connection()
+            self.accepted_at = time()
+        except socket.timeout:
+            # Client gave up between becoming readable and accept()
+            return
+        # Errors on the listening socket itself propagate so the node's
+        # supervisor restarts the server with backoff
+        try:
             # Send data to the client once it connects
             self.send_data()
-        except (socket.timeout, OSError, Exception) as err:
-            if err.__class__ is socket.timeout:
-                self.dbg("sockets_server",
-                      "Restarting sockets server after idle timeout")
-            else:
-                self.dbg("sockets_server",
-                      "Connection failed: {}", [err.__repr__()])
-                self.dbg("sockets_server", "Restarting sockets server")
-            self.close_socket()
-            self.initialize_server()
+        except (OSError, Exception) as err:
+            # Only this client's connection is broken, keep listening
+            self.dbg("sockets_server",
+                     "Connection failed: {}", [err.__repr__()])
+        finally:
+            self.close_connection()
 
     def initialize_server(self):
         self.s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -69,14 +78,17 @@ class SocketsServer(AsyncEndpoint):
         except socket.error as socket_error:
             self.dbg("sockets_critical", "Bind failed: {}", [socket_error])
             self.s.close()
-            sleep(settings.SOCKETS_RETRY_WAIT)
+            raise
         try:
             self.s.listen(settings.SOCKETS_MAX_CONNECTIONS)
+            self.waiter.register(self.s)
             self.dbg("sockets_event", "Server now listening")
         except Exception as error:
             self.dbg("sockets_error", "Error listening: {}", [error.__repr__()])
             self.s.close()
+            raise
 
+    @profiled("sockets_accept")
     def accept_connection(self):
         """Block until a client connects
         Once a clinet connects, the conn instance variable will be set so
@@ -94,16 +106,32 @@ class SocketsServer(AsyncEndpoint):
         # now keep talking with the client
         self.conn, self.addr = self.s.accept()
 
+    @profiled("sockets_send")
     def send_data(self):
         """Automatically send controls data as soon as the client connects.
         """
         data = self.datastore.use(self.data_name)
         if data is None:
             self.dbg("sockets_warning", "Data is none for {}", [self.data_name])
+        if isinstance(data, dict):
+            # Lets the client estimate our clock offset, see ClockSync
+            data = dict(data)
+            stamps = dict(data.get(settings.TIMESTAMPS_KEY) or {})
+            stamps["accepted"] = self.accepted_at
+            stamps["sent"] = time()
+            data[settings.TIMESTAMPS_KEY] = stamps
         encoded_data = json.dumps(data).encode()
         self.conn.sendall(encoded_data)
+        self.profiler.count("sockets_tx_bytes", len(encoded_data))
         self.dbg("sockets_verbose", "Data sent")
 
+    def close_connection(self):
+        try:
+            self.conn.close()
+        except Exception as error:
+            self.dbg("sockets_error", "Error closing connection: {}",
+                     [error.__repr__()])
+
     def close_socket(self):
         # if not settings.USE_SOCKETS:
         #     return
@@ -115,5 +143,6 @@ class SocketsServer(AsyncEndpoint):
 
     def terminate(self):
         self.close_socket()
+        self.waiter.close()
         # settings.USE_SOCKETS = False
         self.dbg("sockets_warn", "Socket closed")
@@ -1,11 +1,13 @@
 """Store a dictionary for a Node
 
 Provides extra information for items in dictionary including freshness
-and previous value
+and previous value. Endpoints store from their own threads, so changes are
+made under a lock.
 """
 
 from typing import Callable, Any
 from multiprocessing import Manager
+from threading import Lock
 # TODO: Synchronize datastore for multiprocessing
 
 
@@ -21,19 +23,20 @@ class Datastore:
         # self.sync_manager = Manager()
         # self.database = self.sync_manager.dict()
         self.database = {}
+        self.lock = Lock()  # Guards changes to database and its pages
 
     def store(self, key: str, data):
-        d = self.database
-        try:
-            old_page = d[key]
-            d[key + "_previous"] = old_page
-
-        except KeyError:
+        page = Page(data)
+        with self.lock:
+            d = self.database
+            old_page = d.get(key)
+            if old_page is not None:
+                d[key + "_previous"] = old_page
+            d[key] = page
+
+        if old_page is None:
             self.dbg("datastore_event", "Adding new key: {}", [key])
 
-        d[key] = Page(data)
-        self.database = d
-
     def is_fresh(self, data_type: str) -> bool:
         page = self.database.get(data_type)
         if page is not None:
@@ -53,23 +56,27 @@ class Datastore:
     def use(self, key: str):
         """Get a value from the datastore and mark it as unfresh/used
         """
-        try:
-            self.database[key].fresh = False
-        except KeyError:
+        with self.lock:
+            page = self.database.get(key)
+            if page is not None:
+                page.fresh = False
+        if page is None:
             self.dbg("datastore_error",
                      "Cannot mark unfresh, key {} not found",
                      [key])
-        return self.get(key)
+            return None
+        return page.data
 
     def terminate(self):
         self.dump()
         # self.sync_manager.shutdown()
 
     def dump(self):
-        d = self.database
-        for k in d.keys():
+        with self.lock:
+            pages = list(self.database.items())
+        for k, page in pages:
             self.dbg("datastore_dump", "k: {} v: {}",
-                     [k, self.get(k)])
+                     [k, page.data])
 
 # # Sets data with a given key
 # DatastoreSetter = Callable[[str, Any], None]
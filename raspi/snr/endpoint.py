@@ -7,6 +7,7 @@ class Endpoint:
     def __init__(self, parent: Node, name: str):
         self.parent = parent
         self.dbg = parent.dbg
+        self.profiler = parent.profiler
         self.name = name
 
     def get_new_tasks(self) -> SomeTasks:
@@ -28,5 +29,21 @@ class Endpoint:
     def join(self):
         return
 
+    def apply_scheduling(self, *fallback_names: str):
+        """Apply the Node's scheduling settings for this endpoint
+
+        Must be called from the endpoint's own thread or process.
+        """
+        for name in (self.name,) + fallback_names:
+            config = self.parent.sched_config(name)
+            if config is not None:
+                config.apply(self.dbg, self.name)
+                return
+
+    def has_failed(self) -> bool:
+        """Whether the endpoint stopped without being asked to terminate
+        """
+        return False
+
     def __repr__(self) -> str:
         return self.name
@@ -0,0 +1,127 @@
+""" Endpoints driven by I/O events instead of a tick rate
+
+An event driven endpoint's loop handler blocks on its I/O source through
+wait() rather than sleeping between iterations. Setting the terminate flag
+wakes a blocked wait() so the endpoint exits promptly, even from the parent
+of a ProcEndpoint's process.
+"""
+
+import selectors
+import socket
+from typing import Callable, List, Union
+
+from snr.async_endpoint import AsyncEndpoint
+from snr.node import Node
+from snr.proc_endpoint import ProcEndpoint
+
+
+class EventWaiter:
+    """Blocks until registered file objects are readable or it is woken
+    """
+
+    def __init__(self):
+        # Created up front so a forked child shares the wakeup pipe
+        self.wake_r, self.wake_w = socket.socketpair()
+        self.wake_r.setblocking(False)
+        self.selector = None
+        self.woken = False
+
+    def open(self):
+        """Create the selector in the thread or process that will wait
+        """
+        if self.selector is not None:
+            self.selector.close()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.wake_r, selectors.EVENT_READ)
+        self.woken = False
+        # Discard wakeups meant for a previous (crashed) run
+        try:
+            while self.wake_r.recv(64):
+                pass
+        except OSError:
+            pass
+
+    def register(self, fileobj):
+        self.selector.register(fileobj, selectors.EVENT_READ)
+
+    def unregister(self, fileobj):
+        try:
+            self.selector.unregister(fileobj)
+        except (KeyError, ValueError):
+            pass
+
+    def wait(self, timeout: Union[float, None] = None) -> List:
+        """Return the registered file objects that are ready to read
+
+        An empty list means the timeout expired or wake() was called.
+        """
+        ready = []
+        for key, _ in self.selector.select(timeout):
+            if key.fileobj is self.wake_r:
+                self.woken = True
+                try:
+                    self.wake_r.recv(64)
+                except OSError:
+                    pass
+            else:
+                ready.append(key.fileobj)
+        return ready
+
+    def wake(self):
+        try:
+            self.wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def close(self):
+        if self.selector is not None:
+            self.selector.close()
+            self.selector = None
+
+
+class EventLoop:
+    """Mixin for an endpoint whose loop handler blocks in wait()
+
+    Listed before AsyncEndpoint or ProcEndpoint in the bases so its methods
+    take the place of their tick rate handling.
+    """
+
+    def __init__(self, parent: Node, name: str,
+                 setup_handler: Callable, loop_handler: Callable):
+        self.waiter = EventWaiter()
+        self.setup_events = setup_handler
+        super().__init__(parent, name,
+                         self.open_events, loop_handler, 0)
+
+    def open_events(self):
+        self.waiter.open()
+        self.setup_events()
+
+    def wait(self, timeout: Union[float, None] = None) -> List:
+        ready = self.waiter.wait(timeout)
+        if self.waiter.woken:
+            # In a ProcEndpoint's process the parent's flag is a separate
+            # copy, the wakeup is how it asks us to stop
+            self.terminate_flag = True
+        return ready
+
+    def set_delay(self, tick_rate_hz: float):
+        self.delay = 0.0
+
+    def tick(self):
+        # Loop handler blocks in wait(), nothing to sleep for
+        return
+
+    def set_terminate_flag(self):
+        super().set_terminate_flag()
+        self.waiter.wake()
+
+
+class EventEndpoint(EventLoop, AsyncEndpoint):
+    """AsyncEndpoint whose loop blocks on I/O in its own thread
+    """
+
+
+class EventProcEndpoint(EventLoop, ProcEndpoint):
+    """ProcEndpoint whose loop blocks on I/O in its own process
+    """
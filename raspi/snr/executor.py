@@ -0,0 +1,113 @@
+"""Runs the loops of many low rate AsyncEndpoints on a single thread
+
+Endpoints are kept in a heap ordered by the time their loop handler is next
+due. The executor thread sleeps until the earliest deadline (or until a new
+endpoint is added) so idle endpoints cost no CPU and no thread of their own.
+Endpoints whose loop handler blocks must keep their dedicated thread.
+"""
+
+import heapq
+from itertools import count
+from threading import Condition, Thread
+from time import time
+from typing import Callable
+
+from snr.utils.realtime import SchedConfig
+
+
+class SharedExecutor:
+    def __init__(self, dbg: Callable, sched_config: SchedConfig = None):
+        self.dbg = dbg
+        self.sched_config = sched_config
+        self.heap = []  # (due time, tie breaker, endpoint, needs setup)
+        self.order = count()
+        self.cond = Condition()
+        self.thread = None
+        self.terminate_flag = False
+
+    def add(self, endpoint):
+        """Schedule an endpoint's setup and loop on the executor thread
+        """
+        if endpoint.delay == 0.0:
+            self.dbg("framework_warning",
+                     "Shared endpoint {} has no tick rate, starving others",
+                     [endpoint.name])
+        with self.cond:
+            heapq.heappush(self.heap,
+                           (time(), next(self.order), endpoint, True))
+            if self.thread is None:
+                self.thread = Thread(target=self.threaded_method,
+                                     name="shared_executor",
+                                     daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def threaded_method(self):
+        if self.sched_config is not None:
+            self.sched_config.apply(self.dbg, "shared_executor")
+        while True:
+            with self.cond:
+                while not self.terminate_flag:
+                    if self.heap:
+                        wait_s = self.heap[0][0] - time()
+                        if wait_s <= 0:
+                            break
+                        self.cond.wait(wait_s)
+                    else:
+                        self.cond.wait()
+                if self.terminate_flag:
+                    break
+                due, _, endpoint, needs_setup = heapq.heappop(self.heap)
+            # Run outside the lock so add() never waits on a loop handler
+            self.run(endpoint, due, needs_setup)
+
+        # Let every remaining endpoint deconstruct itself
+        with self.cond:
+            remaining = [item[2] for item in self.heap]
+            self.heap = []
+        for endpoint in remaining:
+            self.finish(endpoint)
+        self.dbg("framework", "Shared executor exited loop")
+
+    def run(self, endpoint, due: float, needs_setup: bool):
+        try:
+            if needs_setup and not endpoint.terminate_flag:
+                endpoint.setup()
+            if not endpoint.terminate_flag:
+                endpoint.step()
+        except (Exception, SystemExit) as e:
+            # Leave terminate_flag unset so the supervisor restarts it
+            self.dbg("async_endpoint_error", "{}, e: {}", [endpoint.name, e])
+            self.finish(endpoint)
+            return
+
+        if endpoint.terminate_flag:
+            self.finish(endpoint)
+            return
+
+        # Keep to the tick rate without drifting, unless we fell behind
+        now = time()
+        next_due = due + endpoint.delay
+        if next_due < now:
+            next_due = now + endpoint.delay
+        with self.cond:
+            heapq.heappush(self.heap,
+                           (next_due, next(self.order), endpoint, False))
+
+    def finish(self, endpoint):
+        self.dbg("framework", "Async endpoint {} exited loop",
+                 [endpoint.name])
+        try:
+            endpoint.terminate()
+        except Exception as e:
+            self.dbg("async_endpoint_error", "{} terminate, e: {}",
+                     [endpoint.name, e])
+        finally:
+            endpoint.alive = False
+
+    def terminate(self):
+        with self.cond:
+            self.terminate_flag = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
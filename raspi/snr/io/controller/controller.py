@@ -4,6 +4,7 @@ https://www.pygame.org/docs/ref/joystick.html
 """
 
 import random
+from time import time
 from typing import Tuple, Union
 
 import pygame
@@ -28,7 +29,8 @@ class Controller(AsyncEndpoint):
         super().__init__(parent, name,
                          self.init_controller,
                          self.monitor_controller,
-                         settings.CONTROLLER_INIT_TICK_RATE)
+                         settings.CONTROLLER_INIT_TICK_RATE,
+                         shared=settings.CONTROLLER_SHARED_EXECUTOR)
 
         self.datastore = self.parent.datastore
 
@@ -99,6 +101,10 @@ class Controller(AsyncEndpoint):
                     raise Exception("Lost connection to controller")
         new_data = self.map_input_dict(joystick_data)
         controls_dict = self.check_trigger_zeroed(new_data)
+        if self.triggers_zeroed:
+            # Start of the stick to thruster latency measured on the robot,
+            # not stamped on the empty dict sent until the triggers zero
+            controls_dict[settings.TIMESTAMPS_KEY] = {"capture": time()}
 
         self.dbg("controller_event",
                  "Storing data with key: {}", [self.get_name()])
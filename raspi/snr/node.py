@@ -1,11 +1,15 @@
 from collections import deque
+from time import perf_counter_ns
 from typing import List, Union
 
 import settings
 from snr.datastore import Datastore
+from snr.executor import SharedExecutor
 from snr.task import SomeTasks, Task, TaskPriority
 from snr.utils.utils import sleep
 from snr.profiler import Profiler, Timer
+from snr.sampler import Sampler
+from snr.supervisor import Supervisor
 from snr.utils.debug import Debugger
 
 
@@ -13,6 +17,7 @@ class Node:
     def __init__(self, debugger: Debugger,
                  role: str, mode: str,
                  factories: list):
+        self.debugger = debugger
         self.dbg = debugger.debug
         self.role = role
         self.mode = mode
@@ -22,11 +27,22 @@ class Node:
         self.endpoints = [] #list that will get filled with factories 
         self.task_producers = []#list that will get filled with task_producers
 
-        self.profiler = None
-        if settings.ENABLE_PROFILING:
-            self.profiler = Profiler(self.dbg)
+        self.profiler = Profiler(self.dbg, settings.ENABLE_PROFILING,
+                                 settings.ENABLE_TRACING)
+        self.task_labels = {}  # Profiler labels by (task type, endpoint)
+        self.sampler = Sampler(self.dbg, settings.SAMPLER_RATE_HZ,
+                               settings.SAMPLER_MAX_STACKS,
+                               settings.SAMPLER_OUTPUT_PATH)
+        self.sampler.install_signals()
+        if settings.ENABLE_SAMPLER:
+            self.sampler.start()
+
+        self.supervisor = Supervisor(self.dbg)
+        self.executor = SharedExecutor(self.dbg,
+                                       self.sched_config("shared_executor"))
 
         self.terminate_flag = False  # Whether to exit main loop
+        self.loop_count = 0  # Main loop iterations, for the loop rate
 
         self.assign_node_ip()
 
@@ -77,8 +93,18 @@ class Node:
                      [self.role])
         return "localhost"
 
+    def sched_config(self, name: str):
+        """Scheduling settings for a thread of this node, None if unset
+        """
+        return settings.ENDPOINT_SCHEDULING.get(self.role, {}).get(name)
+
     def loop(self):
+        config = self.sched_config("node")
+        if config is not None:
+            config.apply(self.dbg, "node")
         while not self.terminate_flag:
+            self.loop_count += 1
+            self.supervisor.check()
             self.step_task()
             self.dbg("schedule_verbose", "Task queue: \n{}",
                      [self.repr_task_queue()])
@@ -120,11 +146,13 @@ class Node:
             handler = e.task_handlers.get(t.task_type)
             result = None
             if handler is not None:
-                if self.profiler is None:
+                if self.profiler.enabled:
+                    label = self.task_label(t.task_type, e)
+                    start_ns = perf_counter_ns()
                     result = handler(t)
+                    self.profiler.record(label, start_ns)
                 else:
-                    result = self.profiler.time(f"{t.task_type}:{e.name}",
-                                                lambda: handler(t))
+                    result = handler(t)
             if result:
                 task_result.append(result)
 
@@ -137,6 +165,16 @@ class Node:
             # Only procede if not empty
             self.schedule_task(task_result)
 
+    def task_label(self, task_type: str, e) -> str:
+        """Profiler label for a task type run by an endpoint, built once
+        """
+        key = (task_type, e.name)
+        label = self.task_labels.get(key)
+        if label is None:
+            label = f"{task_type}:{e.name}"
+            self.task_labels[key] = label
+        return label
+
     def set_terminate_flag(self):
         # self.datastore.store("node_exit_reason", reason)
         self.terminate_flag = True
@@ -149,11 +187,13 @@ class Node:
 
         for e in self.endpoints:
             e.join()
+        self.executor.terminate()
 
         self.datastore.terminate()
+        self.supervisor.terminate()
 
-        if self.profiler is not None:
-            self.profiler.terminate()
+        self.profiler.terminate()
+        self.sampler.terminate()
         self.dbg("framework", "Node terminated")
 
     def step_task(self):
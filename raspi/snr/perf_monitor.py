@@ -0,0 +1,172 @@
+"""Periodic performance snapshot of a Node
+
+The snapshot is stored in the Node's datastore under the endpoint's name. On
+the robot, the Telemetry endpoint merges it into the telemetry data so
+topside can show when the robot is falling behind.
+"""
+
+import os
+from time import perf_counter
+from typing import Union
+
+import settings
+from snr.async_endpoint import AsyncEndpoint
+from snr.endpoint import Endpoint
+from snr.factory import Factory
+from snr.node import Node
+
+
+class PerfMonitorFactory(Factory):
+    def __init__(self, output_data_name: str):
+        super().__init__()
+        self.output_data_name = output_data_name
+
+    def get(self, parent: Node) -> Endpoint:
+        return PerfMonitor(parent, self.output_data_name)
+
+    def __repr__(self):
+        return "Performance Monitor Factory"
+
+
+class PerfMonitor(AsyncEndpoint):
+    """Publishes loop rates, task latencies, queue depths, process CPU and
+    memory use, I/O byte rates and endpoint restarts
+
+    Rates are averaged over the time since the previous snapshot. Runs on
+    the Node's shared executor.
+    """
+
+    def __init__(self, parent: Node, name: str):
+        self.task_producers = []
+        self.task_handlers = {}
+        super().__init__(parent, name,
+                         self.init_monitor, self.take_snapshot,
+                         settings.PERF_MON_TICK_RATE,
+                         shared=True)
+        self.datastore = self.parent.datastore
+        self.clock_ticks = sysconf("SC_CLK_TCK")
+        self.page_size = sysconf("SC_PAGE_SIZE")
+
+        self.start_loop()
+
+    def init_monitor(self):
+        self.last_time = perf_counter()
+        self.last_loop_count = self.parent.loop_count
+        self.last_counters = self.profiler.counter_totals()
+        self.last_cpu_ticks = {}
+
+    def take_snapshot(self):
+        now = perf_counter()
+        elapsed = now - self.last_time
+        if elapsed <= 0:
+            return
+        self.last_time = now
+
+        loop_count = self.parent.loop_count
+        supervised = self.parent.supervisor.stats()
+        snapshot = {
+            "node_loop_hz": (loop_count - self.last_loop_count) / elapsed,
+            "task_queue": len(self.parent.task_queue),
+            "executor_queue": len(self.parent.executor.heap),
+            "tasks": self.task_latencies(),
+            "procs": self.process_usage(elapsed),
+            "io_bytes_per_s": self.io_rates(elapsed),
+            "restarts": {name: s["restarts"]
+                         for name, s in supervised.items()},
+            "down": [name for name, s in supervised.items() if s["down"]],
+        }
+        self.last_loop_count = loop_count
+        snapshot["behind"] = self.behind_reasons(snapshot)
+
+        self.datastore.store(self.name, snapshot)
+        self.dbg("perf_monitor_verbose", "Snapshot: {}", [snapshot])
+        if snapshot["behind"]:
+            self.dbg("perf_monitor", "Falling behind: {}",
+                     [snapshot["behind"]])
+
+    def task_latencies(self) -> dict:
+        """Rate and latency in ms of each profiled label over the profiler's
+        shortest window
+        """
+        profiler = self.profiler
+        if not profiler.windows_s:
+            return {}
+        window = f"{min(profiler.windows_s):g}s"
+        latencies = {}
+        for label in list(profiler.time_dict.keys()):
+            s = profiler.summary(label).get(window)
+            if s is None or s["count"] == 0:
+                continue
+            latencies[label] = {
+                "per_s": round(s["per_s"], 2),
+                "p50_ms": round(s["p50"] * 1e3, 3),
+                "p99_ms": round(s["p99"] * 1e3, 3),
+                "max_ms": round(s["max"] * 1e3, 3),
+            }
+        return latencies
+
+    def process_usage(self, elapsed: float) -> dict:
+        """CPU percent and resident memory of the Node and its processes
+        """
+        procs = {"node": os.getpid()}
+        for e in self.parent.endpoints:
+            proc = getattr(e, "proc", None)
+            if proc is not None and proc.is_alive():
+                procs[e.name] = proc.pid
+
+        usage = {}
+        for name, pid in procs.items():
+            stat = read_proc_stat(pid)
+            if stat is None or self.clock_ticks is None:
+                continue
+            cpu_ticks, rss_pages = stat
+            last = self.last_cpu_ticks.get(pid)
+            self.last_cpu_ticks[pid] = cpu_ticks
+            usage[name] = {
+                "cpu_pct": None if last is None else round(
+                    100 * (cpu_ticks - last) / self.clock_ticks / elapsed, 1),
+                "rss_mb": round(rss_pages * (self.page_size or 0) / 2**20, 1),
+            }
+        return usage
+
+    def io_rates(self, elapsed: float) -> dict:
+        counters = self.profiler.counter_totals()
+        rates = {name: round((n - self.last_counters.get(name, 0)) / elapsed)
+                 for name, n in counters.items()
+                 if name.endswith("_bytes")}
+        self.last_counters = counters
+        return rates
+
+    def behind_reasons(self, snapshot: dict) -> list:
+        reasons = []
+        if snapshot["node_loop_hz"] < settings.PERF_MIN_LOOP_HZ:
+            reasons.append("node loop at {:.1f} Hz".format(
+                snapshot["node_loop_hz"]))
+        if snapshot["task_queue"] > settings.PERF_MAX_TASK_QUEUE:
+            reasons.append("{} tasks queued".format(snapshot["task_queue"]))
+        for name in snapshot["down"]:
+            reasons.append("{} down".format(name))
+        return reasons
+
+    def terminate(self):
+        pass
+
+
+def sysconf(name: str) -> Union[int, None]:
+    try:
+        return os.sysconf(name)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def read_proc_stat(pid: int) -> Union[tuple, None]:
+    """CPU time in clock ticks and resident pages of a process, from procfs
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces, fields follow its ")"
+            fields = f.read().rsplit(")", 1)[1].split()
+        # utime, stime and rss are fields 14, 15 and 24 of proc(5)
+        return int(fields[11]) + int(fields[12]), int(fields[21])
+    except (OSError, IndexError, ValueError):
+        return None
@@ -5,14 +5,13 @@ AsyncEndpoint: Generate and process data for Nodes
 Relay: Server data to other nodes
 """
 import signal
-from time import time
+from time import perf_counter_ns
 from typing import Callable
 from multiprocessing import Process
 
 from snr.endpoint import Endpoint
 from snr.node import Node
 from snr.utils.utils import sleep
-from snr.profiler import Timer
 
 
 class ProcEndpoint(Endpoint):
@@ -32,21 +31,28 @@ class ProcEndpoint(Endpoint):
         self.loop_handler = loop_handler
         self.terminate_flag = False
         self.set_delay(tick_rate_hz)
-        if parent:
-            self.profiler = parent.profiler
-        else:
-            self.profiler = None
 
     def set_delay(self, tick_rate_hz: float):
         if tick_rate_hz == 0:
+            # Warn once here rather than on every loop iteration
+            self.dbg("framework_warning",
+                     "proc_endpoint {} does not sleep (max tick rate)",
+                     [self.name])
             self.delay = 0.0
         else:
             self.delay = 1.0 / tick_rate_hz
 
     def start_loop(self):
         self.dbg("framework", "Starting proc endpoint {} process", [self.name])
+        # Created before the fork so the child can ship samples and debug
+        # output back
+        self.profiler.child_queue()
+        if self.parent:
+            self.parent.debugger.share()
         self.proc = self.get_proc()
         self.proc.start()
+        if self.parent:
+            self.parent.supervisor.watch(self)
 
     def get_proc(self):
         return Process(target=self.threaded_method, daemon=True)
@@ -57,41 +63,52 @@ class ProcEndpoint(Endpoint):
 
     def threaded_method(self):
         # signal.signal(signal.SIGINT, signal.SIG_IGN)
+        # Our copy of the parent's profiler would be discarded on exit
+        self.profiler = self.profiler.for_child()
         try:
+            self.apply_scheduling("proc_endpoint")
             self.setup()
             while not self.terminate_flag:
 
-                if self.profiler is None:
+                if self.profiler.enabled:
+                    start_ns = perf_counter_ns()
                     self.loop_handler()
+                    self.profiler.record(self.name, start_ns)
                 else:
-                    self.profiler.time(self.name, self.loop_handler)
-
-                    # self.dbg("profiling_endpoint",
-                    #       "Ran {} task in {:6.3f} us",
-                    #       [self.name, runtime * 1000000])
+                    self.loop_handler()
                 self.tick()
         except (Exception, KeyboardInterrupt) as e:
             self.dbg("proc_endpoint_error", "{}, e: {}", [self.name, e])
             self.set_terminate_flag()
 
         self.dbg("framework", "Proc endpoint {} exited loop", [self.name])
-        self.terminate()
+        try:
+            self.terminate()
+        finally:
+            self.profiler.terminate()
         return
 
     def get_name(self):
         return self.name
 
     def tick(self):
-        if (self.delay == 0.0):
-            self.dbg("framework_warning",
-                     "proc_endpoint {} does not sleep (max tick rate)",
-                     [self.name])
-        else:
+        if self.delay > 0.0:
             sleep(self.delay)
 
     def set_terminate_flag(self):
         self.terminate_flag = True
         self.dbg("framework", "Terminating proc_endpoint {}", [self.name])
 
+    def has_failed(self) -> bool:
+        # The child's terminate flag is its own copy, so a child that quit on
+        # an exception looks like a dead process that was never told to stop
+        proc = getattr(self, "proc", None)
+        return (proc is not None and not proc.is_alive() and
+                not self.terminate_flag)
+
+    def restart(self):
+        self.proc.join()
+        self.start_loop()
+
     def terminate(self):
         raise NotImplementedError
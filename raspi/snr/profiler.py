@@ -1,53 +1,460 @@
+import os
 from collections import deque
-from typing import Callable
-from time import time
+from functools import wraps
+from multiprocessing import Queue
+from threading import Event, Lock, Thread, get_ident
+from typing import Callable, List
+from time import perf_counter_ns, thread_time_ns
 
 import settings
+from snr.trace import write_chrome_trace, write_collapsed_stacks
+
+# Histogram resolution: 2^SUB_BITS buckets per doubling of the runtime
+SUB_BITS = 3
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_BITS = 39  # 2^39 ns ~ 9 min, anything slower shares the last bucket
+NUM_BUCKETS = (MAX_BITS - SUB_BITS + 1) * SUB_BUCKETS
 
 
 class Timer:
     def __init__(self):
-        self.start_time = time()
+        self.start_ns = perf_counter_ns()
 
     def end(self) -> float:
-        return time() - self.start_time
+        return (perf_counter_ns() - self.start_ns) * 1e-9
+
+
+class Span:
+    """Context manager timing a block of code under a fixed label
+
+    with profiler.span("label"):
+        ...
+    With cpu set, the thread's CPU time is also recorded as "label:cpu".
+    """
+
+    def __init__(self, profiler, label: str, cpu: bool = False):
+        self.profiler = profiler
+        self.label = label
+        self.cpu = cpu
+
+    def __enter__(self):
+        if self.profiler.enabled:
+            if self.cpu:
+                self.start_cpu_ns = thread_time_ns()
+            self.start_ns = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        profiler = self.profiler
+        if profiler.enabled and hasattr(self, "start_ns"):
+            profiler.record(self.label, self.start_ns)
+            if self.cpu:
+                profiler.record_ns(self.label + ":cpu",
+                                   thread_time_ns() - self.start_cpu_ns,
+                                   perf_counter_ns())
+        return False
+
+
+def profiled(label: str, cpu: bool = False):
+    """Decorator timing an endpoint method with the endpoint's profiler
+
+    @profiled("serial_write")
+    def write_packet(self, p):
+    """
+    cpu_label = label + ":cpu"
+
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = self.profiler
+            if not profiler.enabled:
+                return method(self, *args, **kwargs)
+            if cpu:
+                start_cpu_ns = thread_time_ns()
+            start_ns = perf_counter_ns()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                profiler.record(label, start_ns)
+                if cpu:
+                    profiler.record_ns(cpu_label,
+                                       thread_time_ns() - start_cpu_ns,
+                                       perf_counter_ns())
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Fixed memory histogram of runtimes with logarithmic buckets
+
+    Runtimes are integer nanoseconds. Recording is O(1) and memory does not
+    grow with the number of samples. Percentiles are accurate to within one
+    bucket (at most 12.5%).
+    """
+
+    def __init__(self):
+        self.counts = [0] * NUM_BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, runtime_ns: int):
+        self.add(bucket_index(runtime_ns), runtime_ns)
+
+    def add(self, i: int, runtime_ns: int):
+        """Record a runtime whose bucket_index() is already known
+        """
+        self.counts[i] += 1
+        self.count += 1
+        self.total_ns += runtime_ns
+        if runtime_ns > self.max_ns:
+            self.max_ns = runtime_ns
+
+    def percentile(self, p: float) -> float:
+        """Upper bound in seconds of the bucket holding the p (0 to 1)
+        percentile
+        """
+        if self.count == 0:
+            return 0.0
+        target = p * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target and c > 0:
+                return min(bucket_upper_bound(i), self.max_ns) * 1e-9
+        return self.max_ns * 1e-9
+
+    def copy(self) -> "Histogram":
+        h = Histogram()
+        h.counts = list(self.counts)
+        h.count = self.count
+        h.total_ns = self.total_ns
+        h.max_ns = self.max_ns
+        return h
+
+    def mean(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total_ns / self.count * 1e-9
+
+    def max(self) -> float:
+        return self.max_ns * 1e-9
+
+
+def bucket_index(runtime_ns: int) -> int:
+    """Bucket of a runtime: the top SUB_BITS + 1 bits of the value
+    """
+    bits = runtime_ns.bit_length()
+    if bits <= SUB_BITS + 1:
+        # Small values get a bucket each
+        return runtime_ns if runtime_ns > 0 else 0
+    i = ((bits - SUB_BITS) * SUB_BUCKETS +
+         ((runtime_ns >> (bits - SUB_BITS - 1)) & (SUB_BUCKETS - 1)))
+    return i if i < NUM_BUCKETS else NUM_BUCKETS - 1
+
+
+def bucket_upper_bound(i: int) -> int:
+    if i < 2 * SUB_BUCKETS:
+        return i
+    bits = i // SUB_BUCKETS + SUB_BITS
+    sub = i % SUB_BUCKETS
+    return ((SUB_BUCKETS + sub + 1) << (bits - SUB_BITS - 1)) - 1
+
+
+class Window:
+    """Statistics over the last completed time window
+
+    Only the all time histogram is updated per sample. At each window
+    boundary its counts are snapshotted and the previous window's histogram
+    is the difference of two snapshots, so windows cost nothing per sample.
+    The max of a window is the upper bound of its highest bucket.
+    """
+
+    def __init__(self, length_s: float, now_ns: int):
+        self.length_s = length_s
+        self.length_ns = int(length_s * 1e9)
+        self.end_ns = now_ns + self.length_ns
+        # Snapshot of the all time histogram at the window start, empty
+        # since a TaskStats is created right before its first sample
+        self.start = ([0] * NUM_BUCKETS, 0, 0)
+        self.last = None
+
+    def rotate(self, all_time: Histogram, now_ns: int):
+        counts = list(all_time.counts)
+        self.last = Histogram()
+        if now_ns - self.end_ns < self.length_ns:
+            # Otherwise whole windows passed without samples, leave it empty
+            self.last.counts = [n - s for n, s in zip(counts, self.start[0])]
+            self.last.count = all_time.count - self.start[1]
+            self.last.total_ns = all_time.total_ns - self.start[2]
+            top = max((i for i, c in enumerate(self.last.counts) if c > 0),
+                      default=0)
+            self.last.max_ns = min(bucket_upper_bound(top), all_time.max_ns)
+        self.start = (counts, all_time.count, all_time.total_ns)
+        self.end_ns += self.length_ns * \
+            (1 + (now_ns - self.end_ns) // self.length_ns)
+
+
+class TaskStats:
+    def __init__(self, windows_s: List[float], now_ns: int):
+        self.all_time = Histogram()
+        self.windows = [Window(w, now_ns) for w in windows_s]
+        self.next_rotate_ns = min([w.end_ns for w in self.windows],
+                                  default=None)
+
+    def record(self, runtime_ns: int, now_ns: int):
+        self.catch_up(now_ns)
+        self.all_time.add(bucket_index(runtime_ns), runtime_ns)
+
+    def catch_up(self, now_ns: int):
+        """Rotate the windows that ended by now_ns, so a label that stopped
+        getting samples decays to empty windows
+        """
+        if self.next_rotate_ns is not None and now_ns >= self.next_rotate_ns:
+            self.rotate(now_ns)
+
+    def rotate(self, now_ns: int):
+        for w in self.windows:
+            if now_ns >= w.end_ns:
+                w.rotate(self.all_time, now_ns)
+        self.next_rotate_ns = min(w.end_ns for w in self.windows)
 
 
 class Profiler:
-    def __init__(self, dbg: Callable):
+    """Collects runtime histograms keyed by task type or endpoint label
+
+    Timestamps come from perf_counter_ns. Instrumented code should check
+    enabled before reading the clock so that a disabled profiler costs a
+    single branch:
+
+    if profiler.enabled:
+        start = perf_counter_ns()
+        handler()
+        profiler.record(label, start)
+    else:
+        handler()
+
+    With tracing on, every span passed to record() is also kept in a bounded
+    buffer of (label, start_ns, duration_ns, pid, tid) for export_trace().
+
+    Samples are merged from any thread under lock. The periodic dump runs on
+    a dumper thread of its own, so the thread whose sample makes it due does
+    not wait on it.
+    """
+
+    def __init__(self, dbg: Callable, enabled: bool = True,
+                 tracing: bool = False):
         self.dbg = dbg
+        self.enabled = enabled  # Global switch for all instrumentation
         self.time_dict = {}
-        self.moving_avg_len = settings.PROFILING_AVG_WINDOW_LEN
+        self.windows_s = settings.PROFILING_WINDOWS_S
+        self.dump_period_s = settings.PROFILING_DUMP_PERIOD_S
+        self.dump_period_ns = int(self.dump_period_s * 1e9)
+        self.last_dump_ns = perf_counter_ns()
+        self.lock = Lock()  # Guards time_dict, counters and last_dump_ns
+        self.dumper = None  # Started by the first periodic dump
+        self.dumper_pid = None
+        self.dump_due = Event()
+        self.queue = None  # Samples from forked children, see child_queue()
+        self.collector = None
+        self.tracing = tracing
+        self.trace = deque(maxlen=settings.TRACE_BUFFER_LEN)
+        self.pid = os.getpid()
+        self.counters = {}  # Running totals such as bytes sent, see count()
 
     def time(self, name: str, handler: Callable):
-        time = Timer()
+        if not self.enabled:
+            return handler()
+        start_ns = perf_counter_ns()
         result = handler()
-        self.log_task(name, time.end())
+        self.record(name, start_ns)
         return result
 
+    def span(self, label: str, cpu: bool = False) -> Span:
+        return Span(self, label, cpu)
+
+    def record(self, label: str, start_ns: int):
+        """Record a runtime that started at start_ns and ends now
+        """
+        end_ns = perf_counter_ns()
+        if self.tracing:
+            self.trace.append((label, start_ns, end_ns - start_ns,
+                               self.pid, get_ident()))
+        self.record_ns(label, end_ns - start_ns, end_ns)
+
+    def record_ns(self, label: str, runtime_ns: int, end_ns: int):
+        self.merge(label, runtime_ns, end_ns)
+
+        if end_ns - self.last_dump_ns > self.dump_period_ns:
+            with self.lock:
+                due = end_ns - self.last_dump_ns > self.dump_period_ns
+                if due:
+                    self.last_dump_ns = end_ns
+            if due:
+                self.request_dump()
+
+    def request_dump(self):
+        """Have the dumper thread dump, starting it if this process has none
+        """
+        if self.dumper_pid != os.getpid():
+            # Also after a fork, which only copies the calling thread
+            self.dumper_pid = os.getpid()
+            self.dump_due = Event()
+            self.dumper = Thread(target=self.dump_loop, args=(self.dump_due,),
+                                 name="profiler_dumper", daemon=True)
+            self.dumper.start()
+        self.dump_due.set()
+
+    def dump_loop(self, dump_due: Event):
+        while True:
+            dump_due.wait()
+            dump_due.clear()
+            self.dump()
+
+    def count(self, name: str, n: int = 1):
+        """Add n to a running total, for rates like bytes per second
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def counter_totals(self) -> dict:
+        """A copy of the running totals
+        """
+        with self.lock:
+            return dict(self.counters)
+
+    def merge(self, label: str, runtime_ns: int, end_ns: int):
+        with self.lock:
+            stats = self.time_dict.get(label)
+            # Make sure stats exist
+            if stats is None:
+                stats = self.init_task_type(label, end_ns)
+            stats.record(runtime_ns, end_ns)
+
+    def child_queue(self) -> Queue:
+        """Queue forked children send their samples on
+
+        Must be called before forking so the child inherits the queue. The
+        collector thread merging the samples is started on first use.
+        """
+        if self.queue is None:
+            self.queue = Queue()
+            self.collector = Thread(target=self.collect,
+                                    name="profiler_collector", daemon=True)
+            self.collector.start()
+        return self.queue
+
+    def for_child(self) -> "Profiler":
+        """Profiler to use in a forked child in place of this one
+        """
+        if self.queue is None:
+            return self
+        return ChildProfiler(self.dbg, self.enabled, self.tracing, self.queue)
+
+    def collect(self):
+        """Merge batches of child samples until terminate() sends None
+
+        perf_counter_ns is the system wide monotonic clock on Linux, so child
+        timestamps line up with the parent's windows.
+        """
+        while True:
+            try:
+                batch = self.queue.get()
+            except (EOFError, OSError):
+                return
+            if batch is None:
+                return
+            samples, spans, counts = batch
+            for label, runtime_ns, end_ns in samples:
+                self.merge(label, runtime_ns, end_ns)
+            self.trace.extend(spans)
+            for name, n in counts.items():
+                self.count(name, n)
+
     def log_task(self, task_type: str, runtime: float):
-        self.dbg("profiling_task",
-                 "Ran {} task in {:6.3f} us",
-                 [task_type, runtime * 1000000])
-        # Make sure queue exists
-        if self.time_dict.get(task_type) is None:
-            self.init_task_type(task_type)
-        # Shift elements
-        self.time_dict[task_type].append(runtime)
-        self.dbg("profiling_avg", "Task {} has average runtime {}",
-                 [task_type, self.avg_time(task_type)])
-
-    def init_task_type(self, task_type: str):
-        self.time_dict[task_type] = deque(maxlen=self.moving_avg_len)
-
-    def avg_time(self, task_type: str) -> float:
-        return self.format_time(sum(self.time_dict[task_type]) /
-                                len(self.time_dict[task_type]))
+        self.record_ns(task_type, int(runtime * 1e9), perf_counter_ns())
+
+    def log_latency(self, label: str, latency_s: float):
+        """Record the time between two time() stamps
+
+        The stamps may come from different nodes' clocks, so an estimated
+        offset can make small latencies negative, these count as zero.
+        """
+        if self.enabled:
+            self.record_ns(label, max(int(latency_s * 1e9), 0),
+                           perf_counter_ns())
+
+    def init_task_type(self, task_type: str, now_ns: int) -> TaskStats:
+        """With lock held
+        """
+        stats = TaskStats(self.windows_s, now_ns)
+        self.time_dict[task_type] = stats
+        return stats
+
+    def summary(self, task_type: str) -> dict:
+        """Runtime statistics for a task type, over all time and per window
+
+        Window entries describe the last completed window, so rates are
+        over a full window length.
+        """
+        with self.lock:
+            stats = self.time_dict[task_type]
+            stats.catch_up(perf_counter_ns())
+            all_time, windows = self.copy_stats(stats)
+        s = {"all": describe(all_time)}
+        for length_s, last in windows:
+            if last is not None:
+                d = describe(last)
+                d["per_s"] = last.count / length_s
+                s[f"{length_s:g}s"] = d
+        return s
+
+    def copy_stats(self, stats: TaskStats) -> tuple:
+        """The all time histogram and (length_s, last) of each window, with
+        lock held. A window's last histogram is replaced rather than changed.
+        """
+        return (stats.all_time.copy(),
+                [(w.length_s, w.last) for w in stats.windows])
 
     def dump(self):
-        self.dbg("profiling_dump", "Task/Loop type:\t\tAvg runtime: ")
-        for k in self.time_dict:
-            self.dbg("profiling_dump", "{}:\t\t{}", [k, self.avg_time(k)])
+        with self.lock:
+            now_ns = perf_counter_ns()
+            for stats in self.time_dict.values():
+                stats.catch_up(now_ns)
+            snapshot = [(k, self.copy_stats(stats))
+                        for k, stats in self.time_dict.items()]
+        self.dbg("profiling_dump",
+                 "Task/Loop type:\t\tcount\tp50\tp90\tp99\tmax")
+        for k, (h, windows) in snapshot:
+            self.dbg("profiling_dump", "{}:\t\t{}\t{}\t{}\t{}\t{}",
+                     [k, h.count,
+                      self.format_time(h.percentile(0.5)),
+                      self.format_time(h.percentile(0.9)),
+                      self.format_time(h.percentile(0.99)),
+                      self.format_time(h.max())])
+            for length_s, last in windows:
+                if last is None:
+                    continue
+                self.dbg("profiling_summary",
+                         "{} last {:g}s:\t{}\t{:.1f}/s\t{}\t{}",
+                         [k, length_s, last.count,
+                          last.count / length_s,
+                          self.format_time(last.percentile(0.5)),
+                          self.format_time(last.percentile(0.99))])
+
+    def export_trace(self, path: str):
+        """Write the trace buffer as path.json (Chrome trace events) and
+        path.folded (collapsed stacks)
+        """
+        spans = list(self.trace)
+        try:
+            write_chrome_trace(spans, path + ".json")
+            write_collapsed_stacks(spans, path + ".folded")
+            self.dbg("profiling_dump", "Wrote {} trace spans to {}.json",
+                     [len(spans), path])
+        except OSError as e:
+            self.dbg("profiling_warning", "Could not write trace {}: {}",
+                     [path, e.__repr__()])
 
     def format_time(self, time_s: float) -> str:
         if time_s > 1:
@@ -61,4 +468,67 @@ class Profiler:
         return "Could not format time"
 
     def terminate(self):
+        if self.collector is not None:
+            # Children have been joined, their last batches are queued
+            self.queue.put(None)
+            self.collector.join(settings.PROFILING_COLLECTOR_JOIN_S)
         self.dump()
+        if self.tracing:
+            self.export_trace(settings.TRACE_OUTPUT_PATH)
+
+
+class ChildProfiler(Profiler):
+    """Profiler for a forked ProcEndpoint process
+
+    Samples are batched and shipped to the parent Node's profiler rather than
+    kept in a copy of its histograms that is discarded with the process.
+    """
+
+    def __init__(self, dbg: Callable, enabled: bool, tracing: bool,
+                 queue: Queue):
+        super().__init__(dbg, enabled, tracing)
+        self.queue = queue
+        self.batch = []
+        self.trace = []  # Sent along with each batch
+        self.batch_len = settings.PROFILING_BATCH_LEN
+        self.batch_period_ns = int(settings.PROFILING_BATCH_PERIOD_S * 1e9)
+        self.last_flush_ns = perf_counter_ns()
+
+    def record_ns(self, label: str, runtime_ns: int, end_ns: int):
+        self.batch.append((label, runtime_ns, end_ns))
+        if (len(self.batch) >= self.batch_len or
+                end_ns - self.last_flush_ns > self.batch_period_ns):
+            self.flush()
+
+    def flush(self):
+        self.last_flush_ns = perf_counter_ns()
+        with self.lock:
+            counters = self.counters
+            self.counters = {}  # Sent as increments
+        if not self.batch and not counters:
+            return
+        try:
+            self.queue.put((self.batch, self.trace, counters))
+        except (OSError, ValueError) as e:
+            self.dbg("profiling_warning", "Dropped {} samples: {}",
+                     [len(self.batch), e.__repr__()])
+        self.batch = []
+        self.trace = []
+
+    def dump(self):
+        # The parent reports our samples
+        return
+
+    def terminate(self):
+        self.flush()
+
+
+def describe(h: Histogram) -> dict:
+    return {
+        "count": h.count,
+        "mean": h.mean(),
+        "p50": h.percentile(0.5),
+        "p90": h.percentile(0.9),
+        "p99": h.percentile(0.99),
+        "max": h.max(),
+    }
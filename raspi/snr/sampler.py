@@ -0,0 +1,233 @@
+"""Sampling profiler for a Node's threads
+
+A background thread periodically captures the stack of every other thread
+with sys._current_frames() and counts identical stacks. Unlike the Profiler,
+nothing is added to the instrumented code paths, so it can stay on in
+deployment. Counts are written in the collapsed stack format read by
+flamegraph.pl and speedscope.
+
+SIGUSR1 toggles sampling and SIGUSR2 writes the counts to disk, for example:
+kill -USR2 <pid>
+The handlers only set flags, which the sampler thread acts on, so a signal
+that interrupts the main thread inside a debug call cannot deadlock it.
+Forked ProcEndpoint children inherit the handlers and get a paused sampler
+thread of their own, so signalling a child's pid samples that process on its
+own.
+"""
+
+import os
+import signal
+import sys
+import threading
+from time import perf_counter, thread_time_ns
+from typing import Callable, Dict
+
+OTHER = ("[other]",)  # Stacks beyond the table size are counted here
+PAUSED_POLL_S = 0.25  # How often a paused sampler checks for signals
+
+
+class Sampler:
+    def __init__(self, dbg: Callable, rate_hz: float, max_stacks: int,
+                 output_path: str):
+        self.dbg = dbg
+        self.period = 1.0 / rate_hz
+        self.max_stacks = max_stacks
+        self.output_path = output_path
+        self.counts: Dict[tuple, int] = {}  # Thread name then code ids
+        self.codes = {}  # Code objects by id, for every id in counts
+        self.samples = 0
+        self.frame_names = {}  # Cached names by code object
+        self.thread_names = {}
+        self.cpu_ns = 0  # CPU time spent sampling
+        self.active_s = 0.0  # Wall time spent sampling
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.sampling = False  # The thread idles while this is unset
+        # Set by the signal handlers, cleared by the sampler thread
+        self.toggle_requested = False
+        self.dump_requested = False
+
+    def start(self):
+        if self.sampling and self.running():
+            return
+        self.sampling = True
+        self.start_thread()
+        self.dbg("sampler", "Sampling every {:.1f} ms", [self.period * 1e3])
+
+    def start_thread(self):
+        if self.running():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.threaded_method,
+                                       name="sampler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if not self.running():
+            return
+        self.stop_event.set()
+        self.thread.join()
+        if self.sampling:
+            self.sampling = False
+            self.dbg("sampler", "Stopped sampling, used {}",
+                     [self.overhead_str()])
+
+    def running(self) -> bool:
+        # A thread object inherited through fork is not alive in the child
+        return self.thread is not None and self.thread.is_alive()
+
+    def toggle(self):
+        """On the sampler thread
+        """
+        self.sampling = not self.sampling
+        if self.sampling:
+            self.dbg("sampler", "Sampling every {:.1f} ms",
+                     [self.period * 1e3])
+        else:
+            self.dbg("sampler", "Stopped sampling, used {}",
+                     [self.overhead_str()])
+
+    def install_signals(self):
+        """Toggle with SIGUSR1 and dump with SIGUSR2, from the main thread
+
+        Starts the sampler thread, paused unless start() is called, so it
+        is there to act on the signals.
+        """
+        if not hasattr(signal, "SIGUSR1"):
+            self.dbg("sampler", "Signals not supported, no runtime control")
+            return
+        try:
+            signal.signal(signal.SIGUSR1, self.request_toggle)
+            signal.signal(signal.SIGUSR2, self.request_dump)
+        except ValueError as e:
+            # Not the main thread
+            self.dbg("sampler", "Could not install signal handlers: {}",
+                     [e.__repr__()])
+            return
+        self.start_thread()
+        if hasattr(os, "register_at_fork"):
+            # A fork only copies the calling thread
+            os.register_at_fork(after_in_child=self.start_in_child)
+
+    def request_toggle(self, signum, frame):
+        self.toggle_requested = True
+
+    def request_dump(self, signum, frame):
+        self.dump_requested = True
+
+    def start_in_child(self):
+        self.sampling = False
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.start_thread()
+
+    def threaded_method(self):
+        own_id = threading.get_ident()
+        last_s = perf_counter()
+        last_cpu_ns = thread_time_ns()
+        while not self.stop_event.wait(
+                self.period if self.sampling else PAUSED_POLL_S):
+            if self.toggle_requested:
+                self.toggle_requested = False
+                self.toggle()
+            if self.dump_requested:
+                self.dump_requested = False
+                self.dump()
+            if not self.sampling:
+                # Paused time does not count towards the overhead
+                last_s = perf_counter()
+                last_cpu_ns = thread_time_ns()
+                continue
+            self.sample(own_id)
+            # Account as we go so overhead() is current while running
+            now_s = perf_counter()
+            now_cpu_ns = thread_time_ns()
+            self.active_s += now_s - last_s
+            self.cpu_ns += now_cpu_ns - last_cpu_ns
+            last_s = now_s
+            last_cpu_ns = now_cpu_ns
+
+    def sample(self, own_id: int):
+        frames = sys._current_frames()
+        if any(i not in self.thread_names for i in frames):
+            self.thread_names = {t.ident: t.name
+                                 for t in threading.enumerate()}
+        counts = self.counts
+        for thread_id, top in frames.items():
+            if thread_id == own_id:
+                continue
+            # Stacks are keyed by code object ids, which hash much faster
+            # than code objects, and names are only built for dump()
+            stack = [self.thread_names.get(thread_id, str(thread_id))]
+            append = stack.append
+            frame = top
+            while frame is not None:
+                append(id(frame.f_code))
+                frame = frame.f_back
+            key = tuple(stack)
+            if key in counts:
+                counts[key] += 1
+            elif len(counts) < self.max_stacks:
+                # Codes first, dump() expects them for every key it sees
+                self.keep_codes(top)
+                counts[key] = 1
+            else:
+                counts[OTHER] = counts.get(OTHER, 0) + 1
+        self.samples += 1
+
+    def keep_codes(self, frame):
+        """Hold on to the code objects of a new stack so their ids stay valid
+        """
+        while frame is not None:
+            self.codes.setdefault(id(frame.f_code), frame.f_code)
+            frame = frame.f_back
+
+    def frame_name(self, code) -> str:
+        name = self.frame_names.get(code)
+        if name is None:
+            name = "{} ({}:{})".format(code.co_name,
+                                       os.path.basename(code.co_filename),
+                                       code.co_firstlineno)
+            self.frame_names[code] = name
+        return name
+
+    def collapsed_stacks(self) -> Dict[str, int]:
+        """Sample counts by stack, root first, as flamegraph lines expect
+        """
+        stacks = {}
+        for key, n in list(self.counts.items()):
+            # Captured leaf first after the thread name
+            line = ";".join(key[:1] + tuple(self.frame_name(self.codes[i])
+                                            for i in key[:0:-1]))
+            stacks[line] = stacks.get(line, 0) + n
+        return stacks
+
+    def dump(self) -> str:
+        path = "{}_{}.folded".format(self.output_path, os.getpid())
+        try:
+            with open(path, "w") as f:
+                for stack, n in sorted(self.collapsed_stacks().items()):
+                    f.write(f"{stack} {n}\n")
+        except OSError as e:
+            self.dbg("sampler", "Could not write {}: {}",
+                     [path, e.__repr__()])
+            return path
+        self.dbg("sampler", "Wrote {} samples of {} stacks to {}, used {}",
+                 [self.samples, len(self.counts), path,
+                  self.overhead_str()])
+        return path
+
+    def overhead(self) -> float:
+        """Fraction of one core used by sampling while it was on
+        """
+        if self.active_s == 0:
+            return 0.0
+        return self.cpu_ns * 1e-9 / self.active_s
+
+    def overhead_str(self) -> str:
+        return "{:.2f}% of a core".format(self.overhead() * 100)
+
+    def terminate(self):
+        self.stop()
+        if self.samples > 0:
+            self.dump()
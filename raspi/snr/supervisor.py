@@ -0,0 +1,119 @@
+"""Watches the health of a Node's endpoints
+
+Endpoints that die without being asked to terminate (an exception in an
+AsyncEndpoint thread or a ProcEndpoint process) are restarted with an
+exponential backoff between attempts.
+"""
+
+from time import time
+from typing import Callable
+
+import settings
+
+
+class SupervisedEndpoint:
+    """Restart bookkeeping for a single endpoint
+    """
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.backoff = settings.SUPERVISOR_BACKOFF_INITIAL_S
+        self.failed_at = None  # Time the current failure was noticed
+        self.retry_at = None  # Earliest time to try restarting
+        self.restarted_at = None
+        self.restarts = 0
+        self.recover_times = []  # Failure to restart, in seconds
+
+    def stats(self) -> dict:
+        recover = self.recover_times
+        return {
+            "restarts": self.restarts,
+            "down": self.failed_at is not None,
+            "last_recover_s": recover[-1] if recover else None,
+            "max_recover_s": max(recover) if recover else None,
+            "avg_recover_s": sum(recover) / len(recover) if recover else None,
+        }
+
+
+class Supervisor:
+    def __init__(self, dbg: Callable):
+        self.dbg = dbg
+        self.watched = []
+        self.last_check = 0.0
+
+    def watch(self, endpoint):
+        """Start supervising an endpoint, ignoring repeated requests and
+        endpoints that cannot restart()
+        """
+        if not callable(getattr(endpoint, "restart", None)):
+            self.dbg("supervisor_warning", "Not watching {}, no restart()",
+                     [endpoint])
+            return
+        for s in self.watched:
+            if s.endpoint is endpoint:
+                return
+        self.dbg("supervisor_verbose", "Watching {}", [endpoint])
+        self.watched.append(SupervisedEndpoint(endpoint))
+
+    def check(self):
+        """Restart failed endpoints whose backoff has elapsed
+
+        Called every Node loop iteration, so the actual scan is rate limited
+        by settings.SUPERVISOR_CHECK_PERIOD_S.
+        """
+        now = time()
+        if now - self.last_check < settings.SUPERVISOR_CHECK_PERIOD_S:
+            return
+        self.last_check = now
+
+        for s in self.watched:
+            if s.endpoint.has_failed():
+                self.handle_failure(s, now)
+            elif ((s.restarted_at is not None) and
+                  (now - s.restarted_at > settings.SUPERVISOR_STABLE_S)):
+                # Has stayed up long enough, forget previous failures
+                s.backoff = settings.SUPERVISOR_BACKOFF_INITIAL_S
+                s.restarted_at = None
+
+    def handle_failure(self, s: SupervisedEndpoint, now: float):
+        if s.failed_at is None:
+            s.failed_at = now
+            s.retry_at = now + s.backoff
+            self.dbg("supervisor",
+                     "Endpoint {} failed, restarting in {:.2f} s",
+                     [s.endpoint, s.backoff])
+            return
+        if now < s.retry_at:
+            return
+
+        try:
+            s.endpoint.restart()
+        except Exception as e:
+            self.dbg("supervisor_error", "Restarting {} failed: {}",
+                     [s.endpoint, e])
+            s.backoff = min(s.backoff * settings.SUPERVISOR_BACKOFF_FACTOR,
+                            settings.SUPERVISOR_BACKOFF_MAX_S)
+            s.retry_at = now + s.backoff
+            return
+
+        s.restarts += 1
+        s.recover_times.append(now - s.failed_at)
+        s.restarted_at = now
+        s.failed_at = None
+        s.retry_at = None
+        self.dbg("supervisor",
+                 "Restarted {} (restart #{}) after {:.2f} s down",
+                 [s.endpoint, s.restarts, s.recover_times[-1]])
+        # Back off further if it fails again before proving stable
+        s.backoff = min(s.backoff * settings.SUPERVISOR_BACKOFF_FACTOR,
+                        settings.SUPERVISOR_BACKOFF_MAX_S)
+
+    def stats(self) -> dict:
+        return {str(s.endpoint): s.stats() for s in self.watched}
+
+    def dump(self):
+        for name, stats in self.stats().items():
+            self.dbg("supervisor_dump", "{}: {}", [name, stats])
+
+    def terminate(self):
+        self.dump()
@@ -31,10 +31,13 @@ class Task:
 
     def __init__(self, task_type: str,
                  priority: TaskPriority,
-                 val_list: list):
+                 val_list: list,
+                 timestamp: Union[float, None] = None):
         self.task_type = task_type
         self.priority = priority
         self.val_list = val_list
+        # time() when the data behind this task originated, for latency
+        self.timestamp = timestamp
 
     def __eq__(self, other):
         return (
@@ -0,0 +1,60 @@
+"""Builds the telemetry data the robot serves to topside
+
+Each tick collects the latest value of every source key in the Node's
+datastore into one dict, stored under the endpoint's name for the telemetry
+sockets server to send.
+"""
+
+import settings
+from snr.async_endpoint import AsyncEndpoint
+from snr.endpoint import Endpoint
+from snr.factory import Factory
+from snr.node import Node
+
+
+class TelemetryFactory(Factory):
+    def __init__(self, output_data_name: str, sources: dict):
+        super().__init__()
+        self.output_data_name = output_data_name
+        self.sources = sources
+
+    def get(self, parent: Node) -> Endpoint:
+        return Telemetry(parent, self.output_data_name, self.sources)
+
+    def __repr__(self):
+        return "Telemetry Factory"
+
+
+class Telemetry(AsyncEndpoint):
+    """Merges datastore entries into the telemetry data
+
+    sources maps each key of the telemetry data to the datastore key it is
+    read from. Sources with no value yet are left out. Runs on the Node's
+    shared executor.
+    """
+
+    def __init__(self, parent: Node, name: str, sources: dict):
+        self.task_producers = []
+        self.task_handlers = {}
+        super().__init__(parent, name,
+                         self.init_telemetry, self.build_telemetry,
+                         settings.TELEMETRY_TICK_RATE,
+                         shared=True)
+        self.datastore = self.parent.datastore
+        self.sources = dict(sources)
+
+        self.start_loop()
+
+    def init_telemetry(self):
+        pass
+
+    def build_telemetry(self):
+        data = {}
+        for key, data_name in self.sources.items():
+            value = self.datastore.get(data_name)
+            if value is not None:
+                data[key] = value
+        self.datastore.store(self.name, data)
+
+    def terminate(self):
+        pass
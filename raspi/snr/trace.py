@@ -0,0 +1,75 @@
+"""Export of profiler spans for timeline and flamegraph viewers
+
+A span is a tuple (label, start_ns, duration_ns, pid, tid) as kept in
+Profiler.trace. chrome_trace() produces the Chrome trace-event format, which
+chrome://tracing and ui.perfetto.dev open directly. collapsed_stacks()
+produces the folded format read by flamegraph.pl and speedscope, nesting
+spans that run inside each other on the same thread.
+"""
+
+import json
+from typing import Dict, Iterable, List, Tuple
+
+Span = Tuple[str, int, int, int, int]
+
+
+def chrome_trace(spans: Iterable[Span]) -> dict:
+    events = []
+    for label, start_ns, duration_ns, pid, tid in spans:
+        events.append({
+            "name": label,
+            "cat": label.split(":")[0],
+            "ph": "X",  # Complete event: start and duration
+            "ts": start_ns / 1000,  # Microseconds
+            "dur": duration_ns / 1000,
+            "pid": pid,
+            "tid": tid,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def collapsed_stacks(spans: Iterable[Span]) -> Dict[str, int]:
+    """Self time in microseconds of each stack of nested spans
+
+    Stacks are rooted at the process and thread ids, so processes and
+    threads are separate towers of the flamegraph.
+    """
+    threads = {}
+    for span in spans:
+        threads.setdefault((span[3], span[4]), []).append(span)
+
+    stacks = {}
+    for (pid, tid), thread_spans in threads.items():
+        # Outer spans first when two start together
+        thread_spans.sort(key=lambda s: (s[1], -s[2]))
+        # Open spans as [end_ns, stack, self_ns]
+        open_spans: List[list] = []
+        root = f"pid {pid};tid {tid}"
+        for label, start_ns, duration_ns, _, _ in thread_spans:
+            while open_spans and open_spans[-1][0] <= start_ns:
+                close_span(open_spans.pop(), stacks)
+            parent = open_spans[-1] if open_spans else None
+            if parent is not None:
+                parent[2] -= duration_ns
+            stack = (parent[1] if parent is not None else root) + ";" + label
+            open_spans.append([start_ns + duration_ns, stack, duration_ns])
+        while open_spans:
+            close_span(open_spans.pop(), stacks)
+    return stacks
+
+
+def close_span(span: list, stacks: Dict[str, int]):
+    _, stack, self_ns = span
+    stacks[stack] = stacks.get(stack, 0) + max(self_ns, 0) // 1000
+
+
+def write_chrome_trace(spans: Iterable[Span], path: str):
+    with open(path, "w") as f:
+        json.dump(chrome_trace(spans), f)
+
+
+def write_collapsed_stacks(spans: Iterable[Span], path: str):
+    with open(path, "w") as f:
+        for stack, us in sorted(collapsed_stacks(spans).items()):
+            if us > 0:
+                f.write(f"{stack} {us}\n")
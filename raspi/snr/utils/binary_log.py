@@ -0,0 +1,166 @@
+"""Compact binary encoding of debug log records
+
+A file starts with MAGIC followed by a stream of tagged entries. Channels,
+message templates and thread names are written once as definitions and
+referred to by id afterwards, so a record costs a fixed header plus its raw
+arguments. Messages are never formatted when writing; the decoder formats
+them on demand.
+
+Entry layouts, all little endian:
+DEF_CHANNEL, DEF_TEMPLATE, DEF_THREAD: tag, u32 id, u32 length, utf-8 text
+RECORD: tag, f64 time, u32 channel, u32 template, u32 pid, u32 thread,
+        u32 suppressed, u8 arg count, then each argument as a type byte and
+        its value (see Encoder.encode_arg)
+"""
+
+import struct
+from typing import Iterator
+
+MAGIC = b"SNRLOG1\n"
+
+DEF_CHANNEL = 1
+DEF_TEMPLATE = 2
+DEF_THREAD = 3
+RECORD = 4
+
+DEF = struct.Struct("<BII")
+HEADER = struct.Struct("<BdIIIIIB")
+I64 = struct.Struct("<q")
+F64 = struct.Struct("<d")
+U32 = struct.Struct("<I")
+
+ARG_NONE = b"N"
+ARG_TRUE = b"T"
+ARG_FALSE = b"F"
+ARG_INT = b"i"
+ARG_FLOAT = b"f"
+ARG_STR = b"s"
+
+MAX_ARGS = 255
+I64_MIN = -2**63
+I64_MAX = 2**63 - 1
+
+
+class Encoder:
+    """Encodes record dicts as built by Debugger.record()
+
+    Ids are only valid within one file, so call reset() when starting a new
+    one.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.ids = {DEF_CHANNEL: {}, DEF_TEMPLATE: {}, DEF_THREAD: {}}
+
+    def id_of(self, kind: int, text: str, out: list) -> int:
+        table = self.ids[kind]
+        i = table.get(text)
+        if i is None:
+            i = len(table)
+            table[text] = i
+            data = text.encode("utf-8", "replace")
+            out.append(DEF.pack(kind, i, len(data)))
+            out.append(data)
+        return i
+
+    def encode(self, record: dict) -> bytes:
+        out = []
+        channel = self.id_of(DEF_CHANNEL, str(record.get("channel", "")), out)
+        template = self.id_of(DEF_TEMPLATE, str(record.get("message", "")),
+                              out)
+        thread = self.id_of(DEF_THREAD, str(record.get("thread", "")), out)
+        args = record.get("args", [])[:MAX_ARGS]
+        out.append(HEADER.pack(RECORD, record.get("time", 0.0), channel,
+                               template, record.get("pid", 0), thread,
+                               record.get("suppressed", 0), len(args)))
+        for a in args:
+            self.encode_arg(a, out)
+        return b"".join(out)
+
+    def encode_arg(self, a, out: list):
+        # bool before int, it is a subclass
+        if a is None:
+            out.append(ARG_NONE)
+        elif a is True:
+            out.append(ARG_TRUE)
+        elif a is False:
+            out.append(ARG_FALSE)
+        elif isinstance(a, int) and I64_MIN <= a <= I64_MAX:
+            out.append(ARG_INT + I64.pack(a))
+        elif isinstance(a, float):
+            out.append(ARG_FLOAT + F64.pack(a))
+        else:
+            data = (a if isinstance(a, str) else repr(a)).encode(
+                "utf-8", "replace")
+            out.append(ARG_STR + U32.pack(len(data)))
+            out.append(data)
+
+
+class DecodeError(Exception):
+    pass
+
+
+def decode(data: bytes) -> Iterator[dict]:
+    """Records in the same form as the JSON log
+    """
+    if not data.startswith(MAGIC):
+        raise DecodeError("Not a binary log")
+    names = {DEF_CHANNEL: {}, DEF_TEMPLATE: {}, DEF_THREAD: {}}
+    pos = len(MAGIC)
+    end = len(data)
+    try:
+        while pos < end:
+            tag = data[pos]
+            if tag in names:
+                _, i, n = DEF.unpack_from(data, pos)
+                pos += DEF.size
+                names[tag][i] = data[pos:pos + n].decode("utf-8", "replace")
+                pos += n
+            elif tag == RECORD:
+                (_, t, channel, template, pid, thread, suppressed,
+                 argc) = HEADER.unpack_from(data, pos)
+                pos += HEADER.size
+                args = []
+                for _ in range(argc):
+                    a, pos = decode_arg(data, pos)
+                    args.append(a)
+                message = names[DEF_TEMPLATE][template]
+                yield {
+                    "time": t,
+                    "channel": names[DEF_CHANNEL][channel],
+                    "pid": pid,
+                    "thread": names[DEF_THREAD][thread],
+                    "message": message,
+                    "args": args,
+                    "suppressed": suppressed,
+                }
+            else:
+                raise DecodeError("Unknown entry {} at {}".format(tag, pos))
+    except (struct.error, KeyError, IndexError) as e:
+        # A file cut off mid write, keep what was read
+        raise DecodeError("Truncated or corrupt at {}: {}".format(
+            pos, e.__repr__()))
+
+
+def decode_arg(data: bytes, pos: int) -> tuple:
+    kind = data[pos:pos + 1]
+    pos += 1
+    if kind == ARG_NONE:
+        return None, pos
+    if kind == ARG_TRUE:
+        return True, pos
+    if kind == ARG_FALSE:
+        return False, pos
+    if kind == ARG_INT:
+        return I64.unpack_from(data, pos)[0], pos + I64.size
+    if kind == ARG_FLOAT:
+        return F64.unpack_from(data, pos)[0], pos + F64.size
+    if kind == ARG_STR:
+        n = U32.unpack_from(data, pos)[0]
+        pos += U32.size
+        if pos + n > len(data):
+            raise IndexError("string past end")
+        return data[pos:pos + n].decode("utf-8", "replace"), pos + n
+    raise DecodeError("Unknown argument type {!r} at {}".format(kind, pos - 1))
@@ -1,50 +1,228 @@
-from multiprocessing import JoinableQueue
+import os
 import queue
-from threading import Thread
-from time import sleep
+import sys
+from multiprocessing import Queue
+from threading import Thread, current_thread
+from time import monotonic, time
 from typing import Union
 
 import settings
+from snr.utils.log_writer import LogWriter, plain_arg
 
-SLEEP_TIME = 0.001
+
+class ChannelPolicy:
+    """Limits how often a debug channel is output
+
+    rate_hz: at most this many messages per second
+    sample_n: only every nth message
+    on_change: only when the arguments differ from the previous message.
+        Arguments are compared shallowly, so an object changed in place
+        looks unchanged
+    Messages must pass every limit given. Suppressed messages are counted.
+    """
+
+    def __init__(self, rate_hz: Union[float, None] = None,
+                 sample_n: Union[int, None] = None,
+                 on_change: bool = False):
+        self.period = None if not rate_hz else 1.0 / rate_hz
+        self.sample_n = sample_n
+        self.on_change = on_change
+        self.calls = 0
+        self.next_time = 0.0
+        self.last_args = None
+        self.suppressed = 0
+        self.unreported = 0  # Suppressed since the last message passed
+
+    def allow(self, args: tuple) -> bool:
+        self.calls += 1
+        allowed = True
+        if self.sample_n and (self.calls - 1) % self.sample_n != 0:
+            allowed = False
+        if allowed and self.on_change:
+            try:
+                changed = args != self.last_args
+            except Exception:
+                changed = True
+            if changed:
+                self.last_args = args
+            else:
+                allowed = False
+        if allowed and self.period is not None:
+            now = monotonic()
+            if now < self.next_time:
+                allowed = False
+            else:
+                self.next_time = now + self.period
+        if not allowed:
+            self.suppressed += 1
+            self.unreported += 1
+        return allowed
+
+    def take_unreported(self) -> int:
+        n = self.unreported
+        self.unreported = 0
+        return n
 
 
 class Debugger:
+    """Formats debug lines in the calling thread and writes them from a
+    background thread
+
+    Lines go on a bounded in-process queue, so debug() never waits on IPC or
+    on stdout. When stdout cannot keep up, new lines are dropped and counted
+    rather than slowing down the caller. The writer blocks until a line is
+    queued and writes everything waiting in one call.
+
+    Forked processes cannot reach that queue. Calling share() before forking
+    creates a multiprocessing queue the children use instead, forwarded into
+    the parent's queue. Children forked without it print directly.
+
+    With settings.DEBUG_LOGGING, active channels are also written as
+    records to rotating files by a LogWriter, as JSON lines or in the binary
+    format of snr.utils.binary_log, which skips formatting entirely.
+    Arguments are kept as they are and only turned into text by the writer
+    thread. Records from children go through the shared queue, or to a file
+    of their own if it was never shared.
+    """
+
     def __init__(self):
-        self.q = JoinableQueue()
+        self.pid = os.getpid()
+        self.q = queue.Queue(maxsize=settings.DEBUG_QUEUE_LEN)
+        self.shared_q = None  # Lines from forked children, see share()
+        self.forwarding_thread = None
+        self.in_child = False
+        self.dropped = 0
+        self.reported_drops = 0
+        self.policies = {}  # ChannelPolicy by channel, from settings
+        self.log_writer = None
+        if settings.DEBUG_LOGGING:
+            self.log_writer = self.new_log_writer("")
 
-        self.terminate_flag = False
         self.printing_thread = Thread(target=self.threaded_method,
-                                      #   args=self.q
-                                      )
+                                      name="debugger", daemon=True)
         self.printing_thread.start()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.after_fork)
+
+    def share(self):
+        """Let processes forked after this call send lines to the parent
+        """
+        if self.shared_q is not None or self.in_child:
+            return
+        self.shared_q = Queue(maxsize=settings.DEBUG_QUEUE_LEN)
+        self.forwarding_thread = Thread(target=self.forward,
+                                        name="debugger_forward", daemon=True)
+        self.forwarding_thread.start()
+
+    def after_fork(self):
+        # Our queue and threads stayed behind in the parent
+        self.in_child = True
+        self.log_writer = None
+
+    def new_log_writer(self, suffix: str) -> LogWriter:
+        binary = settings.DEBUG_LOG_FORMAT == "binary"
+        return LogWriter(settings.DEBUG_LOG_PATH + suffix
+                         + (".bin" if binary else ".jsonl"),
+                         settings.DEBUG_LOG_MAX_BYTES,
+                         settings.DEBUG_LOG_BACKUPS,
+                         settings.DEBUG_QUEUE_LEN,
+                         settings.DEBUG_BATCH_LEN,
+                         settings.DEBUG_LOG_FSYNC_S,
+                         binary)
 
     def threaded_method(self):
-        # Loop
-        while not self.terminate_flag:
+        batch_len = settings.DEBUG_BATCH_LEN
+        while True:
+            # Block for the first line, then take whatever else is waiting
+            batch = [self.q.get()]
+            while len(batch) < batch_len:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch  # Sent by join()
+            if done:
+                batch = batch[:batch.index(None)]
+            if self.dropped > self.reported_drops:
+                batch.append("[debugger]\tDropped {} lines, output too slow"
+                             .format(self.dropped - self.reported_drops))
+                self.reported_drops = self.dropped
+            self.write(batch)
+            if done:
+                return
+
+    def write(self, lines: list):
+        if not lines:
+            return
+        try:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
+        except (OSError, ValueError):
+            pass
+
+    def forward(self):
+        while True:
             try:
-                line = self.q.get_nowait()
-                if line is not None:
-                    print(line)
-                    self.q.task_done()
-            except queue.Empty:
-                pass
-            sleep(SLEEP_TIME)
-
-        # Remaining lines
+                line = self.shared_q.get()
+            except (EOFError, OSError):
+                return
+            if line is None:
+                return
+            if isinstance(line, dict):
+                self.log(line)
+            else:
+                self.put(line)
+
+    def put(self, line: str):
+        try:
+            self.q.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def put_from_child(self, line: str):
+        if self.shared_q is None:
+            self.write([line])
+            return
         try:
-            line = self.q.get_nowait()
-            while line is not None:
-                print(line)
-                line = self.q.get()
-        except Exception as e:
-            print(f"{e}")
-        return
+            self.shared_q.put_nowait(line)
+        except queue.Full:
+            pass  # Our drop count is a copy the parent never sees
+        except (OSError, ValueError):
+            self.write([line])
+
+    def log(self, record: dict):
+        if not self.in_child:
+            if self.log_writer is not None:
+                self.log_writer.put(record)
+            return
+        if self.shared_q is not None:
+            try:
+                self.shared_q.put_nowait(record)
+                return
+            except (queue.Full, OSError, ValueError):
+                return
+        if self.log_writer is None:
+            self.log_writer = self.new_log_writer(f"_{os.getpid()}")
+        self.log_writer.put(record)
 
     def join(self):
-        self.q.join()
-        self.terminate_flag = True
+        """Write out queued lines and stop
+        """
+        if self.in_child:
+            if self.log_writer is not None:
+                self.log_writer.join(settings.DEBUG_LOG_JOIN_TIMEOUT_S)
+            return
+        if self.forwarding_thread is not None:
+            self.shared_q.put(None)
+            self.forwarding_thread.join()
+        suppressed = self.suppressed_counts()
+        if suppressed:
+            self.put("[debugger]\tSuppressed by channel policies: {}"
+                     .format(suppressed))
+        self.q.put(None)
         self.printing_thread.join()
+        if self.log_writer is not None:
+            self.log_writer.join(settings.DEBUG_LOG_JOIN_TIMEOUT_S)
 
     def debug(self, channel: str, *args: Union[list,  str]):
         """Debugging print and logging functions
@@ -70,35 +248,82 @@ class Debugger:
 
         Note that one iteration of this code spawned a separte thread for every
         debug() call. The printing system call could not keep up and threads
-        piled up and eventually crashed the program. Either threads must be
-        managed with pools or print statements can be allowed to slow down the
-        program (They can be turn off in settings)
+        piled up and eventually crashed the program. Lines are now queued for
+        a single writer thread and dropped when it falls behind.
         """
 
         # TODO: Use settings.ROLE for per client and server debugging?
-        if(settings.DEBUG_PRINTING and self.channel_active(channel)):
-            n = len(args)
+        printing = settings.DEBUG_PRINTING
+        logging = settings.DEBUG_LOGGING
+        if not ((printing or logging) and self.channel_active(channel)):
+            return
+        policy = self.policy(channel)
+        suppressed = 0
+        if policy is not None:
+            # Before formatting, which is most of the cost of a message
+            if not policy.allow(args):
+                return
+            suppressed = policy.take_unreported()
+        n = len(args)
+        if n == 1:
+            message = args[0]
+            format_args = []
+        elif n == 2:
+            message = str(args[0])
+            format_args = args[1]
+        else:
+            message = str(args[0])
+            format_args = args[1:]
+
+        if printing:
             # Print message to console
             if n == 1:
-                s = "[{}]\t\t{}".format(channel,
-                                        args[0])
-                self.q.put(s)
-                # print(s)
-            elif n == 2:
-                message = str(args[0])
-                s = "[{}]\t{}".format(channel,
-                                      message.format(*args[1]))
-                self.q.put(s)
-                # print(s)
-            elif 2 > 1:
-                message = str(args[0])
-                s = "[{}]\t{}".format(channel,
-                                      message.format(*args[1:]))
-                self.q.put(s)
-                # print(s)
-        if(settings.DEBUG_LOGGING and channel_active(channel)):
-            # TODO: Output stuff to a log file
-            pass
+                s = "[{}]\t\t{}".format(channel, message)
+            else:
+                s = "[{}]\t{}".format(channel, message.format(*format_args))
+            if suppressed:
+                s += "\t({} suppressed)".format(suppressed)
+            if self.in_child:
+                self.put_from_child(s)
+            else:
+                self.put(s)
+        if logging:
+            self.log(self.record(channel, message, format_args, suppressed))
+
+    def record(self, channel: str, message, format_args,
+               suppressed: int = 0) -> dict:
+        """Structured log record, with the unformatted message and
+        arguments so records can be filtered by either
+        """
+        thread = current_thread()
+        return {
+            "time": time(),
+            "channel": channel,
+            "pid": os.getpid(),
+            "thread": thread.name,
+            "message": message if isinstance(message, str)
+            else plain_arg(message),
+            # Taken here, where the arguments cannot change under repr()
+            # and a failing repr() cannot stop the writer thread. Plain
+            # arguments also pickle onto the shared queue
+            "args": [plain_arg(a) for a in format_args],
+            "suppressed": suppressed,
+        }
+
+    def policy(self, channel: str) -> Union[ChannelPolicy, None]:
+        if channel in self.policies:
+            return self.policies[channel]
+        config = settings.DEBUG_CHANNEL_POLICIES.get(channel)
+        policy = None if config is None else ChannelPolicy(**config)
+        self.policies[channel] = policy
+        return policy
+
+    def suppressed_counts(self) -> dict:
+        """Messages suppressed by channel policies, by channel
+        """
+        return {channel: p.suppressed
+                for channel, p in list(self.policies.items())
+                if p is not None and p.suppressed}
 
     def channel_active(self, channel: str) -> bool:
         """Whether to print or log for a debug channel
@@ -0,0 +1,195 @@
+"""Read, filter and summarize debug logs written with settings.DEBUG_LOGGING
+
+Reads both JSON lines and binary logs, detected from the file contents.
+Records from all files are merged in time order.
+
+usage: python3 -m snr.utils.log_query [options] FILE...
+
+examples:
+    # Everything from the serial channels in the last run
+    python3 -m snr.utils.log_query -c 'serial*' logs/debug.bin*
+    # Serial errors per minute
+    python3 -m snr.utils.log_query -c serial_error --per-minute logs/debug.bin
+    # Message counts and rates by channel between two times
+    python3 -m snr.utils.log_query --stats --since "2019-06-20 14:00" \\
+        --until "2019-06-20 14:30" logs/debug.bin
+"""
+
+import argparse
+import fnmatch
+import json
+import sys
+from datetime import datetime
+from typing import Iterator, List
+
+from snr.utils import binary_log
+
+
+def read_file(path: str) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        data = f.read()
+    if data.startswith(binary_log.MAGIC):
+        try:
+            yield from binary_log.decode(data)
+        except binary_log.DecodeError as e:
+            print("{}: {}".format(path, e), file=sys.stderr)
+        return
+    for n, line in enumerate(data.decode("utf-8", "replace").splitlines()):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            print("{}:{}: not a JSON record".format(path, n + 1),
+                  file=sys.stderr)
+
+
+def read_files(paths: List[str]) -> List[dict]:
+    records = []
+    for path in paths:
+        records.extend(read_file(path))
+    records.sort(key=lambda r: r.get("time", 0.0))
+    return records
+
+
+def text(record: dict) -> str:
+    """The message as the Debugger would have printed it
+    """
+    message = record.get("message", "")
+    args = record.get("args", [])
+    if not args:
+        return message
+    try:
+        return message.format(*args)
+    except (IndexError, KeyError, ValueError):
+        return "{} {}".format(message, args)
+
+
+def parse_time(s: str) -> float:
+    """Unix time, or a local date and time such as "2019-06-20 14:00"
+    """
+    try:
+        return float(s)
+    except ValueError:
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(s, fmt).timestamp()
+        except ValueError:
+            continue
+    raise argparse.ArgumentTypeError("Unrecognized time: {}".format(s))
+
+
+def matches(record: dict, args: argparse.Namespace) -> bool:
+    t = record.get("time", 0.0)
+    if args.since is not None and t < args.since:
+        return False
+    if args.until is not None and t >= args.until:
+        return False
+    if args.channel and not any(
+            fnmatch.fnmatchcase(record.get("channel", ""), pattern)
+            for pattern in args.channel):
+        return False
+    if args.pid is not None and record.get("pid") != args.pid:
+        return False
+    if args.grep is not None and args.grep not in text(record):
+        return False
+    return True
+
+
+def time_str(t: float) -> str:
+    return datetime.fromtimestamp(t).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def print_records(records: List[dict]):
+    for r in records:
+        print("{} {:>6} [{}]\t{}".format(time_str(r.get("time", 0.0)),
+                                         r.get("pid", ""),
+                                         r.get("channel", ""), text(r)))
+
+
+def print_stats(records: List[dict]):
+    if not records:
+        print("No records")
+        return
+    first = records[0].get("time", 0.0)
+    last = records[-1].get("time", 0.0)
+    minutes = max(last - first, 1.0) / 60
+    counts = {}
+    suppressed = {}
+    for r in records:
+        channel = r.get("channel", "")
+        counts[channel] = counts.get(channel, 0) + 1
+        suppressed[channel] = (suppressed.get(channel, 0)
+                               + r.get("suppressed", 0))
+    print("{} records from {} to {}".format(len(records), time_str(first),
+                                            time_str(last)))
+    print("{:<32} {:>8} {:>10} {:>10}".format("channel", "records",
+                                              "per min", "suppressed"))
+    for channel, n in sorted(counts.items(), key=lambda kv: -kv[1]):
+        print("{:<32} {:8d} {:10.1f} {:10d}".format(
+            channel, n, n / minutes, suppressed[channel]))
+
+
+def print_per_minute(records: List[dict]):
+    """Record counts in each minute by channel, minutes without records
+    included so gaps show
+    """
+    if not records:
+        print("No records")
+        return
+    channels = sorted({r.get("channel", "") for r in records})
+    counts = {}
+    for r in records:
+        minute = int(r.get("time", 0.0) // 60)
+        key = (minute, r.get("channel", ""))
+        # Suppressed messages happened too
+        counts[key] = counts.get(key, 0) + 1 + r.get("suppressed", 0)
+    start = int(records[0].get("time", 0.0) // 60)
+    end = int(records[-1].get("time", 0.0) // 60)
+    print("{:<16} ".format("minute")
+          + " ".join("{:>12}".format(c[:12]) for c in channels))
+    for minute in range(start, end + 1):
+        label = datetime.fromtimestamp(minute * 60).strftime("%Y-%m-%d %H:%M")
+        print("{:<16} ".format(label) + " ".join(
+            "{:12d}".format(counts.get((minute, c), 0)) for c in channels))
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(
+        description="Read, filter and summarize debug logs")
+    parser.add_argument("files", nargs="+", metavar="FILE")
+    parser.add_argument("-c", "--channel", action="append",
+                        help="Channel name or glob, may be repeated")
+    parser.add_argument("--since", type=parse_time,
+                        help="Unix time or local \"YYYY-MM-DD HH:MM[:SS]\"")
+    parser.add_argument("--until", type=parse_time)
+    parser.add_argument("--pid", type=int)
+    parser.add_argument("--grep", help="Substring of the formatted message")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("--stats", action="store_true",
+                        help="Counts and rates by channel")
+    output.add_argument("--per-minute", action="store_true",
+                        help="Counts by minute and channel")
+    output.add_argument("--json", action="store_true",
+                        help="Print matching records as JSON lines")
+    args = parser.parse_args(argv)
+
+    records = [r for r in read_files(args.files) if matches(r, args)]
+    try:
+        if args.stats:
+            print_stats(records)
+        elif args.per_minute:
+            print_per_minute(records)
+        elif args.json:
+            for r in records:
+                print(json.dumps(r, default=repr))
+        else:
+            print_records(records)
+    except BrokenPipeError:
+        # Piped into head
+        sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()
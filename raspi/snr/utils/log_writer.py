@@ -0,0 +1,177 @@
+"""Background writer for structured debug logs
+
+Records are dicts written one JSON object per line, or in the format of
+snr.utils.binary_log when binary is set. Writes happen on a
+background thread in batches, so a slow SD card delays the log rather than
+the caller. When the file passes max_bytes it is renamed to path.1 (older
+files shift up to path.<backups>) and a new one is started. The check is
+made per batch, so a file can run over by up to one batch.
+"""
+
+import json
+import os
+import queue
+from threading import Thread
+from time import perf_counter
+from typing import Union
+
+from snr.utils import binary_log
+
+# Argument types written as they are, anything else as its repr()
+PLAIN_TYPES = (int, float, str, bool, type(None))
+
+
+def plain_arg(arg):
+    """arg itself if it is written as is, else its repr(), which must be
+    taken on the thread that owns arg
+    """
+    if isinstance(arg, PLAIN_TYPES):
+        return arg
+    try:
+        return repr(arg)
+    except Exception as e:
+        return "<repr failed: {}>".format(type(e).__name__)
+
+
+class LogWriter:
+    def __init__(self, path: str, max_bytes: int, backups: int,
+                 queue_len: int, batch_len: int,
+                 fsync_period_s: Union[float, None],
+                 binary: bool = False):
+        """fsync_period_s of None leaves syncing to the OS, 0 syncs every
+        batch
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.batch_len = batch_len
+        self.fsync_period_s = fsync_period_s
+        self.encoder = binary_log.Encoder() if binary else None
+        self.q = queue.Queue(maxsize=queue_len)
+        self.dropped = 0
+        self.reported_drops = 0
+        self.written = 0
+        self.file = None
+        self.size = 0
+        self.last_sync = perf_counter()
+
+        self.thread = Thread(target=self.threaded_method,
+                             name="log_writer", daemon=True)
+        self.thread.start()
+
+    def put(self, record: dict):
+        try:
+            self.q.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def threaded_method(self):
+        while True:
+            batch = [self.q.get()]
+            while len(batch) < self.batch_len:
+                try:
+                    batch.append(self.q.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch  # Sent by join()
+            if done:
+                batch = batch[:batch.index(None)]
+            if self.dropped > self.reported_drops:
+                batch.append({"channel": "log_writer",
+                              "message": "Dropped {} records".format(
+                                  self.dropped - self.reported_drops)})
+                self.reported_drops = self.dropped
+            try:
+                self.write(batch)
+            except OSError as e:
+                print("[log_writer]\tCould not write {}: {}".format(
+                    self.path, e.__repr__()))
+                self.close()
+            except Exception as e:
+                # Keep the thread alive so join() is not left waiting
+                print("[log_writer]\tDropped {} records: {}".format(
+                    len(batch), e.__repr__()))
+            if done:
+                self.close()
+                return
+
+    def write(self, records: list):
+        if not records:
+            return
+        if self.file is None:
+            self.open()
+        elif self.size > 0 and self.size >= self.max_bytes:
+            self.rotate()
+        data = self.encode(records)
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+        self.written += len(records)
+
+        if self.fsync_period_s is not None:
+            now = perf_counter()
+            if now - self.last_sync >= self.fsync_period_s:
+                os.fsync(self.file.fileno())
+                self.last_sync = now
+
+    def encode(self, records: list) -> bytes:
+        if self.encoder is None:
+            return "".join(json.dumps(self.plain(r), default=repr) + "\n"
+                           for r in records).encode()
+        return b"".join(self.encoder.encode(r) for r in records)
+
+    def plain(self, record: dict) -> dict:
+        args = record.get("args")
+        if not args or all(isinstance(a, PLAIN_TYPES) for a in args):
+            return record
+        return dict(record, args=[plain_arg(a) for a in args])
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "ab")
+        self.size = self.file.tell()
+        if self.encoder is not None:
+            # Definitions are repeated in every file so each decodes alone
+            self.encoder.reset()
+            if self.size == 0:
+                self.file.write(binary_log.MAGIC)
+                self.size = len(binary_log.MAGIC)
+
+    def rotate(self):
+        self.close()
+        for i in range(self.backups - 1, 0, -1):
+            src = "{}.{}".format(self.path, i)
+            if os.path.exists(src):
+                os.replace(src, "{}.{}".format(self.path, i + 1))
+        if self.backups > 0:
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self.open()
+
+    def close(self):
+        if self.file is None:
+            return
+        try:
+            self.file.flush()
+            if self.fsync_period_s is not None:
+                os.fsync(self.file.fileno())
+            self.file.close()
+        except (OSError, ValueError):
+            pass
+        self.file = None
+
+    def join(self, timeout_s: float):
+        """Write out queued records and close the file, waiting at most
+        about twice timeout_s
+        """
+        try:
+            self.q.put(None, timeout=timeout_s)
+        except queue.Full:
+            pass
+        self.thread.join(timeout_s)
+        if self.thread.is_alive():
+            print("[log_writer]\tGave up waiting to finish {}".format(
+                self.path))
@@ -0,0 +1,109 @@
+"""CPU affinity, priority and real-time scheduling for endpoint threads
+
+All calls act on the calling thread (Linux treats pid 0 and thread ids as the
+thread itself), so a SchedConfig must be applied from inside the thread or
+process it is meant for. Anything the platform or our privileges do not
+allow is skipped with a warning instead of stopping the endpoint.
+"""
+
+import ctypes
+import os
+from typing import Callable, List, Union
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+class SchedConfig:
+    def __init__(self,
+                 cpus: Union[List[int], None] = None,
+                 nice: Union[int, None] = None,
+                 fifo_priority: Union[int, None] = None,
+                 lock_memory: bool = False):
+        self.cpus = cpus  # CPU cores the thread may run on
+        self.nice = nice  # -20 (favored) to 19 (yields to others)
+        self.fifo_priority = fifo_priority  # 1-99, SCHED_FIFO if set
+        self.lock_memory = lock_memory  # mlockall to avoid page faults
+
+    def apply(self, dbg: Callable, name: str) -> dict:
+        """Apply each setting to the calling thread
+
+        Returns which settings took effect so callers can report them.
+        """
+        applied = {}
+        if self.cpus is not None:
+            applied["cpus"] = set_affinity(dbg, name, self.cpus)
+        if self.nice is not None:
+            applied["nice"] = set_nice(dbg, name, self.nice)
+        if self.fifo_priority is not None:
+            applied["fifo"] = set_fifo(dbg, name, self.fifo_priority)
+        if self.lock_memory:
+            applied["mlockall"] = lock_memory(dbg, name)
+        dbg("sched", "{} scheduling applied: {}", [name, applied])
+        return applied
+
+    def __repr__(self):
+        return "SchedConfig(cpus={}, nice={}, fifo={}, mlock={})".format(
+            self.cpus, self.nice, self.fifo_priority, self.lock_memory)
+
+
+def set_affinity(dbg: Callable, name: str, cpus: List[int]) -> bool:
+    if not hasattr(os, "sched_setaffinity"):
+        dbg("sched_warning", "{}: CPU affinity not supported", [name])
+        return False
+    try:
+        available = os.sched_getaffinity(0)
+        usable = [c for c in cpus if c in available]
+        if not usable:
+            dbg("sched_warning", "{}: none of CPUs {} available in {}",
+                [name, cpus, available])
+            return False
+        os.sched_setaffinity(0, usable)
+        return True
+    except OSError as error:
+        dbg("sched_warning", "{}: could not set affinity: {}",
+            [name, error.__repr__()])
+        return False
+
+
+def set_nice(dbg: Callable, name: str, nice: int) -> bool:
+    if not hasattr(os, "setpriority"):
+        dbg("sched_warning", "{}: nice values not supported", [name])
+        return False
+    try:
+        # On Linux, 0 is the calling thread rather than the whole process
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+        return True
+    except OSError as error:
+        dbg("sched_warning", "{}: could not set nice {}: {}",
+            [name, nice, error.__repr__()])
+        return False
+
+
+def set_fifo(dbg: Callable, name: str, priority: int) -> bool:
+    if not hasattr(os, "SCHED_FIFO"):
+        dbg("sched_warning", "{}: SCHED_FIFO not supported", [name])
+        return False
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        return True
+    except OSError as error:
+        # Usually missing CAP_SYS_NICE, stay on the normal scheduler
+        dbg("sched_warning", "{}: could not use SCHED_FIFO: {}",
+            [name, error.__repr__()])
+        return False
+
+
+def lock_memory(dbg: Callable, name: str) -> bool:
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+            errno = ctypes.get_errno()
+            dbg("sched_warning", "{}: mlockall failed: {}",
+                [name, os.strerror(errno)])
+            return False
+        return True
+    except (OSError, AttributeError) as error:
+        dbg("sched_warning", "{}: mlockall not supported: {}",
+            [name, error.__repr__()])
+        return False
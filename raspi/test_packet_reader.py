@@ -0,0 +1,101 @@
+"""Checks that PacketReader waits for the MCU in the kernel
+
+Uses the pty device of benchmarks.serial_read_cpu in place of the MCU. A
+reader that polls in_waiting again would show up as CPU use, or as many
+wakeups if the polling sleeps between checks.
+
+usage: python3 -m unittest test_packet_reader
+"""
+
+import os
+import resource
+import tty
+import unittest
+from threading import Thread
+from time import perf_counter, thread_time
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+ANSWERS = 10
+MAX_CPU_SHARE = 0.1  # Of the time spent waiting
+MAX_WAKEUPS_PER_READ = 10  # A frame can arrive in a few pieces
+RUSAGE_THREAD = getattr(resource, "RUSAGE_THREAD", None)  # Linux only
+
+
+@unittest.skipIf(serial is None, "needs pyserial")
+class PacketReaderWaitTest(unittest.TestCase):
+    def open_device(self, answer: bool):
+        from benchmarks.serial_read_cpu import TIMEOUT_S, device
+        from snr.comms.serial.packet_reader import PacketReader
+        from snr.comms.serial.serial_stats import SerialStats
+        from snr.profiler import Profiler
+
+        def dbg(channel: str, message: str, args: list = []):
+            pass
+
+        master, slave = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        Thread(target=device, args=(master, answer), daemon=True).start()
+        port = serial.Serial(os.ttyname(slave), 115200, timeout=TIMEOUT_S)
+        self.addCleanup(os.close, master)
+        self.addCleanup(os.close, slave)
+        self.addCleanup(port.close)
+        reader = PacketReader(dbg, SerialStats(Profiler(dbg, False), 1),
+                              port)
+        return port, reader
+
+    def timed_reads(self, answer: bool, n: int) -> tuple:
+        """Statuses of n reads, the share of a core used while waiting and
+        the voluntary context switches per read
+        """
+        from snr.comms.serial import framing
+        from snr.comms.serial.packet import SET_CAM_CMD, Packet
+
+        port, reader = self.open_device(answer)
+        frame = framing.encode(Packet(SET_CAM_CMD, 1, 0).pack()[0])
+        statuses = []
+        wall_s = 0.0
+        cpu_s = 0.0
+        switches = 0
+        for _ in range(n):
+            port.write(frame)
+            start_switches = self.voluntary_switches()
+            start_cpu = thread_time()
+            start = perf_counter()
+            statuses.append(reader.read().status)
+            wall_s += perf_counter() - start
+            cpu_s += thread_time() - start_cpu
+            switches += self.voluntary_switches() - start_switches
+        return statuses, cpu_s / wall_s, switches / n
+
+    def voluntary_switches(self) -> int:
+        if RUSAGE_THREAD is None:
+            return 0
+        return resource.getrusage(RUSAGE_THREAD).ru_nvcsw
+
+    def test_waits_for_answers_without_cpu(self):
+        from snr.comms.serial.packet_reader import ReadStatus
+
+        statuses, cpu_share, wakeups = self.timed_reads(True, ANSWERS)
+        self.assertEqual(statuses, [ReadStatus.packet] * ANSWERS)
+        self.assertLess(cpu_share, MAX_CPU_SHARE)
+        self.assertLessEqual(wakeups, MAX_WAKEUPS_PER_READ)
+
+    def test_silent_device_times_out(self):
+        from benchmarks.serial_read_cpu import TIMEOUT_S
+        from snr.comms.serial.packet_reader import ReadStatus
+
+        start = perf_counter()
+        statuses, cpu_share, wakeups = self.timed_reads(False, 1)
+        self.assertEqual(statuses, [ReadStatus.timeout])
+        self.assertGreaterEqual(perf_counter() - start, TIMEOUT_S * 0.9)
+        self.assertLess(cpu_share, MAX_CPU_SHARE)
+        self.assertLessEqual(wakeups, MAX_WAKEUPS_PER_READ)
+
+
+if __name__ == "__main__":
+    unittest.main()
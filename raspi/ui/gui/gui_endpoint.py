@@ -9,6 +9,8 @@ from snr.node import Node
 from snr.utils import debug
 from snr.task import SomeTasks, Task, TaskPriority
 
+PERF_SLOWEST_TASKS = 5  # Task latencies shown in the performance panel
+
 
 class SimpleGUI(AsyncEndpoint):
     def __init__(self, parent: Node, name: str,
@@ -37,7 +39,8 @@ class SimpleGUI(AsyncEndpoint):
 
     def get_telem_data_task(self) -> Task:
         self.dbg("gui_verbose", "Requesting telemetry data with new task")
-        return Task("get_telem_data", TaskPriority.high, [])
+        return Task(f"get_{settings.TELEMETRY_DATA_NAME}",
+                    TaskPriority.high, [])
 
     def get_data(self):
         data = []
@@ -80,10 +83,40 @@ class SimpleGUI(AsyncEndpoint):
                         (data[0].get("trigger_right") // 1)))
         if settings.GUI_channels["telem"]:
             self.dbg("gui_telem", "Got telem info: {}", [data[1]])
+        if settings.GUI_channels["perf"] and isinstance(data[1], dict):
+            perf = data[1].get(settings.PERF_DATA_NAME)
+            if perf is not None:
+                self.update_perf(perf)
         # Update refresh rate from GUI
         self.dbg("gui_verbose", "UI tick_rate value: {}", [values[0]])
         self.set_refresh_rate(values[0])
 
+    def update_perf(self, perf: dict):
+        """Show the robot's performance snapshot, flagged when behind
+        """
+        lines = ["Loop: {:.1f} Hz  Tasks queued: {}".format(
+            perf.get("node_loop_hz", 0), perf.get("task_queue", 0))]
+        for name, p in perf.get("procs", {}).items():
+            lines.append("{}: {} % CPU, {} MB".format(
+                name, p.get("cpu_pct"), p.get("rss_mb")))
+        for name, rate in perf.get("io_bytes_per_s", {}).items():
+            lines.append("{}: {} B/s".format(name, rate))
+        slowest = sorted(perf.get("tasks", {}).items(),
+                         key=lambda kv: kv[1].get("p99_ms", 0),
+                         reverse=True)[:PERF_SLOWEST_TASKS]
+        for label, t in slowest:
+            lines.append("{}: p99 {} ms, {}/s".format(
+                label, t.get("p99_ms"), t.get("per_s")))
+        for name, restarts in perf.get("restarts", {}).items():
+            if restarts:
+                lines.append("{}: {} restarts".format(name, restarts))
+        self.window.Element('perf').Update("\n".join(lines))
+
+        behind = perf.get("behind")
+        self.window.Element('perf_status').Update(
+            "BEHIND: " + ", ".join(behind) if behind else "OK",
+            text_color="red" if behind else "green")
+
     def set_refresh_rate(self, rate):
         self.dbg("gui_verbose",
                  "Updating async_endpoint tick_rate_hz to {}",
@@ -121,6 +154,13 @@ class SimpleGUI(AsyncEndpoint):
 #                            title_color='Black', relief=sg.RELIEF_SUNKEN)],
 #                 [sg.Text('Refresh Rate', size=(45, 2), justification='center')]
             ]
+        if settings.GUI_channels["perf"]:
+            layout += [[sg.Frame(layout=[
+                [sg.Text('No data', size=(45, 1), key='perf_status')],
+                [sg.Text('', size=(45, 8 + PERF_SLOWEST_TASKS), key='perf')]],
+                title='Robot Performance',
+                title_color='Black',
+                relief=sg.RELIEF_SUNKEN)]]
         layout += [[sg.Text(' ' * 13),
                     sg.Slider(range=(0, 50),
                               default_value=47,